@@ -0,0 +1,155 @@
+"""
+Vectorized expansion of simple recurrence rules.
+
+Most recurring events use a plain ``DAILY``, ``WEEKLY`` or ``HOURLY`` rule with
+an ``interval`` and maybe a ``byweekday``. The occurrences of such rules are an
+arithmetic progression (filtered by weekday), so they can be computed for a
+whole window at once as a NumPy array instead of iterating dateutil's rrule one
+datetime at a time. Rules using any other parameter are left to dateutil.
+"""
+
+import datetime
+import math
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+HOUR = 3600 * 10**6
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+FREQUENCY_STEPS = {"HOURLY": HOUR, "DAILY": DAY, "WEEKLY": WEEK}
+SIMPLE_PARAMS = {"interval", "byweekday"}
+
+
+def _to_us(dt):
+    return (dt - EPOCH) // MICROSECOND
+
+
+def _weekday(us):
+    # 1970-01-01 was a Thursday
+    return (us // DAY + 3) % 7
+
+
+def _normalize_weekdays(byweekday):
+    if not isinstance(byweekday, (list, tuple)):
+        byweekday = [byweekday]
+    weekdays = set()
+    for weekday in byweekday:
+        if isinstance(weekday, int):
+            number = weekday
+        elif getattr(weekday, "n", None) is None:
+            number = getattr(weekday, "weekday", None)
+        else:
+            # nth weekday of the period, e.g. MO(+1)
+            return None
+        if number not in range(7):
+            return None
+        weekdays.add(number)
+    return sorted(weekdays)
+
+
+class SimpleRecurrence:
+    """
+    An arithmetic expander for the subset of rrules made of a ``DAILY``,
+    ``WEEKLY`` or ``HOURLY`` frequency, an ``interval`` and ``byweekday``
+    weekdays. It mirrors the ``before`` and ``between`` methods of
+    ``dateutil.rrule.rrule`` and works on naive datetimes like it.
+    """
+
+    def __init__(self, frequency, dtstart, until=None, interval=1, weekdays=None):
+        self.frequency = frequency
+        # like rrule, occurrences are only precise to the second
+        self.dtstart = dtstart.replace(microsecond=0)
+        self.until = until
+        self.interval = interval
+        self.weekdays = weekdays
+        self._base = _to_us(self.dtstart)
+        self._step = FREQUENCY_STEPS[frequency] * interval
+        if weekdays is None:
+            self._period = self._step
+        elif frequency == "WEEKLY":
+            self._period = self._step
+        else:
+            self._period = self._step * WEEK // math.gcd(self._step, WEEK)
+
+    @classmethod
+    def from_event(cls, event, tzinfo):
+        """
+        Return the expander of ``event`` in ``tzinfo``, or None when its rule
+        can't be expanded arithmetically.
+        """
+        if np is None or event.rule.frequency not in FREQUENCY_STEPS:
+            return None
+        params = event._event_params()
+        if not set(params) <= SIMPLE_PARAMS:
+            return None
+        interval = params.get("interval", 1)
+        if not isinstance(interval, int) or interval < 1:
+            return None
+        weekdays = None
+        if "byweekday" in params:
+            weekdays = _normalize_weekdays(params["byweekday"])
+            if not weekdays:
+                return None
+        dtstart, until = event._get_rrule_bounds(tzinfo)
+        return cls(event.rule.frequency, dtstart, until, interval, weekdays)
+
+    def _expand(self, lower, upper):
+        """
+        Return the occurrences between the ``lower`` and ``upper`` bounds
+        (inclusive, in microseconds) as an array of microseconds.
+        """
+        if self.until is not None:
+            upper = min(upper, _to_us(self.until))
+        lower = max(lower, self._base)
+        if upper < lower:
+            return np.empty(0, dtype=np.int64)
+        if self.frequency == "WEEKLY" and self.weekdays is not None:
+            # the weeks are counted from the monday of the dtstart week
+            first_week = self._base - _weekday(self._base) * DAY
+            blocks = np.arange(
+                max(0, (lower - first_week) // self._step),
+                (upper - first_week) // self._step + 1,
+                dtype=np.int64,
+            )
+            days = np.array(self.weekdays, dtype=np.int64) * DAY
+            starts = (first_week + blocks * self._step)[:, None] + days[None, :]
+            starts = starts.ravel()
+        else:
+            indexes = np.arange(
+                -((self._base - lower) // self._step),
+                (upper - self._base) // self._step + 1,
+                dtype=np.int64,
+            )
+            starts = self._base + indexes * self._step
+            if self.weekdays is not None:
+                starts = starts[np.isin(_weekday(starts), self.weekdays)]
+        return starts[(starts >= lower) & (starts <= upper)]
+
+    @staticmethod
+    def _to_datetimes(starts):
+        return starts.astype("datetime64[us]").tolist()
+
+    def between(self, after, before, inc=False):
+        starts = self._expand(_to_us(after), _to_us(before))
+        if not inc:
+            starts = starts[(starts != _to_us(after)) & (starts != _to_us(before))]
+        return self._to_datetimes(starts)
+
+    def before(self, dt, inc=False):
+        upper = _to_us(dt)
+        last = upper
+        if self.until is not None:
+            last = min(last, _to_us(self.until))
+        # a window of one period holds the last occurrence, if there is any
+        starts = self._expand(last - self._period, last)
+        if not inc:
+            starts = starts[starts < upper]
+        if len(starts) == 0:
+            return None
+        return self._to_datetimes(starts[-1:])[0]
@@ -1,16 +1,131 @@
+import datetime
+import hashlib
 import itertools
+from threading import Thread
 
 from django.conf import settings
 from django.contrib.syndication.views import Feed, FeedDoesNotExist
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
 
 from schedule.feeds.ical import ICalendarFeed
-from schedule.models import Calendar
+from schedule.models import Calendar, Occurrence
+from schedule.settings import (
+    API_STREAM_BATCH_SIZE,
+    FEED_CACHE_ALIAS,
+    FEED_CACHE_BACKGROUND_REFRESH,
+    FEED_CACHE_TIMEOUT,
+    USE_FEED_CACHE,
+)
+from schedule.utils import calendars_etag, calendars_last_modified
 
 
-class UpcomingEventsFeed(Feed):
+class CalendarFeedMixin:
+    """
+    Answers conditional requests for the feed of a calendar from its
+    ``get_etag`` and ``get_last_modified``, and serves the feed from the feed
+    cache (see ``USE_FEED_CACHE``) while its ETag doesn't change.
+    """
+
+    def get_response(self, view, request, *args):
+        etag = self.get_etag(request, *args)
+        last_modified = self.get_last_modified(request, *args)
+
+        def respond(request, *args):
+            if not USE_FEED_CACHE:
+                return view(request, *args)
+            return self.get_cached_response(view, request, args, etag, last_modified)
+
+        return condition(
+            etag_func=lambda request, *args: etag,
+            last_modified_func=lambda request, *args: last_modified,
+        )(respond)(request, *args)
+
+    def get_cached_response(self, view, request, args, etag, last_modified):
+        """
+        Returns the cached feed if it has the current ``etag``, otherwise
+        renders and caches it. With ``FEED_CACHE_BACKGROUND_REFRESH``, an
+        outdated feed is returned, with its own ETag and Last-Modified, while
+        it is rendered again in a thread.
+        """
+        cache = caches[FEED_CACHE_ALIAS]
+        url = request.build_absolute_uri()
+        key = "schedule.feed:%s" % hashlib.sha1(url.encode()).hexdigest()
+        entry = cache.get(key)
+        if entry is not None and entry["etag"] != etag:
+            if not FEED_CACHE_BACKGROUND_REFRESH:
+                entry = None
+            else:
+                # only one thread renders the feed at a time
+                if cache.add(key + ":refresh", True, FEED_CACHE_TIMEOUT):
+                    Thread(
+                        target=self.refresh_cache,
+                        args=(view, request, args, etag, last_modified, key),
+                        daemon=True,
+                    ).start()
+                response = self.get_entry_response(entry)
+                response["ETag"] = quote_etag(entry["etag"])
+                if entry["last_modified"] is not None:
+                    response["Last-Modified"] = http_date(entry["last_modified"])
+                return response
+        if entry is None:
+            entry = self.render_entry(view, request, args, etag, last_modified)
+            cache.set(key, entry, FEED_CACHE_TIMEOUT)
+        return self.get_entry_response(entry)
+
+    def refresh_cache(self, view, request, args, etag, last_modified, key):
+        cache = caches[FEED_CACHE_ALIAS]
+        try:
+            entry = self.render_entry(view, request, args, etag, last_modified)
+            cache.set(key, entry, FEED_CACHE_TIMEOUT)
+        finally:
+            cache.delete(key + ":refresh")
+            # the connections of this thread aren't closed by Django
+            for connection in connections.all():
+                connection.close()
+
+    def render_entry(self, view, request, args, etag, last_modified):
+        response = view(request, *args)
+        if response.streaming:
+            content = b"".join(response.streaming_content)
+        else:
+            content = response.content
+        return {
+            "etag": etag,
+            "last_modified": last_modified and last_modified.timestamp(),
+            "content": content,
+            "content_type": response["Content-Type"],
+        }
+
+    def get_entry_response(self, entry):
+        return HttpResponse(entry["content"], content_type=entry["content_type"])
+
+
+class UpcomingEventsFeed(CalendarFeedMixin, Feed):
     feed_id = "upcoming"
 
+    def __call__(self, request, calendar_id):
+        return self.get_response(super().__call__, request, calendar_id)
+
+    def get_now(self):
+        # the upcoming occurrences change as time passes, so responses are
+        # only considered fresh until the end of the current minute
+        return timezone.now().replace(second=0, microsecond=0)
+
+    def get_etag(self, request, calendar_id):
+        calendars = Calendar.objects.filter(pk=calendar_id)
+        return calendars_etag(calendars, self.get_now())
+
+    def get_last_modified(self, request, calendar_id):
+        last_modified = calendars_last_modified(Calendar.objects.filter(pk=calendar_id))
+        if last_modified is None:
+            return None
+        return max(last_modified, self.get_now())
+
     def feed_title(self, obj):
         return "Upcoming Events for %s" % obj.name
 
@@ -24,7 +139,7 @@ class UpcomingEventsFeed(Feed):
 
     def items(self, obj):
         return itertools.islice(
-            obj.occurrences_after(timezone.now()),
+            obj.occurrences_after(timezone.now(), spans=True),
             getattr(settings, "FEED_LIST_LENGTH", 10),
         )
 
@@ -46,15 +161,49 @@ class UpcomingEventsFeed(Feed):
         return "{} \n {}".format(item.event.title, item.event.description)
 
 
-class CalendarICalendar(ICalendarFeed):
+class CalendarICalendar(CalendarFeedMixin, ICalendarFeed):
+    def __call__(self, request, cal_id):
+        return self.get_response(super().__call__, request, cal_id)
+
+    def get_etag(self, request, cal_id):
+        return calendars_etag(Calendar.objects.filter(pk=cal_id))
+
+    def get_last_modified(self, request, cal_id):
+        return calendars_last_modified(Calendar.objects.filter(pk=cal_id))
+
     def items(self):
         cal_id = self.args[1]
         cal = Calendar.objects.get(pk=cal_id)
 
-        return cal.events.all()
+        return self._iter_items(cal.events.all())
+
+    def _iter_items(self, events):
+        """
+        Yields the events, fetched API_STREAM_BATCH_SIZE at a time with their
+        rules and persisted occurrences, each followed by its persisted
+        occurrences that are not cancelled, which override the occurrences
+        of its recurrence rule.
+        """
+        events = events.select_related("rule").prefetch_related("occurrence_set")
+        last_pk = None
+        while True:
+            batch = events.order_by("pk")
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch[:API_STREAM_BATCH_SIZE])
+            for event in batch:
+                yield event
+                if event.rule is not None:
+                    for occurrence in event.occurrence_set.all():
+                        if not occurrence.cancelled:
+                            yield occurrence
+            if len(batch) < API_STREAM_BATCH_SIZE:
+                return
+            last_pk = batch[-1].pk
 
     def item_uid(self, item):
-        return str(item.id)
+        event = item.event if isinstance(item, Occurrence) else item
+        return event.uid or str(event.id)
 
     def item_start(self, item):
         return item.start
@@ -67,3 +216,65 @@ class CalendarICalendar(ICalendarFeed):
 
     def item_created(self, item):
         return item.created_on
+
+    def item_rrule(self, item):
+        if isinstance(item, Occurrence) or item.rule is None:
+            return None
+        recurrence = {"freq": item.rule.frequency}
+        params = item._event_params()
+        for param, value in params.items():
+            if param in RRULE_PARAMS:
+                recurrence[RRULE_PARAMS[param]] = value
+            elif param == "byweekday":
+                days = value if isinstance(value, (list, tuple)) else [value]
+                recurrence["byday"] = [_ical_weekday(day) for day in days]
+            elif param == "wkst":
+                recurrence["wkst"] = _ical_weekday(value)
+        if item.end_recurring_period is not None and "count" not in params:
+            until = item.end_recurring_period
+            if timezone.is_aware(until):
+                until = until.astimezone(datetime.timezone.utc)
+            recurrence["until"] = until
+        return recurrence
+
+    def item_exdate(self, item):
+        if isinstance(item, Occurrence) or item.rule is None:
+            return None
+        return [
+            occurrence.original_start
+            for occurrence in item.occurrence_set.all()
+            if occurrence.cancelled
+        ]
+
+    def item_recurrence_id(self, item):
+        if isinstance(item, Occurrence):
+            return item.original_start
+
+
+# the params of Rule that translate as is to the parts of an iCalendar RRULE
+RRULE_PARAMS = {
+    "count": "count",
+    "interval": "interval",
+    "bysetpos": "bysetpos",
+    "bymonth": "bymonth",
+    "bymonthday": "bymonthday",
+    "byyearday": "byyearday",
+    "byweekno": "byweekno",
+    "byhour": "byhour",
+    "byminute": "byminute",
+    "bysecond": "bysecond",
+}
+
+ICAL_WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def _ical_weekday(day):
+    """
+    Returns the iCalendar BYDAY value (e.g. ``MO`` or ``-1FR``) of a weekday
+    of dateutil or a weekday number.
+    """
+    if isinstance(day, int):
+        return ICAL_WEEKDAYS[day]
+    if day.n:
+        return "{:+d}{}".format(day.n, ICAL_WEEKDAYS[day.weekday])
+    return ICAL_WEEKDAYS[day.weekday]
@@ -1,5 +1,5 @@
 import icalendar
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
 EVENT_ITEMS = (
     ("uid", "uid"),
@@ -9,19 +9,35 @@ EVENT_ITEMS = (
     ("location", "location"),
     ("last_modified", "last_modified"),
     ("created", "created"),
+    ("rrule", "rrule"),
+    ("exdate", "exdate"),
+    ("recurrence-id", "recurrence_id"),
 )
 
+CALENDAR_END = b"END:VCALENDAR\r\n"
+
 
 class ICalendarFeed:
     def __call__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
 
+        response = StreamingHttpResponse(self.stream(self.items()))
+        response["Content-Type"] = "text/calendar"
+
+        return response
+
+    def stream(self, items):
+        """
+        Yields the calendar one VEVENT at a time, so that only one item is
+        held in memory while the response is sent.
+        """
         cal = icalendar.Calendar()
         cal.add("prodid", "-// django-scheduler //")
         cal.add("version", "2.0")
+        yield cal.to_ical()[: -len(CALENDAR_END)]
 
-        for item in list(self.items()):
+        for item in items:
             event = icalendar.Event()
 
             for vkey, key in EVENT_ITEMS:
@@ -29,12 +45,9 @@ class ICalendarFeed:
                 if value:
                     event.add(vkey, value)
 
-            cal.add_component(event)
-
-        response = HttpResponse(cal.to_ical())
-        response["Content-Type"] = "text/calendar"
+            yield event.to_ical()
 
-        return response
+        yield CALENDAR_END
 
     def items(self):
         return []
@@ -59,3 +72,12 @@ class ICalendarFeed:
 
     def item_created(self, item):
         pass
+
+    def item_rrule(self, item):
+        pass
+
+    def item_exdate(self, item):
+        pass
+
+    def item_recurrence_id(self, item):
+        pass
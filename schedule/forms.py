@@ -32,7 +32,7 @@ class EventForm(SpanForm):
 
     class Meta:
         model = Event
-        exclude = ("creator", "created_on", "calendar")
+        exclude = ("creator", "created_on", "calendar", "uid")
 
 
 class OccurrenceForm(SpanForm):
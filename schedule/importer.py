@@ -0,0 +1,323 @@
+"""
+Imports iCalendar files into a calendar.
+
+The file is read one VEVENT at a time, and the events are written in batches
+with ``Event.objects.bulk_ingest``, so large files are imported in a bounded
+amount of memory and a few queries per batch.
+"""
+
+import datetime
+
+import icalendar
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from schedule.models import Calendar, CalendarChange, Event, Occurrence, freqs
+from schedule.models.events import OccurrenceIndex
+from schedule.settings import USE_OCCURRENCE_INDEX
+
+# the parts of an iCalendar RRULE that translate as is to the params of Rule,
+# in the order they are written in the params
+RRULE_PARAMS = (
+    "count",
+    "interval",
+    "bysetpos",
+    "bymonth",
+    "bymonthday",
+    "byyearday",
+    "byweekno",
+    "byhour",
+    "byminute",
+    "bysecond",
+)
+
+FREQUENCIES = {frequency for frequency, label in freqs}
+
+
+def import_icalendar(lines, calendar, batch_size=500, progress=None):
+    """
+    Imports the VEVENTs of the iCalendar file read from ``lines`` (an iterable
+    of str or bytes lines, e.g. a file) into ``calendar``. Events are created,
+    or updated if an event with the same UID was imported before, and their
+    RRULE is looked up or created as a ``Rule``. EXDATEs are stored as
+    cancelled occurrences and the VEVENTs with a RECURRENCE-ID as moved ones.
+
+    ``progress``, if given, is called with the number of VEVENTs read after
+    every batch of ``batch_size`` events. Returns the number of imported
+    events and occurrences and of skipped VEVENTs, which have no UID, an
+    unsupported RRULE or no duration.
+    """
+    counts = {"events": 0, "occurrences": 0, "skipped": 0}
+    # the persisted occurrences of the imported events that are neither an
+    # EXDATE nor, unless an override matches them later, a RECURRENCE-ID
+    stale = set()
+    batch = []
+    overrides = []
+    read = 0
+    for component in iter_vevents(lines):
+        read += 1
+        if component.get("RECURRENCE-ID") is not None:
+            # overrides are applied once their events are all imported
+            override = _parse_override(component)
+            if override is None:
+                counts["skipped"] += 1
+            else:
+                overrides.append(override)
+            continue
+        event = _parse_event(component)
+        if event is None:
+            counts["skipped"] += 1
+            continue
+        batch.append(event)
+        if len(batch) >= batch_size:
+            _import_events(batch, calendar, batch_size, counts, stale)
+            batch = []
+            if progress is not None:
+                progress(read)
+    if batch:
+        _import_events(batch, calendar, batch_size, counts, stale)
+    while overrides:
+        batch, overrides = overrides[:batch_size], overrides[batch_size:]
+        _import_overrides(batch, calendar, counts, stale)
+    # deleted with their signals, as there are few of them
+    for occurrence in Occurrence.objects.filter(pk__in=stale):
+        occurrence.delete()
+    if progress is not None:
+        progress(read)
+    return counts
+
+
+def iter_vevents(lines):
+    """
+    Yields the VEVENT components of an iCalendar file one at a time, without
+    parsing the whole file.
+    """
+    block = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r\n")
+        if block is None:
+            if line.upper() == "BEGIN:VEVENT":
+                block = [line]
+        else:
+            block.append(line)
+            if line.upper() == "END:VEVENT":
+                yield icalendar.Event.from_ical("\r\n".join(block))
+                block = None
+
+
+def _to_datetime(value, end_of_day=False):
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(
+            value, datetime.time.max if end_of_day else datetime.time.min
+        )
+    if settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    if not settings.USE_TZ and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def _get_span(component):
+    """
+    Returns the start and end of the VEVENT, or None if it has no duration.
+    """
+    start = component.get("DTSTART")
+    if start is None:
+        return None
+    start = start.dt
+    if component.get("DTEND") is not None:
+        end = component["DTEND"].dt
+    elif component.get("DURATION") is not None:
+        end = start + component["DURATION"].dt
+    elif not isinstance(start, datetime.datetime):
+        # all day events last one day by default
+        end = start + datetime.timedelta(days=1)
+    else:
+        return None
+    start, end = _to_datetime(start), _to_datetime(end)
+    if end <= start:
+        return None
+    return start, end
+
+
+def _get_rule(rrule):
+    """
+    Returns the rule dictionary of ``Event.objects.bulk_ingest`` and the end
+    of the recurring period of an RRULE, or None if it can't be expressed
+    with the params of ``Rule``.
+    """
+    frequency = rrule.get("FREQ", [None])[0]
+    if frequency not in FREQUENCIES:
+        return None
+    params = []
+    for param in RRULE_PARAMS:
+        if param.upper() in rrule:
+            values = ",".join(str(value) for value in rrule[param.upper()])
+            params.append("{}:{}".format(param, values))
+    days = [str(day).upper() for day in rrule.get("BYDAY", [])]
+    if any(not day[-2:].isalpha() or len(day) > 2 for day in days):
+        # an ordinal weekday (e.g. -1FR, the last friday) is the same as a
+        # setpos of the weekdays, but only for a single weekday of the
+        # month or the year
+        if (
+            len(days) > 1
+            or "BYSETPOS" in rrule
+            or frequency not in ("MONTHLY", "YEARLY")
+            or (frequency == "YEARLY" and "BYMONTH" in rrule)
+        ):
+            return None
+        params.append("bysetpos:{}".format(int(days[0][:-2])))
+        days = [days[0][-2:]]
+    if days:
+        params.append("byweekday:{}".format(",".join(days)))
+    if "WKST" in rrule:
+        params.append("wkst:{}".format(str(rrule["WKST"][0]).upper()))
+    until = rrule.get("UNTIL")
+    if until:
+        until = _to_datetime(until[0], end_of_day=True)
+    return {"frequency": frequency, "params": ";".join(params)}, until or None
+
+
+def _parse_event(component):
+    uid = str(component.get("UID", ""))
+    span = _get_span(component)
+    if not uid or span is None:
+        return None
+    event = {
+        "uid": uid,
+        "title": str(component.get("SUMMARY", "")) or uid,
+        "description": str(component.get("DESCRIPTION", "")),
+        "start": span[0],
+        "end": span[1],
+        "rule": None,
+        "end_recurring_period": None,
+    }
+    exdates = []
+    rrule = component.get("RRULE")
+    if rrule is not None:
+        if isinstance(rrule, list):
+            return None
+        rule = _get_rule(rrule)
+        if rule is None:
+            return None
+        event["rule"], event["end_recurring_period"] = rule
+        exdate = component.get("EXDATE", [])
+        for dates in exdate if isinstance(exdate, list) else [exdate]:
+            exdates.extend(_to_datetime(date.dt) for date in dates.dts)
+    return event, exdates
+
+
+def _parse_override(component):
+    uid = str(component.get("UID", ""))
+    span = _get_span(component)
+    if not uid or span is None:
+        return None
+    return {
+        "uid": uid,
+        "original_start": _to_datetime(component["RECURRENCE-ID"].dt),
+        "title": str(component.get("SUMMARY", "")),
+        "description": str(component.get("DESCRIPTION", "")),
+        "start": span[0],
+        "end": span[1],
+        "cancelled": str(component.get("STATUS", "")).upper() == "CANCELLED",
+    }
+
+
+def _import_events(batch, calendar, batch_size, counts, stale):
+    with transaction.atomic():
+        events = Event.objects.bulk_ingest(
+            [event for event, exdates in batch], calendar, batch_size=batch_size
+        )
+        occurrences = {}
+        for event, (data, exdates) in zip(events, batch):
+            occurrences[event.pk] = {
+                start: Occurrence(
+                    event=event,
+                    start=start,
+                    end=start + (event.end - event.start),
+                    original_start=start,
+                    original_end=start + (event.end - event.start),
+                    cancelled=True,
+                )
+                for start in exdates
+            }
+        _save_occurrences(occurrences, calendar, counts, stale, replace=True)
+    counts["events"] += len(batch)
+
+
+def _import_overrides(overrides, calendar, counts, stale):
+    with transaction.atomic():
+        events = Event.objects.filter(
+            calendar=calendar, uid__in={override["uid"] for override in overrides}
+        )
+        events = {event.uid: event for event in events}
+        occurrences = {}
+        for override in overrides:
+            event = events.get(override.pop("uid"))
+            if event is None:
+                counts["skipped"] += 1
+                continue
+            start = override["original_start"]
+            override["title"] = override["title"] or event.title
+            occurrences.setdefault(event.pk, {})[start] = Occurrence(
+                event=event, original_end=start + (event.end - event.start), **override
+            )
+        _save_occurrences(occurrences, calendar, counts, stale, replace=False)
+
+
+def _save_occurrences(occurrences, calendar, counts, stale, replace):
+    """
+    Saves the occurrences, given by event id and original start, over the
+    persisted occurrences of the events with the same original start. With
+    ``replace``, the other persisted occurrences of the events are added to
+    ``stale``.
+    """
+    fields = ["title", "description", "start", "end", "cancelled", "original_end"]
+    created = []
+    updated = []
+    existing = Occurrence.objects.filter(event__in=list(occurrences))
+    for occurrence in existing.order_by("pk"):
+        new = occurrences[occurrence.event_id].pop(occurrence.original_start, None)
+        if new is None:
+            if replace:
+                stale.add(occurrence.pk)
+            continue
+        stale.discard(occurrence.pk)
+        if any(getattr(occurrence, field) != getattr(new, field) for field in fields):
+            new.pk = occurrence.pk
+            updated.append(new)
+    for event_occurrences in occurrences.values():
+        created.extend(event_occurrences.values())
+    if not created and not updated:
+        return
+    created = Occurrence.objects.bulk_create(created)
+    if updated:
+        now = timezone.now()
+        for occurrence in updated:
+            occurrence.updated_on = now
+        Occurrence.objects.bulk_update(updated, fields + ["updated_on"])
+    Calendar.objects.bump_versions([calendar.pk])
+    CalendarChange.objects.bulk_create(
+        [
+            CalendarChange(
+                calendar=calendar,
+                object_type=CalendarChange.OCCURRENCE,
+                object_id=occurrence.pk,
+                event_id=occurrence.event_id,
+                action=action,
+            )
+            for changed, action in (
+                (created, CalendarChange.CREATED),
+                (updated, CalendarChange.UPDATED),
+            )
+            for occurrence in changed
+            if occurrence.pk is not None
+        ]
+    )
+    if USE_OCCURRENCE_INDEX:
+        for event in {occurrence.event for occurrence in created + updated}:
+            OccurrenceIndex.objects.rebuild(event)
+    counts["occurrences"] += len(created) + len(updated)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from schedule.importer import import_icalendar
+from schedule.models import Calendar
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the events of an iCalendar file into a calendar. Events that "
+        "were imported before, with the same UID, are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The .ics file to import.")
+        parser.add_argument("calendar_slug", help="The calendar to import into.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            calendar = Calendar.objects.get(slug=options["calendar_slug"])
+        except Calendar.DoesNotExist:
+            raise CommandError("Calendar %s does not exist." % options["calendar_slug"])
+
+        def progress(count):
+            self.stdout.write("Read %d events." % count)
+
+        with open(options["path"], "rb") as lines:
+            counts = import_icalendar(
+                lines, calendar, batch_size=options["batch_size"], progress=progress
+            )
+        self.stdout.write(
+            "Imported %(events)d events and %(occurrences)d occurrences, "
+            "skipped %(skipped)d." % counts
+        )
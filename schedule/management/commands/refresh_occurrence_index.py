@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from schedule.models import Event, OccurrenceIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Rolls the occurrence index forward to the configured horizon. "
+        "Should be run periodically (e.g. daily) when USE_OCCURRENCE_INDEX is on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild every event, including the ones whose occurrences "
+            "are already fully indexed.",
+        )
+
+    def handle(self, *args, **options):
+        horizon = OccurrenceIndex.objects.horizon()
+        events = Event.objects.select_related("rule")
+        if not options["all"]:
+            # events whose last occurrence is already indexed don't change
+            # when the horizon moves forward
+            finished = Q(rule__isnull=True, end__lt=F("indexed_until")) | Q(
+                end_recurring_period__lt=F("indexed_until")
+            )
+            events = events.exclude(finished)
+        count = 0
+        for event in events.iterator():
+            OccurrenceIndex.objects.rebuild(event, horizon)
+            count += 1
+        self.stdout.write("Indexed %d events up to %s." % (count, horizon))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from schedule.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Computes the effective start and end of existing events. Only needed "
+        "once for the events created before these columns existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every event, not only the ones without an "
+            "effective start.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        events = Event.objects.select_related("rule")
+        if not options["all"]:
+            events = events.filter(effective_start__isnull=True)
+        batch = []
+        count = 0
+        for event in events.iterator():
+            event.effective_start, event.effective_end = event._get_effective_span()
+            batch.append(event)
+            if len(batch) >= options["batch_size"]:
+                count += self._update(batch)
+                batch = []
+        count += self._update(batch)
+        self.stdout.write("Updated %d events." % count)
+
+    def _update(self, events):
+        Event.objects.bulk_update(events, ["effective_start", "effective_end"])
+        return len(events)
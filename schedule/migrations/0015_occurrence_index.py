@@ -0,0 +1,66 @@
+# Generated by Django 4.1.13 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0014_use_autofields_for_pk"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="indexed_until",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="indexed until"
+            ),
+        ),
+        migrations.CreateModel(
+            name="OccurrenceIndex",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField(db_index=True, verbose_name="start")),
+                ("end", models.DateTimeField(db_index=True, verbose_name="end")),
+                ("original_start", models.DateTimeField(verbose_name="original start")),
+                ("original_end", models.DateTimeField(verbose_name="original end")),
+                (
+                    "cancelled",
+                    models.BooleanField(default=False, verbose_name="cancelled"),
+                ),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="schedule.event",
+                        verbose_name="event",
+                    ),
+                ),
+                (
+                    "occurrence",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="schedule.occurrence",
+                        verbose_name="occurrence",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "occurrence index",
+                "verbose_name_plural": "occurrence indexes",
+                "index_together": {("start", "end"), ("event", "original_start")},
+            },
+        ),
+    ]
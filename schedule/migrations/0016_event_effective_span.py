@@ -0,0 +1,37 @@
+# Generated by Django 4.1.13 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0015_occurrence_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="effective_end",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="The end of the last occurrence, empty if it recurs forever.",
+                null=True,
+                verbose_name="effective end",
+            ),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="effective_start",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="The start of the first occurrence.",
+                null=True,
+                verbose_name="effective start",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.13 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0016_event_effective_span"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendar",
+            name="version",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Incremented whenever an event of the calendar changes.",
+                verbose_name="version",
+            ),
+        ),
+    ]
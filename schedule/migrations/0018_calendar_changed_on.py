@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0017_calendar_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendar",
+            name="changed_on",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                editable=False,
+                help_text="When the calendar or one of its events last changed.",
+                verbose_name="changed on",
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0018_calendar_changed_on"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarChange",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[("event", "event"), ("occurrence", "occurrence")],
+                        max_length=10,
+                        verbose_name="object type",
+                    ),
+                ),
+                ("object_id", models.IntegerField(verbose_name="object id")),
+                ("event_id", models.IntegerField(verbose_name="event id")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("created", "created"),
+                            ("updated", "updated"),
+                            ("deleted", "deleted"),
+                        ],
+                        max_length=7,
+                        verbose_name="action",
+                    ),
+                ),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created on"),
+                ),
+                (
+                    "calendar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="schedule.calendar",
+                        verbose_name="calendar",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "calendar change",
+                "verbose_name_plural": "calendar changes",
+                "index_together": {("calendar", "id")},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("schedule", "0019_calendarchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="uid",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="The iCalendar UID of an imported event.",
+                max_length=255,
+                verbose_name="uid",
+            ),
+        ),
+    ]
@@ -1,3 +1,3 @@
-from schedule.models.calendars import Calendar, CalendarRelation  # noqa
+from schedule.models.calendars import Calendar, CalendarChange, CalendarRelation  # noqa
 from schedule.models.events import *  # noqa
 from schedule.models.rules import *  # noqa
@@ -1,7 +1,9 @@
+import threading
+
 from django.contrib.contenttypes import fields
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import Q
+from django.db.models import F, Q
 from django.template.defaultfilters import slugify
 from django.urls import reverse
 from django.utils import timezone
@@ -17,6 +19,16 @@ class CalendarManager(models.Manager):
     >>> user1.save()
     """
 
+    def bump_versions(self, calendar_ids):
+        """
+        Increments the ``version`` of the given calendars, which invalidates
+        the cached data computed from their events, and sets their
+        ``changed_on`` to now.
+        """
+        return self.filter(pk__in=calendar_ids).update(
+            version=F("version") + 1, changed_on=timezone.now()
+        )
+
     def get_calendar_for_object(self, obj, distinction=""):
         """
         This function gets a calendar for an object.  It should only return one
@@ -140,6 +152,18 @@ class Calendar(models.Model):
 
     name = models.CharField(_("name"), max_length=200)
     slug = models.SlugField(_("slug"), max_length=200, unique=True)
+    version = models.PositiveIntegerField(
+        _("version"),
+        default=0,
+        editable=False,
+        help_text=_("Incremented whenever an event of the calendar changes."),
+    )
+    changed_on = models.DateTimeField(
+        _("changed on"),
+        default=timezone.now,
+        editable=False,
+        help_text=_("When the calendar or one of its events last changed."),
+    )
     objects = CalendarManager()
 
     class Meta:
@@ -149,6 +173,10 @@ class Calendar(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.changed_on = timezone.now()
+        super().save(*args, **kwargs)
+
     @property
     def events(self):
         return self.event_set
@@ -172,8 +200,8 @@ class Calendar(models.Model):
         """
         return self.events.order_by("-start").filter(start__lt=timezone.now())[:amount]
 
-    def occurrences_after(self, date=None):
-        return EventListManager(self.events.all()).occurrences_after(date)
+    def occurrences_after(self, date=None, spans=False):
+        return EventListManager(self.events.all()).occurrences_after(date, spans)
 
     def get_absolute_url(self):
         if USE_FULLCALENDAR:
@@ -235,3 +263,106 @@ class CalendarRelation(models.Model):
 
     def __str__(self):
         return "{} - {}".format(self.calendar, self.content_object)
+
+
+class CalendarChangeManager(models.Manager):
+    # the calendars being deleted in the current thread
+    _deleting = threading.local()
+
+    def _deleting_calendar_ids(self):
+        if not hasattr(self._deleting, "calendar_ids"):
+            self._deleting.calendar_ids = set()
+        return self._deleting.calendar_ids
+
+    def calendar_deleting(self, calendar_id):
+        """
+        Stops recording the changes of ``calendar_id`` until
+        ``calendar_deleted`` is called, as the changes of the events and
+        occurrences deleted with a calendar would refer to it once it's gone.
+        """
+        self._deleting_calendar_ids().add(calendar_id)
+
+    def calendar_deleted(self, calendar_id):
+        self._deleting_calendar_ids().discard(calendar_id)
+
+    def record(self, calendar_ids, object_type, object_id, event_id, action):
+        """
+        Records that the event or occurrence ``object_id`` of the event
+        ``event_id`` was created, updated or deleted in the given calendars.
+        """
+        deleting = self._deleting_calendar_ids()
+        self.bulk_create(
+            [
+                self.model(
+                    calendar_id=calendar_id,
+                    object_type=object_type,
+                    object_id=object_id,
+                    event_id=event_id,
+                    action=action,
+                )
+                for calendar_id in calendar_ids
+                if calendar_id is not None and calendar_id not in deleting
+            ]
+        )
+
+    def latest_token(self, before=None):
+        """
+        Returns the sync token of the latest change of any calendar, or of the
+        latest change recorded at or before ``before`` if given.
+        """
+        changes = self.all() if before is None else self.filter(created_on__lte=before)
+        return changes.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+    def since(self, calendar, sync_token):
+        """
+        Returns the changes of ``calendar`` after the change ``sync_token``,
+        oldest first.
+        """
+        return self.filter(calendar=calendar, pk__gt=sync_token).order_by("pk")
+
+
+class CalendarChange(models.Model):
+    """
+    A change log of the events and persisted occurrences of the calendars.
+    The ids of the changes increase monotonically and are used as sync tokens
+    by clients that mirror a calendar, which only fetch the changes since the
+    last token they saw.
+
+    The log grows with every change. Old changes can be deleted, after which
+    clients holding an older token should sync the calendar again in full.
+    """
+
+    EVENT = "event"
+    OCCURRENCE = "occurrence"
+    OBJECT_TYPE_CHOICES = ((EVENT, _("event")), (OCCURRENCE, _("occurrence")))
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ACTION_CHOICES = (
+        (CREATED, _("created")),
+        (UPDATED, _("updated")),
+        (DELETED, _("deleted")),
+    )
+
+    calendar = models.ForeignKey(
+        Calendar, on_delete=models.CASCADE, verbose_name=_("calendar")
+    )
+    object_type = models.CharField(
+        _("object type"), max_length=10, choices=OBJECT_TYPE_CHOICES
+    )
+    object_id = models.IntegerField(_("object id"))
+    event_id = models.IntegerField(_("event id"))
+    action = models.CharField(_("action"), max_length=7, choices=ACTION_CHOICES)
+    created_on = models.DateTimeField(_("created on"), auto_now_add=True)
+
+    objects = CalendarChangeManager()
+
+    class Meta:
+        verbose_name = _("calendar change")
+        verbose_name_plural = _("calendar changes")
+        index_together = [("calendar", "id")]
+
+    def __str__(self):
+        return "{} {} {} ({})".format(
+            self.object_type, self.object_id, self.action, self.calendar_id
+        )
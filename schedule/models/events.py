@@ -1,20 +1,35 @@
 import datetime
+import itertools
+import uuid
 
-import pytz
 from dateutil import rrule
 from django.conf import settings as django_settings
 from django.contrib.contenttypes import fields
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction
 from django.db.models import Q
 from django.template.defaultfilters import date
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext, gettext_lazy as _
 
-from schedule.models.calendars import Calendar
-from schedule.models.rules import Rule
-from schedule.utils import OccurrenceReplacer
+from schedule.expansion import SimpleRecurrence
+from schedule.models.calendars import Calendar, CalendarChange
+from schedule.models.rules import Rule, freqs
+from schedule.settings import (
+    OCCURRENCE_INDEX_HORIZON_DAYS,
+    USE_NUMPY_EXPANSION,
+    USE_OCCURRENCE_INDEX,
+)
+from schedule.utils import OccurrenceReplacer, localize, rrule_cache
+
+
+def _to_timezone(value, tzinfo):
+    if timezone.is_naive(value):
+        return timezone.make_aware(value, tzinfo)
+    return value.astimezone(tzinfo)
+
 
 freq_dict_order = {
     "YEARLY": 0,
@@ -37,12 +52,268 @@ param_dict_order = {
 }
 
 
-class EventManager(models.Manager):
+class EventQuerySet(models.QuerySet):
+    # occurrences are expanded in the wall clock time of the requested
+    # timezone, which can shift them from the stored (UTC) span by a DST offset
+    span_margin = datetime.timedelta(days=1)
+
+    def overlapping(self, start, end):
+        """
+        Returns the events that can have occurrences between start (inclusive)
+        and end (exclusive) according to their effective span. Events whose
+        span hasn't been computed yet and events with a persisted occurrence
+        moved into the timespan are always included.
+        """
+        span_q = Q(effective_start__lt=end + self.span_margin) & (
+            Q(effective_end__isnull=True)
+            | Q(effective_end__gte=start - self.span_margin)
+        )
+        moved_q = Q(
+            pk__in=Occurrence.objects.filter(start__lt=end, end__gte=start).values(
+                "event_id"
+            )
+        )
+        return self.filter(Q(effective_start__isnull=True) | span_q | moved_q)
+
+
+class EventManager(models.Manager.from_queryset(EventQuerySet)):
     def get_for_object(self, content_object, distinction="", inherit=True):
         return EventRelation.objects.get_events_for_object(
             content_object, distinction, inherit
         )
 
+    def expand(self, events, start, end, tzinfo=None, spans=False):
+        """
+        Returns the occurrences of all ``events`` between start (inclusive) and
+        end (exclusive) sorted by start, like ``Event.get_occurrences`` does for
+        a single event. The events, their rules and their persisted occurrences
+        are fetched with two queries however many events there are.
+
+        ``events`` is a queryset (narrowed down with ``overlapping``) or a list
+        of events. If ``tzinfo`` is given, naive start and end are localized in
+        it and aware ones converted to it, which sets the timezone in whose
+        wall clock time the rules are expanded. The occurrences that aren't
+        persisted are ``OccurrenceSpan`` values if ``spans`` is true.
+        """
+        start, end, events = self._expansion_events(events, start, end, tzinfo)
+        events = {event.pk: event for event in events}
+        persisted_occurrences = list(self._persisted_occurrences(events, start, end))
+        return self._expand(events, persisted_occurrences, start, end, spans)
+
+    async def aexpand(self, events, start, end, tzinfo=None, spans=False):
+        """
+        The asynchronous version of ``expand``, which fetches the events and
+        their persisted occurrences with the async ORM (Django 4.1+).
+        """
+        start, end, events = self._expansion_events(events, start, end, tzinfo)
+        if isinstance(events, models.QuerySet):
+            events = {event.pk: event async for event in events}
+        else:
+            events = {event.pk: event for event in events}
+        persisted_occurrences = [
+            occurrence
+            async for occurrence in self._persisted_occurrences(events, start, end)
+        ]
+        return self._expand(events, persisted_occurrences, start, end, spans)
+
+    def _expansion_events(self, events, start, end, tzinfo):
+        if tzinfo is not None:
+            start = _to_timezone(start, tzinfo)
+            end = _to_timezone(end, tzinfo)
+        if isinstance(events, models.QuerySet):
+            events = events.overlapping(start, end).select_related("rule")
+        return start, end, events
+
+    def _persisted_occurrences(self, events, start, end):
+        return Occurrence.objects.filter(event__in=list(events)).filter(
+            Q(original_start__lt=end, original_end__gte=start)
+            | Q(start__lt=end, end__gte=start)
+        )
+
+    def _expand(self, events, persisted_occurrences, start, end, spans):
+        for occurrence in persisted_occurrences:
+            occurrence.event = events[occurrence.event_id]
+        occ_replacer = OccurrenceReplacer(persisted_occurrences)
+        occurrences = []
+        for event in events.values():
+            occurrences += event._replace_persisted_occurrences(
+                event._get_occurrence_list(start, end, spans),
+                occ_replacer,
+                start,
+                end,
+            )
+        occurrences += occ_replacer.get_additional_occurrences(start, end)
+        return sorted(occurrences, key=lambda occurrence: occurrence.start)
+
+    def bulk_ingest(self, events, calendar, batch_size=500):
+        """
+        Creates the events described by the dictionaries in ``events`` in
+        ``calendar`` with ``bulk_create`` and returns them. The dictionaries
+        have the fields of ``Event`` (``title``, ``start`` and ``end`` are
+        required) and their ``rule`` is a ``Rule``, ``None`` or a dictionary
+        with a ``frequency`` and optional ``params`` and ``name``. Rules are
+        looked up by frequency and params, and the missing ones are created.
+        Naive datetimes are made aware in the current time zone when
+        ``USE_TZ`` is set, and aware ones naive otherwise.
+
+        The events with a ``uid`` that is already used in ``calendar`` are
+        updated with ``bulk_update`` instead, if any of their fields changed,
+        so ingesting the same events again doesn't duplicate them.
+
+        Nothing is created if one of the events is invalid, in which case a
+        ``ValidationError`` is raised. No signals are sent: the effective
+        span, the calendar version, the change log and the occurrence index
+        are updated here.
+
+        On databases that don't return the ids of bulk inserted rows (e.g.
+        MySQL), the created events are read back by ``uid`` to get their ids,
+        and the events without one are given a random ``uid`` for this.
+        """
+        events = [dict(data) for data in events]
+        frequencies = {frequency for frequency, label in freqs}
+        rule_keys = {}
+        for index, data in enumerate(events):
+            for field in ("title", "start", "end"):
+                if not data.get(field):
+                    raise ValidationError(
+                        _("Event %(index)s: %(field)s is required."),
+                        params={"index": index, "field": field},
+                    )
+            # like form fields, naive datetimes are in the current time zone
+            for field in ("start", "end", "end_recurring_period"):
+                value = data.get(field)
+                if value is None:
+                    continue
+                if django_settings.USE_TZ and timezone.is_naive(value):
+                    data[field] = timezone.make_aware(value)
+                elif not django_settings.USE_TZ and timezone.is_aware(value):
+                    data[field] = timezone.make_naive(value)
+            if data["end"] <= data["start"]:
+                raise ValidationError(
+                    _("Event %(index)s: The end time must be later than start time."),
+                    params={"index": index},
+                )
+            rule = data.get("rule")
+            if isinstance(rule, dict):
+                if rule.get("frequency") not in frequencies:
+                    raise ValidationError(
+                        _("Event %(index)s: invalid frequency %(frequency)s."),
+                        params={"index": index, "frequency": rule.get("frequency")},
+                    )
+                key = (rule["frequency"], rule.get("params", ""))
+                rule_keys.setdefault(key, rule.get("name") or rule["frequency"])
+
+        with transaction.atomic():
+            rules = {}
+            if rule_keys:
+                rule_frequencies = {frequency for frequency, params in rule_keys}
+                for rule in Rule.objects.filter(
+                    frequency__in=rule_frequencies
+                ).order_by("pk"):
+                    rules.setdefault((rule.frequency, rule.params), rule)
+                # there are few distinct rules, and they are created one by
+                # one because bulk_create doesn't return ids on all databases
+                for (frequency, params), name in rule_keys.items():
+                    if (frequency, params) not in rules:
+                        rules[(frequency, params)] = Rule.objects.create(
+                            frequency=frequency, params=params, name=name[:32]
+                        )
+            uids = {data["uid"] for data in events if data.get("uid")}
+            by_uid = {}
+            if uids:
+                by_uid = {
+                    event.uid: event
+                    for event in self.filter(calendar=calendar, uid__in=uids)
+                }
+            instances = []
+            created = []
+            updated = {}
+            update_fields = {"effective_start", "effective_end", "updated_on"}
+            for data in events:
+                rule = data.get("rule")
+                if isinstance(rule, dict):
+                    data["rule"] = rules[(rule["frequency"], rule.get("params", ""))]
+                event = by_uid.get(data.get("uid"))
+                if event is None:
+                    event = self.model(calendar=calendar, **data)
+                    created.append(event)
+                    if event.uid:
+                        by_uid[event.uid] = event
+                else:
+                    # related objects are compared by id to not fetch them
+                    changed = [
+                        field
+                        for field, value in data.items()
+                        if getattr(event, self.model._meta.get_field(field).attname)
+                        != getattr(value, "pk", value)
+                    ]
+                    if not changed:
+                        instances.append(event)
+                        continue
+                    for field in changed:
+                        setattr(event, field, data[field])
+                    update_fields.update(changed)
+                    if event.pk is not None:
+                        updated[event.pk] = event
+                event.effective_start, event.effective_end = event._get_effective_span()
+                instances.append(event)
+            can_return_ids = connections[
+                self.db
+            ].features.can_return_rows_from_bulk_insert
+            if not can_return_ids:
+                for event in created:
+                    if not event.uid:
+                        event.uid = str(uuid.uuid4())
+            created = self.bulk_create(created, batch_size=batch_size)
+            if not can_return_ids:
+                self._fetch_ids(created, calendar, batch_size)
+            if updated:
+                now = timezone.now()
+                for event in updated.values():
+                    event.updated_on = now
+                self.bulk_update(
+                    updated.values(), list(update_fields), batch_size=batch_size
+                )
+            if not created and not updated:
+                return instances
+
+            Calendar.objects.bump_versions([calendar.pk])
+            CalendarChange.objects.bulk_create(
+                [
+                    CalendarChange(
+                        calendar=calendar,
+                        object_type=CalendarChange.EVENT,
+                        object_id=event.pk,
+                        event_id=event.pk,
+                        action=action,
+                    )
+                    for changed_events, action in (
+                        (created, CalendarChange.CREATED),
+                        (updated.values(), CalendarChange.UPDATED),
+                    )
+                    for event in changed_events
+                ],
+                batch_size=batch_size,
+            )
+            if USE_OCCURRENCE_INDEX:
+                for event in itertools.chain(created, updated.values()):
+                    OccurrenceIndex.objects.rebuild(event)
+        return instances
+
+    def _fetch_ids(self, events, calendar, batch_size):
+        """
+        Sets the ids of bulk created ``events``, which all have a ``uid``, from
+        the database.
+        """
+        by_uid = {event.uid: event for event in events}
+        uids = list(by_uid)
+        while uids:
+            batch, uids = uids[:batch_size], uids[batch_size:]
+            for pk, uid in self.filter(calendar=calendar, uid__in=batch).values_list(
+                "pk", "uid"
+            ):
+                by_uid[uid].pk = pk
+
 
 class Event(models.Model):
     """
@@ -87,6 +358,32 @@ class Event(models.Model):
         Calendar, on_delete=models.CASCADE, verbose_name=_("calendar")
     )
     color_event = models.CharField(_("Color event"), blank=True, max_length=10)
+    uid = models.CharField(
+        _("uid"),
+        max_length=255,
+        blank=True,
+        db_index=True,
+        help_text=_("The iCalendar UID of an imported event."),
+    )
+    effective_start = models.DateTimeField(
+        _("effective start"),
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_("The start of the first occurrence."),
+    )
+    effective_end = models.DateTimeField(
+        _("effective end"),
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_("The end of the last occurrence, empty if it recurs forever."),
+    )
+    indexed_until = models.DateTimeField(
+        _("indexed until"), null=True, blank=True, editable=False
+    )
     objects = EventManager()
 
     class Meta:
@@ -116,7 +413,7 @@ class Event(models.Model):
     def get_absolute_url(self):
         return reverse("event", args=[self.id])
 
-    def get_occurrences(self, start, end, clear_prefetch=True):
+    def get_occurrences(self, start, end, clear_prefetch=True, spans=False):
         """
         >>> rule = Rule(frequency = "MONTHLY", name = "Monthly")
         >>> rule.save()
@@ -133,6 +430,9 @@ class Event(models.Model):
         >>> occurrences = event.get_occurrences(datetime.datetime(2008,1,24), datetime.datetime(2008,3,2))
         >>> ["%s to %s" %(o.start, o.end) for o in occurrences]
         []
+
+        The occurrences that aren't persisted are ``OccurrenceSpan`` values
+        instead of ``Occurrence`` instances if ``spans`` is true.
         """
 
         # Explanation of clear_prefetch:
@@ -163,7 +463,19 @@ class Event(models.Model):
 
         persisted_occurrences = self.occurrence_set.all()
         occ_replacer = OccurrenceReplacer(persisted_occurrences)
-        occurrences = self._get_occurrence_list(start, end)
+        final_occurrences = self._replace_persisted_occurrences(
+            self._get_occurrence_list(start, end, spans), occ_replacer, start, end
+        )
+        # then add persisted occurrences which originated outside of this period but now
+        # fall within it
+        final_occurrences += occ_replacer.get_additional_occurrences(start, end)
+        return final_occurrences
+
+    def _replace_persisted_occurrences(self, occurrences, occ_replacer, start, end):
+        """
+        Replaces the generated ``occurrences`` with their persisted counterparts
+        found in ``occ_replacer``, dropping the ones moved out of the timespan.
+        """
         final_occurrences = []
         for occ in occurrences:
             # replace occurrences with their persisted counterparts
@@ -174,16 +486,44 @@ class Event(models.Model):
                     final_occurrences.append(p_occ)
             else:
                 final_occurrences.append(occ)
-        # then add persisted occurrences which originated outside of this period but now
-        # fall within it
-        final_occurrences += occ_replacer.get_additional_occurrences(start, end)
         return final_occurrences
 
     def get_rrule_object(self, tzinfo):
         if self.rule is None:
             return
+        if self.pk is None:
+            return self._build_rrule_object(tzinfo)
+        return rrule_cache.get(
+            self._rrule_cache_key(tzinfo), lambda: self._build_rrule_object(tzinfo)
+        )
+
+    def _rrule_cache_key(self, tzinfo):
+        # start and end_recurring_period are part of the key so that unsaved
+        # changes to the event don't hit a stale entry, and the frequency and
+        # params of the rule so that a rule edited in another process, which
+        # doesn't invalidate the cache of this one, doesn't hit one either
+        return (
+            self.pk,
+            self.updated_on,
+            self.rule_id,
+            self.rule.frequency,
+            self.rule.params,
+            tzinfo,
+            self.start,
+            self.end_recurring_period,
+        )
+
+    def _build_rrule_object(self, tzinfo):
         params = self._event_params()
         frequency = self.rule.rrule_frequency()
+        dtstart, until = self._get_rrule_bounds(tzinfo)
+        return rrule.rrule(frequency, dtstart=dtstart, until=until, **params)
+
+    def _get_rrule_bounds(self, tzinfo):
+        """
+        Returns the naive dtstart and until of the rrule of this event in
+        ``tzinfo``.
+        """
         if timezone.is_naive(self.start):
             dtstart = self.start
         else:
@@ -196,11 +536,31 @@ class Event(models.Model):
         else:
             until = self.end_recurring_period.astimezone(tzinfo).replace(tzinfo=None)
 
-        return rrule.rrule(frequency, dtstart=dtstart, until=until, **params)
+        return dtstart, until
 
-    def _create_occurrence(self, start, end=None):
+    def _get_recurrence(self, tzinfo):
+        """
+        Returns the object used to expand this event in ``tzinfo``: a vectorized
+        expander for simple rules (see ``schedule.expansion``), otherwise its
+        rrule. Both offer the ``before`` and ``between`` methods of rrule.
+        """
+        if USE_NUMPY_EXPANSION:
+            if self.pk is None:
+                recurrence = SimpleRecurrence.from_event(self, tzinfo)
+            else:
+                recurrence = rrule_cache.get(
+                    self._rrule_cache_key(tzinfo) + ("simple",),
+                    lambda: SimpleRecurrence.from_event(self, tzinfo),
+                )
+            if recurrence is not None:
+                return recurrence
+        return self.get_rrule_object(tzinfo)
+
+    def _create_occurrence(self, start, end=None, span=False):
         if end is None:
             end = start + (self.end - self.start)
+        if span:
+            return OccurrenceSpan(self, start, end)
         return Occurrence(
             event=self, start=start, end=end, original_start=start, original_end=end
         )
@@ -217,7 +577,7 @@ class Event(models.Model):
             next_occurrence = rule.after(
                 date.astimezone(tzinfo).replace(tzinfo=None), inc=True
             )
-            next_occurrence = pytz.timezone(str(tzinfo)).localize(next_occurrence)
+            next_occurrence = localize(next_occurrence, tzinfo)
         else:
             next_occurrence = self.start
         if next_occurrence == date:
@@ -228,10 +588,11 @@ class Event(models.Model):
                     next_occurrence = timezone.make_naive(next_occurrence, tzinfo)
                 return self._create_occurrence(next_occurrence)
 
-    def _get_occurrence_list(self, start, end):
+    def _get_occurrence_list(self, start, end, spans=False):
         """
         Returns a list of occurrences that fall completely or partially inside
-        the timespan defined by start (inclusive) and end (exclusive)
+        the timespan defined by start (inclusive) and end (exclusive). They are
+        ``OccurrenceSpan`` values if ``spans`` is true.
         """
         if self.rule is not None:
             duration = self.end - self.start
@@ -247,7 +608,7 @@ class Event(models.Model):
             if self.end_recurring_period and self.end_recurring_period < end:
                 end = self.end_recurring_period
 
-            start_rule = self.get_rrule_object(tzinfo)
+            start_rule = self._get_recurrence(tzinfo)
             start = start.replace(tzinfo=None)
             if timezone.is_aware(end):
                 end = end.astimezone(tzinfo).replace(tzinfo=None)
@@ -269,24 +630,26 @@ class Event(models.Model):
             # Add the occurrences found inside timespan
             o_starts.extend(occs)
 
-            # Create the Occurrence objects for the found start dates
+            # Create the Occurrence objects for the found start dates, skipping
+            # the ones already created (see Occurrence.__eq__)
+            seen = set()
             for o_start in o_starts:
-                o_start = pytz.timezone(str(tzinfo)).localize(o_start)
+                o_start = localize(o_start, tzinfo)
                 if use_naive:
                     o_start = timezone.make_naive(o_start, tzinfo)
                 o_end = o_start + duration
-                occurrence = self._create_occurrence(o_start, o_end)
-                if occurrence not in occurrences:
-                    occurrences.append(occurrence)
+                if (o_start, o_end) not in seen:
+                    seen.add((o_start, o_end))
+                    occurrences.append(self._create_occurrence(o_start, o_end, spans))
             return occurrences
         else:
             # check if event is in the period
             if self.start < end and self.end > start:
-                return [self._create_occurrence(self.start)]
+                return [self._create_occurrence(self.start, span=spans)]
             else:
                 return []
 
-    def _occurrences_after_generator(self, after=None):
+    def _occurrences_after_generator(self, after=None, spans=False):
         """
         returns a generator that produces unpresisted occurrences after the
         datetime ``after``. (Optionally) This generator will return up to
@@ -301,16 +664,16 @@ class Event(models.Model):
         rule = self.get_rrule_object(tzinfo)
         if rule is None:
             if self.end > after:
-                yield self._create_occurrence(self.start, self.end)
+                yield self._create_occurrence(self.start, self.end, spans)
             return
         date_iter = iter(rule)
         difference = self.end - self.start
         loop_counter = 0
         for o_start in date_iter:
-            o_start = pytz.timezone(str(tzinfo)).localize(o_start)
+            o_start = localize(o_start, tzinfo)
             o_end = o_start + difference
             if o_end > after:
-                yield self._create_occurrence(o_start, o_end)
+                yield self._create_occurrence(o_start, o_end, spans)
 
             loop_counter += 1
 
@@ -394,33 +757,51 @@ class Event(models.Model):
             empty = True
         return event_params, empty
 
-    @property
-    def effective_start(self):
-        if self.pk and self.end_recurring_period:
-            occ_generator = self._occurrences_after_generator(self.start)
-            try:
-                return next(occ_generator).start
-            except StopIteration:
-                pass
-        elif self.pk:
-            return self.start
-        return None
+    def _get_effective_span(self):
+        """
+        Returns the start of the first occurrence of this event and the end of
+        its last one. The end is None when the event recurs forever, and both
+        are None when its rule doesn't produce any occurrence.
+        """
+        if self.rule is None:
+            return self.start, self.end
+        tzinfo = None if timezone.is_naive(self.start) else datetime.timezone.utc
+        rule = self.get_rrule_object(tzinfo)
+        first = next(iter(rule), None)
+        if first is None:
+            return None, None
+        if "count" in self.rule.get_params():
+            last = rule[-1]
+        elif self.end_recurring_period is not None:
+            _, until = self._get_rrule_bounds(tzinfo)
+            last = self._get_recurrence(tzinfo).before(until, inc=True)
+        else:
+            last = None
+        if tzinfo is not None:
+            first = first.replace(tzinfo=tzinfo)
+            last = last and last.replace(tzinfo=tzinfo)
+        return first, last and last + (self.end - self.start)
 
-    @property
-    def effective_end(self):
-        if self.pk and self.end_recurring_period:
-            params, empty = self.event_params
-            if empty or not self.effective_start:
-                return None
-            elif self.end_recurring_period:
-                occ = None
-                occ_generator = self._occurrences_after_generator(self.start)
-                for occ in occ_generator:
-                    pass
-                return occ.end
-        elif self.pk:
-            return datetime.datetime.max
-        return None
+    def update_effective_span(self):
+        """
+        Recomputes the effective start and end of this event and stores them
+        without saving (and changing) the rest of the event.
+        """
+        self.effective_start, self.effective_end = self._get_effective_span()
+        Event.objects.filter(pk=self.pk).update(
+            effective_start=self.effective_start, effective_end=self.effective_end
+        )
+
+    def save(self, *args, **kwargs):
+        self.effective_start, self.effective_end = self._get_effective_span()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "effective_start",
+                "effective_end",
+            }
+        super().save(*args, **kwargs)
 
 
 class EventRelationManager(models.Manager):
@@ -579,7 +960,76 @@ class EventRelation(models.Model):
         )
 
 
-class Occurrence(models.Model):
+class OccurrenceMixin:
+    """
+    The behaviour shared by persisted ``Occurrence`` models and unpersisted
+    ``OccurrenceSpan`` values. Subclasses provide ``event``, ``event_id``,
+    ``pk``, ``start``, ``end``, ``original_start`` and ``original_end``.
+    """
+
+    __slots__ = ()
+
+    @property
+    def moved(self):
+        return self.original_start != self.start or self.original_end != self.end
+
+    @property
+    def seconds(self):
+        return (self.end - self.start).total_seconds()
+
+    @property
+    def minutes(self):
+        return float(self.seconds) / 60
+
+    @property
+    def hours(self):
+        return float(self.seconds) / 3600
+
+    def _get_url(self, name):
+        if self.pk is not None:
+            return reverse(
+                name, kwargs={"occurrence_id": self.pk, "event_id": self.event_id}
+            )
+        return reverse(
+            "%s_by_date" % name,
+            kwargs={
+                "event_id": self.event_id,
+                "year": self.start.year,
+                "month": self.start.month,
+                "day": self.start.day,
+                "hour": self.start.hour,
+                "minute": self.start.minute,
+                "second": self.start.second,
+            },
+        )
+
+    def get_absolute_url(self):
+        return self._get_url("occurrence")
+
+    def get_cancel_url(self):
+        return self._get_url("cancel_occurrence")
+
+    def get_edit_url(self):
+        return self._get_url("edit_occurrence")
+
+    def __str__(self):
+        return gettext("%(start)s to %(end)s") % {
+            "start": date(self.start, django_settings.DATE_FORMAT),
+            "end": date(self.end, django_settings.DATE_FORMAT),
+        }
+
+    def __lt__(self, other):
+        return self.end < other.end
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, OccurrenceMixin)
+            and self.original_start == other.original_start
+            and self.original_end == other.original_end
+        )
+
+
+class Occurrence(OccurrenceMixin, models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, verbose_name=_("event"))
     title = models.CharField(_("title"), max_length=255, blank=True)
     description = models.TextField(_("description"), blank=True)
@@ -604,11 +1054,6 @@ class Occurrence(models.Model):
         if not self.description and event:
             self.description = event.description
 
-    def moved(self):
-        return self.original_start != self.start or self.original_end != self.end
-
-    moved = property(moved)
-
     def move(self, new_start, new_end):
         self.start = new_start
         self.end = new_end
@@ -622,74 +1067,242 @@ class Occurrence(models.Model):
         self.cancelled = False
         self.save()
 
+    def __hash__(self):
+        if not self.pk:
+            raise TypeError("Model instances without primary key value are unhashable")
+        return hash(self.pk)
+
+
+class OccurrenceSpan(OccurrenceMixin):
+    """
+    An immutable, unpersisted occurrence of an event. Periods, the template
+    tags, the feeds and the occurrences API read these instead of building an
+    ``Occurrence`` model instance for every generated occurrence.
+
+    A span reads like an unpersisted ``Occurrence``. ``move``, ``cancel`` and
+    ``uncancel`` persist it and return the resulting ``Occurrence``, and
+    ``to_occurrence`` returns an unsaved one, e.g. for an edit form.
+    """
+
+    __slots__ = ("event", "start", "end")
+
+    id = pk = None
+    cancelled = False
+
+    def __init__(self, event, start, end):
+        object.__setattr__(self, "event", event)
+        object.__setattr__(self, "start", start)
+        object.__setattr__(self, "end", end)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("OccurrenceSpan objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("OccurrenceSpan objects are immutable")
+
+    def __reduce__(self):
+        return (self.__class__, (self.event, self.start, self.end))
+
+    def __repr__(self):
+        return "<OccurrenceSpan: %s>" % self
+
+    def __hash__(self):
+        return hash((self.event_id, self.start, self.end))
+
     @property
-    def seconds(self):
-        return (self.end - self.start).total_seconds()
+    def event_id(self):
+        return self.event.pk
 
     @property
-    def minutes(self):
-        return float(self.seconds) / 60
+    def original_start(self):
+        return self.start
 
     @property
-    def hours(self):
-        return float(self.seconds) / 3600
+    def original_end(self):
+        return self.end
 
-    def get_absolute_url(self):
-        if self.pk is not None:
-            return reverse(
-                "occurrence",
-                kwargs={"occurrence_id": self.pk, "event_id": self.event_id},
-            )
-        return reverse(
-            "occurrence_by_date",
-            kwargs={
-                "event_id": self.event_id,
-                "year": self.start.year,
-                "month": self.start.month,
-                "day": self.start.day,
-                "hour": self.start.hour,
-                "minute": self.start.minute,
-                "second": self.start.second,
-            },
+    @property
+    def title(self):
+        return self.event.title
+
+    @property
+    def description(self):
+        return self.event.description
+
+    def to_occurrence(self):
+        return Occurrence(
+            event=self.event,
+            start=self.start,
+            end=self.end,
+            original_start=self.start,
+            original_end=self.end,
         )
 
-    def get_cancel_url(self):
-        if self.pk is not None:
-            return reverse(
-                "cancel_occurrence",
-                kwargs={"occurrence_id": self.pk, "event_id": self.event_id},
-            )
-        return reverse(
-            "cancel_occurrence_by_date",
-            kwargs={
-                "event_id": self.event_id,
-                "year": self.start.year,
-                "month": self.start.month,
-                "day": self.start.day,
-                "hour": self.start.hour,
-                "minute": self.start.minute,
-                "second": self.start.second,
-            },
+    def move(self, new_start, new_end):
+        occurrence = self.to_occurrence()
+        occurrence.move(new_start, new_end)
+        return occurrence
+
+    def cancel(self):
+        occurrence = self.to_occurrence()
+        occurrence.cancel()
+        return occurrence
+
+    def uncancel(self):
+        occurrence = self.to_occurrence()
+        occurrence.uncancel()
+        return occurrence
+
+
+class OccurrenceIndexManager(models.Manager):
+    def horizon(self):
+        """
+        Returns the datetime up to which occurrences get materialized.
+        """
+        return timezone.now() + datetime.timedelta(days=OCCURRENCE_INDEX_HORIZON_DAYS)
+
+    def covers(self, tzinfo):
+        """
+        Returns whether the indexed occurrences are the ones of periods in
+        ``tzinfo``. Events are indexed in the default time zone (the
+        ``TIME_ZONE`` setting), as recurrences depend on the wall clock time
+        of the zone they are expanded in.
+        """
+        if tzinfo is None or not django_settings.USE_TZ:
+            return True
+        return str(tzinfo) == str(timezone.get_default_timezone())
+
+    def rebuild(self, event, until=None):
+        """
+        Replaces the indexed occurrences of ``event`` with the ones produced by
+        expanding it in the default time zone, including its persisted
+        occurrences, up to ``until`` (defaults to the configured horizon).
+        """
+        if until is None:
+            until = self.horizon()
+        persisted_occurrences = list(Occurrence.objects.filter(event=event))
+        start = min([event.start] + [occ.start for occ in persisted_occurrences])
+        if timezone.is_aware(start):
+            start = start.astimezone(timezone.get_default_timezone())
+        occ_replacer = OccurrenceReplacer(persisted_occurrences)
+        occurrences = event._replace_persisted_occurrences(
+            event._get_occurrence_list(start, until), occ_replacer, start, until
+        )
+        occurrences += occ_replacer.get_additional_occurrences(start, until)
+        self.filter(event=event).delete()
+        self.bulk_create(
+            [self.model.from_occurrence(occ) for occ in occurrences], batch_size=500
         )
+        Event.objects.filter(pk=event.pk).update(indexed_until=until)
+        event.indexed_until = until
 
-    def get_edit_url(self):
-        if self.pk is not None:
-            return reverse(
-                "edit_occurrence",
-                kwargs={"occurrence_id": self.pk, "event_id": self.event_id},
+    def update_occurrence(self, occurrence):
+        """
+        Keeps the index row of a persisted ``occurrence`` in sync after it has
+        been moved or cancelled.
+        """
+        updated = self.filter(
+            event_id=occurrence.event_id,
+            original_start=occurrence.original_start,
+            original_end=occurrence.original_end,
+        ).update(
+            occurrence=occurrence,
+            start=occurrence.start,
+            end=occurrence.end,
+            cancelled=occurrence.cancelled,
+        )
+        if not updated:
+            self.model.from_occurrence(occurrence).save()
+
+    def remove_occurrence(self, event, occurrence):
+        """
+        Puts back the occurrence that ``event`` produces in place of a deleted
+        persisted ``occurrence``, or drops its index row if there is none. No
+        row is created, so this is safe while the event itself is deleted.
+        """
+        rows = self.filter(
+            event_id=event.pk,
+            original_start=occurrence.original_start,
+            original_end=occurrence.original_end,
+        )
+        start = occurrence.original_start
+        if timezone.is_aware(start):
+            start = start.astimezone(timezone.get_default_timezone())
+        produced = any(
+            occ.start == occurrence.original_start
+            and occ.end == occurrence.original_end
+            for occ in event._get_occurrence_list(start, occurrence.original_end)
+        )
+        if produced:
+            rows.update(
+                occurrence=None,
+                start=occurrence.original_start,
+                end=occurrence.original_end,
+                cancelled=False,
             )
-        return reverse(
-            "edit_occurrence_by_date",
-            kwargs={
-                "event_id": self.event_id,
-                "year": self.start.year,
-                "month": self.start.month,
-                "day": self.start.day,
-                "hour": self.start.hour,
-                "minute": self.start.minute,
-                "second": self.start.second,
-            },
+        else:
+            rows.delete()
+
+    def get_occurrences(self, events, start, end):
+        """
+        Returns the occurrences of ``events`` within start (inclusive) and end
+        (exclusive) using a single range query. All the events must have been
+        indexed beyond ``end``.
+        """
+        events = {event.id: event for event in events}
+        rows = (
+            self.filter(event_id__in=list(events), start__lt=end)
+            .filter(
+                Q(end__gt=start)
+                | Q(start__gte=start)
+                | Q(occurrence__isnull=False, end=start)
+            )
+            .select_related("occurrence")
         )
+        occurrences = []
+        for row in rows:
+            event = events[row.event_id]
+            if row.occurrence is not None:
+                occurrence = row.occurrence
+                occurrence.event = event
+            else:
+                occurrence = event._create_occurrence(row.start, row.end, span=True)
+            occurrences.append(occurrence)
+        return occurrences
+
+
+class OccurrenceIndex(models.Model):
+    """
+    A materialized occurrence of an event. Events are expanded into this table
+    up to a rolling horizon (see ``OCCURRENCE_INDEX_HORIZON_DAYS``) so that
+    periods can read their occurrences with a single range query instead of
+    expanding every recurring event.
+
+    Rows are rebuilt when their event or rule is saved and updated when a
+    persisted occurrence is moved or cancelled. The ``refresh_occurrence_index``
+    management command rolls the horizon forward and should be run periodically.
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, verbose_name=_("event"))
+    occurrence = models.ForeignKey(
+        Occurrence,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name=_("occurrence"),
+    )
+    start = models.DateTimeField(_("start"), db_index=True)
+    end = models.DateTimeField(_("end"), db_index=True)
+    original_start = models.DateTimeField(_("original start"))
+    original_end = models.DateTimeField(_("original end"))
+    cancelled = models.BooleanField(_("cancelled"), default=False)
+
+    objects = OccurrenceIndexManager()
+
+    class Meta:
+        verbose_name = _("occurrence index")
+        verbose_name_plural = _("occurrence indexes")
+        index_together = (("start", "end"), ("event", "original_start"))
 
     def __str__(self):
         return gettext("%(start)s to %(end)s") % {
@@ -697,17 +1310,14 @@ class Occurrence(models.Model):
             "end": date(self.end, django_settings.DATE_FORMAT),
         }
 
-    def __lt__(self, other):
-        return self.end < other.end
-
-    def __hash__(self):
-        if not self.pk:
-            raise TypeError("Model instances without primary key value are unhashable")
-        return hash(self.pk)
-
-    def __eq__(self, other):
-        return (
-            isinstance(other, Occurrence)
-            and self.original_start == other.original_start
-            and self.original_end == other.original_end
+    @classmethod
+    def from_occurrence(cls, occurrence):
+        return cls(
+            event_id=occurrence.event_id,
+            occurrence_id=occurrence.pk,
+            start=occurrence.start,
+            end=occurrence.end,
+            original_start=occurrence.original_start,
+            original_end=occurrence.original_end,
+            cancelled=occurrence.cancelled,
         )
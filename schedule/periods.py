@@ -1,16 +1,32 @@
+import bisect
 import calendar as standardlib_calendar
 import datetime
+import hashlib
 
 import pytz
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db.models import QuerySet
 from django.db.models.query import prefetch_related_objects
 from django.template.defaultfilters import date as date_filter
 from django.utils import timezone
 from django.utils.dates import WEEKDAYS, WEEKDAYS_ABBR
 from django.utils.translation import gettext
 
-from schedule.models import Occurrence
-from schedule.settings import SHOW_CANCELLED_OCCURRENCES
+from schedule.models import Event, Occurrence, OccurrenceIndex, OccurrenceSpan
+from schedule.settings import (
+    PERIOD_CACHE_ALIAS,
+    PERIOD_CACHE_TIMEOUT,
+    SHOW_CANCELLED_OCCURRENCES,
+    USE_OCCURRENCE_INDEX,
+)
+from schedule.utils import get_timezone, localize
+
+try:
+    import zoneinfo
+except ImportError:  # pragma: no cover
+    zoneinfo = None
 
 weekday_names = []
 weekday_abbrs = []
@@ -28,6 +44,89 @@ else:
         weekday_names.append(WEEKDAYS[i])
         weekday_abbrs.append(WEEKDAYS_ABBR[i])
 
+# Incremented when the format returned by Period.snapshot changes
+SNAPSHOT_VERSION = 2
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def _pack_datetime(value):
+    # microseconds since the epoch, in UTC for aware datetimes
+    if timezone.is_aware(value):
+        value = value.astimezone(pytz.utc).replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def _unpack_datetime(value, tzinfo):
+    value = EPOCH + value * MICROSECOND
+    if tzinfo is None:
+        return value
+    return pytz.utc.localize(value).astimezone(tzinfo)
+
+
+def _pack_tzinfo(tzinfo):
+    # the kind of the zone and its name, or its offset in seconds
+    if tzinfo is None:
+        return None, None
+    if zoneinfo is not None and isinstance(tzinfo, zoneinfo.ZoneInfo):
+        return "zoneinfo", tzinfo.key
+    if getattr(tzinfo, "zone", None):
+        return "pytz", tzinfo.zone
+    offset = tzinfo.utcoffset(None)
+    if offset is not None:
+        return "offset", offset // datetime.timedelta(seconds=1)
+    return "pytz", str(tzinfo)
+
+
+def _unpack_tzinfo(kind, value):
+    if kind is None:
+        return None
+    if kind == "offset":
+        return datetime.timezone(datetime.timedelta(seconds=value))
+    if kind == "zoneinfo":
+        return get_timezone(zoneinfo.ZoneInfo(value))
+    return get_timezone(value)
+
+
+class OccurrencePool:
+    """
+    The occurrences of a period, kept sorted by start for its sub-periods.
+    Along with the starts it keeps the running maximum of the ends, so the
+    occurrences overlapping a timespan are found with two bisects and only
+    the ones between them are compared.
+    """
+
+    def __init__(self, occurrences):
+        self.occurrences = sorted(occurrences, key=lambda occurrence: occurrence.start)
+        self.starts = [occurrence.start for occurrence in self.occurrences]
+        self.max_ends = []
+        for occurrence in self.occurrences:
+            if self.max_ends and self.max_ends[-1] > occurrence.end:
+                self.max_ends.append(self.max_ends[-1])
+            else:
+                self.max_ends.append(occurrence.end)
+
+    def __iter__(self):
+        return iter(self.occurrences)
+
+    def __len__(self):
+        return len(self.occurrences)
+
+    def between(self, start, end):
+        """
+        Returns the occurrences that end at or after start and start at or
+        before end, in start order.
+        """
+        # no occurrence before lo ends at or after start
+        lo = bisect.bisect_left(self.max_ends, start)
+        hi = bisect.bisect_right(self.starts, end)
+        return [
+            occurrence
+            for occurrence in self.occurrences[lo:hi]
+            if occurrence.end >= start
+        ]
+
 
 class Period:
     """
@@ -45,13 +144,18 @@ class Period:
         tzinfo=pytz.utc,
         sorting_options=None,
     ):
+        self.tzinfo = self._get_tzinfo(tzinfo)
 
-        self.utc_start = self._normalize_timezone_to_utc(start, tzinfo)
+        # without USE_TZ the naive start and end are kept naive
+        self.utc_start = self._normalize_timezone_to_utc(start, self.tzinfo)
 
-        self.utc_end = self._normalize_timezone_to_utc(end, tzinfo)
+        self.utc_end = self._normalize_timezone_to_utc(end, self.tzinfo)
 
         self.events = events
-        self.tzinfo = self._get_tzinfo(tzinfo)
+        if occurrence_pool is not None and not isinstance(
+            occurrence_pool, OccurrencePool
+        ):
+            occurrence_pool = OccurrencePool(occurrence_pool)
         self.occurrence_pool = occurrence_pool
         if parent_persisted_occurrences is not None:
             self._persisted_occurrences = parent_persisted_occurrences
@@ -61,7 +165,7 @@ class Period:
         if point_in_time.tzinfo is not None:
             return point_in_time.astimezone(pytz.utc)
         if tzinfo is not None:
-            return pytz.timezone(str(tzinfo)).localize(point_in_time)
+            return localize(point_in_time, tzinfo)
         if settings.USE_TZ:
             return pytz.utc.localize(point_in_time)
         else:
@@ -81,23 +185,53 @@ class Period:
         return tzinfo if settings.USE_TZ else None
 
     def _get_sorted_occurrences(self):
-        occurrences = []
         if hasattr(self, "occurrence_pool") and self.occurrence_pool is not None:
-            for occurrence in self.occurrence_pool:
-                if (
-                    occurrence.start <= self.utc_end
-                    and occurrence.end >= self.utc_start
-                ):
-                    occurrences.append(occurrence)
+            occurrences = self.occurrence_pool.between(self.utc_start, self.utc_end)
+        elif USE_OCCURRENCE_INDEX and OccurrenceIndex.objects.covers(self.tzinfo):
+            occurrences = self._get_indexed_occurrences()
         else:
-            prefetch_related_objects(self.events, "occurrence_set")
-            for event in self.events:
-                event_occurrences = event.get_occurrences(
-                    self.start, self.end, clear_prefetch=False
-                )
-                occurrences += event_occurrences
+            occurrences = self._expand_events(self._get_overlapping_events())
         return sorted(occurrences, **self.sorting_options)
 
+    def _get_overlapping_events(self):
+        """
+        Returns the events that can have occurrences in this period. Querysets
+        of events are narrowed down with their stored span; other iterables are
+        used as they are.
+        """
+        if hasattr(self.events, "overlapping"):
+            return self.events.overlapping(self.utc_start, self.utc_end)
+        return self.events
+
+    def _expand_events(self, events):
+        occurrences = []
+        prefetch_related_objects(events, "occurrence_set")
+        for event in events:
+            event_occurrences = event.get_occurrences(
+                self.start, self.end, clear_prefetch=False, spans=True
+            )
+            occurrences += event_occurrences
+        return occurrences
+
+    def _get_indexed_occurrences(self):
+        """
+        Reads the occurrences of the events indexed beyond the end of this
+        period from the OccurrenceIndex, and expands the remaining events.
+        """
+        indexed = []
+        expanded = []
+        for event in self._get_overlapping_events():
+            if event.indexed_until is not None and event.indexed_until >= self.utc_end:
+                indexed.append(event)
+            else:
+                expanded.append(event)
+        occurrences = OccurrenceIndex.objects.get_occurrences(
+            indexed, self.utc_start, self.utc_end
+        )
+        if expanded:
+            occurrences += self._expand_events(expanded)
+        return occurrences
+
     def cached_get_sorted_occurrences(self):
         if hasattr(self, "_occurrences"):
             return self._occurrences
@@ -107,6 +241,148 @@ class Period:
 
     occurrences = property(cached_get_sorted_occurrences)
 
+    def get_cache_key(self, calendar):
+        """
+        Returns the key the occurrences of this period are cached under for
+        ``calendar``. It changes with the version of the calendar and with the
+        events of the period.
+        """
+        events = self.events
+        if isinstance(events, QuerySet):
+            try:
+                events = str(events.query)
+            except EmptyResultSet:
+                events = ""
+        else:
+            events = ",".join(str(event.pk) for event in events)
+        return "schedule.period:%s:%s:%s:%s:%s:%s" % (
+            calendar.pk,
+            type(self).__name__,
+            self.utc_start.isoformat(),
+            self.tzinfo,
+            calendar.version,
+            hashlib.sha1(events.encode()).hexdigest(),
+        )
+
+    def cache_occurrences(self, calendar):
+        """
+        Reads the occurrences of this period from the period cache (see
+        ``USE_PERIOD_CACHE``), or computes them and stores a ``snapshot()`` of
+        this period there. The events and the persisted occurrences of a cached
+        period are fetched again but nothing is expanded.
+        """
+        cache = caches[PERIOD_CACHE_ALIAS]
+        key = self.get_cache_key(calendar)
+        snapshot = cache.get(key)
+        if snapshot is not None and snapshot.get("version") == SNAPSHOT_VERSION:
+            if self._load_snapshot_occurrences(snapshot):
+                return
+        cache.set(key, self.snapshot(), PERIOD_CACHE_TIMEOUT)
+
+    def snapshot(self):
+        """
+        Returns a compact representation of this period and its occurrences,
+        made of plain Python values that can be pickled or JSON encoded and
+        handed to ``Period.from_snapshot`` in another process. Datetimes are
+        packed as microseconds since the epoch (in UTC for aware ones) and
+        every occurrence as ``(event_id, start, end, occurrence_id)``. The time
+        zone is stored with its kind (``"zoneinfo"``, ``"pytz"`` or
+        ``"offset"``) so that it is restored as the same kind of tzinfo.
+        """
+        tzkind, tzinfo = _pack_tzinfo(self.tzinfo)
+        return {
+            "version": SNAPSHOT_VERSION,
+            "period": type(self).__name__,
+            "start": _pack_datetime(self.utc_start),
+            "end": _pack_datetime(self.utc_end),
+            "aware": timezone.is_aware(self.utc_start),
+            "tzkind": tzkind,
+            "tzinfo": tzinfo,
+            "occurrences": [
+                (
+                    occurrence.event_id,
+                    _pack_datetime(occurrence.start),
+                    _pack_datetime(occurrence.end),
+                    occurrence.pk,
+                )
+                for occurrence in self.occurrences
+            ],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot, events=None):
+        """
+        Restores a period from its ``snapshot()``. ``events`` defaults to the
+        events of the snapshot occurrences. The occurrences are rebuilt from
+        the events and the persisted occurrences without expanding anything,
+        unless one of them has been deleted since.
+        """
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                "Unsupported period snapshot version %r" % snapshot.get("version")
+            )
+        period_class = PERIOD_CLASSES[snapshot["period"]]
+        tzinfo = _unpack_tzinfo(snapshot["tzkind"], snapshot["tzinfo"])
+        if events is None:
+            events = Event.objects.filter(
+                pk__in={occurrence[0] for occurrence in snapshot["occurrences"]}
+            )
+        start_tzinfo = tzinfo or (pytz.utc if snapshot["aware"] else None)
+        start = _unpack_datetime(snapshot["start"], start_tzinfo)
+        if period_class is Period:
+            end = _unpack_datetime(snapshot["end"], start_tzinfo)
+            period = Period(events, start, end, tzinfo=tzinfo)
+        else:
+            period = period_class(events, start, tzinfo=tzinfo)
+        period._load_snapshot_occurrences(snapshot)
+        return period
+
+    def _load_snapshot_occurrences(self, snapshot):
+        # returns False if an event or a persisted occurrence is gone
+        tzinfo = self.tzinfo or (pytz.utc if snapshot["aware"] else None)
+        events = self.events
+        if isinstance(events, QuerySet) and events.query.can_filter():
+            # only the events with occurrences in the snapshot are fetched
+            events = events.filter(
+                pk__in={occurrence[0] for occurrence in snapshot["occurrences"]}
+            )
+        events = {event.pk: event for event in events}
+        persisted_occurrences = Occurrence.objects.in_bulk(
+            [
+                pk
+                for event_id, start, end, pk in snapshot["occurrences"]
+                if pk is not None
+            ]
+        )
+        occurrences = []
+        for event_id, start, end, pk in snapshot["occurrences"]:
+            event = events.get(event_id)
+            if event is None:
+                return False
+            if pk is None:
+                occurrence = OccurrenceSpan(
+                    event,
+                    _unpack_datetime(start, tzinfo),
+                    _unpack_datetime(end, tzinfo),
+                )
+            elif pk in persisted_occurrences:
+                occurrence = persisted_occurrences[pk]
+                occurrence.event = event
+            else:
+                return False
+            occurrences.append(occurrence)
+        self._occurrences = sorted(occurrences, **self.sorting_options)
+        return True
+
+    def get_occurrence_pool(self):
+        """
+        Returns the occurrences of this period as an ``OccurrencePool`` shared
+        by all its sub-periods.
+        """
+        if not hasattr(self, "_occurrence_pool"):
+            self._occurrence_pool = OccurrencePool(self.occurrences)
+        return self._occurrence_pool
+
     def get_persisted_occurrences(self):
         if hasattr(self, "_persisted_occurrences"):
             return self._persisted_occurrences
@@ -145,6 +421,37 @@ class Period:
                 occurrence_dicts.append(occurrence)
         return occurrence_dicts
 
+    def get_day_partials(self):
+        """
+        Returns a dict mapping the local date of every day of this period to
+        the classified occurrences of that day, as ``get_occurrence_partials``
+        of the ``Day`` sub-period would return them. It is built in one sweep
+        over the occurrences; an occurrence spanning several days is classified
+        in each of them.
+        """
+        if hasattr(self, "_day_partials"):
+            return self._day_partials
+        days = []
+        day = Day([], self.start, tzinfo=self.tzinfo)
+        while day.start < self.end:
+            days.append(day)
+            day = Day([], day.end, tzinfo=self.tzinfo)
+        day_starts = [day.utc_start for day in days]
+        day_ends = [day.utc_end for day in days]
+        partials = [[] for day in days]
+        # the order of the Day sub-periods, which sort their pool slice
+        for occurrence in sorted(self.get_occurrence_pool()):
+            lo = bisect.bisect_left(day_ends, occurrence.start)
+            hi = bisect.bisect_right(day_starts, occurrence.end)
+            for day, day_partials in zip(days[lo:hi], partials[lo:hi]):
+                partial = day.classify_occurrence(occurrence)
+                if partial:
+                    day_partials.append(partial)
+        self._day_partials = {
+            day.start.date(): day_partials for day, day_partials in zip(days, partials)
+        }
+        return self._day_partials
+
     def get_occurrences(self):
         return self.occurrences
 
@@ -152,10 +459,64 @@ class Period:
         return any(self.classify_occurrence(o) for o in self.occurrences)
 
     def get_time_slot(self, start, end):
+        """
+        Returns the period from start to end with the occurrences of this
+        period that overlap it. Unlike sub-periods, a slot doesn't hold the
+        occurrences that end at its start or start at its end.
+        """
+        slot = self._get_empty_time_slot(start, end)
+        if slot.occurrence_pool is not None:
+            slot._occurrences = sorted(
+                (
+                    occurrence
+                    for occurrence in slot.occurrence_pool.between(
+                        slot.utc_start, slot.utc_end
+                    )
+                    if occurrence.start < slot.utc_end
+                    and occurrence.end > slot.utc_start
+                ),
+                **slot.sorting_options,
+            )
+        return slot
+
+    def _get_empty_time_slot(self, start, end):
+        # the occurrences of the slot are set by the caller
         if start >= self.start and end <= self.end:
-            return Period(self.events, start, end, tzinfo=self.tzinfo)
+            return Period(
+                self.events,
+                start,
+                end,
+                self.get_persisted_occurrences(),
+                self.get_occurrence_pool(),
+                tzinfo=self.tzinfo,
+            )
         return Period([], start, end, tzinfo=self.tzinfo)
 
+    def get_time_slots(self, start, end, increment):
+        """
+        Returns the consecutive time slots of length ``increment`` (a
+        timedelta) from start to end, like ``get_time_slot`` would. The
+        occurrences of this period are assigned to the slots in one sweep.
+        """
+        slots = []
+        while start + increment <= end:
+            slots.append(self._get_empty_time_slot(start, start + increment))
+            start += increment
+        # the slots outside of this period are empty
+        pooled = [slot for slot in slots if slot.occurrence_pool is not None]
+        slot_starts = [slot.utc_start for slot in pooled]
+        slot_ends = [slot.utc_end for slot in pooled]
+        occurrences = [[] for slot in pooled]
+        for occurrence in self.occurrences:
+            # the slots that end after its start and start before its end
+            lo = bisect.bisect_right(slot_ends, occurrence.start)
+            hi = bisect.bisect_left(slot_starts, occurrence.end)
+            for slot_occurrences in occurrences[lo:hi]:
+                slot_occurrences.append(occurrence)
+        for slot, slot_occurrences in zip(pooled, occurrences):
+            slot._occurrences = sorted(slot_occurrences, **slot.sorting_options)
+        return slots
+
     def create_sub_period(self, cls, start=None, tzinfo=None):
         if tzinfo is None:
             tzinfo = self.tzinfo
@@ -164,7 +525,7 @@ class Period:
             self.events,
             start,
             self.get_persisted_occurrences(),
-            self.occurrences,
+            self.get_occurrence_pool(),
             tzinfo,
         )
 
@@ -227,8 +588,8 @@ class Year(Period):
         start = naive_start
         end = naive_end
         if self.tzinfo is not None:
-            local_start = pytz.timezone(str(self.tzinfo)).localize(naive_start)
-            local_end = pytz.timezone(str(self.tzinfo)).localize(naive_end)
+            local_start = localize(naive_start, self.tzinfo)
+            local_end = localize(naive_end, self.tzinfo)
             start = local_start.astimezone(pytz.utc)
             end = local_end.astimezone(pytz.utc)
 
@@ -318,8 +679,8 @@ class Month(Period):
         start = naive_start
         end = naive_end
         if self.tzinfo is not None:
-            local_start = pytz.timezone(str(self.tzinfo)).localize(naive_start)
-            local_end = pytz.timezone(str(self.tzinfo)).localize(naive_end)
+            local_start = localize(naive_start, self.tzinfo)
+            local_end = localize(naive_end, self.tzinfo)
             start = local_start.astimezone(pytz.utc)
             end = local_end.astimezone(pytz.utc)
 
@@ -401,8 +762,8 @@ class Week(Period):
         naive_end = naive_start + datetime.timedelta(days=7)
 
         if self.tzinfo is not None:
-            local_start = pytz.timezone(str(self.tzinfo)).localize(naive_start)
-            local_end = pytz.timezone(str(self.tzinfo)).localize(naive_end)
+            local_start = localize(naive_start, self.tzinfo)
+            local_end = localize(naive_end, self.tzinfo)
             start = local_start.astimezone(pytz.utc)
             end = local_end.astimezone(pytz.utc)
         else:
@@ -455,8 +816,8 @@ class Day(Period):
             date + datetime.timedelta(days=1), datetime.time.min
         )
         if self.tzinfo is not None:
-            local_start = pytz.timezone(str(self.tzinfo)).localize(naive_start)
-            local_end = pytz.timezone(str(self.tzinfo)).localize(naive_end)
+            local_start = localize(naive_start, self.tzinfo)
+            local_end = localize(naive_end, self.tzinfo)
             start = local_start.astimezone(pytz.utc)
             end = local_end.astimezone(pytz.utc)
         else:
@@ -492,3 +853,6 @@ class Day(Period):
 
     def current_week(self):
         return Week(self.events, self.start, tzinfo=self.tzinfo)
+
+
+PERIOD_CLASSES = {cls.__name__: cls for cls in (Period, Year, Month, Week, Day)}
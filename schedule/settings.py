@@ -64,3 +64,57 @@ USE_FULLCALENDAR = getattr(settings, "USE_FULLCALENDAR", False)
 
 # This name is used when a new event is created through selecting in fullcalendar
 EVENT_NAME_PLACEHOLDER = getattr(settings, "EVENT_NAME_PLACEHOLDER", "Event Name")
+
+# Whether periods read their occurrences from the materialized OccurrenceIndex
+# table instead of expanding the events' recurrence rules on every request
+USE_OCCURRENCE_INDEX = getattr(settings, "USE_OCCURRENCE_INDEX", False)
+
+# How many days into the future events are expanded into the OccurrenceIndex
+OCCURRENCE_INDEX_HORIZON_DAYS = getattr(settings, "OCCURRENCE_INDEX_HORIZON_DAYS", 365)
+
+# Maximum number of compiled rrule objects kept in the per-process cache used
+# by Event.get_rrule_object. Set to 0 to disable the cache.
+RRULE_CACHE_SIZE = getattr(settings, "RRULE_CACHE_SIZE", 512)
+
+# Whether simple DAILY, WEEKLY and HOURLY rules are expanded with NumPy instead
+# of dateutil. Only has an effect when numpy is installed.
+USE_NUMPY_EXPANSION = getattr(settings, "USE_NUMPY_EXPANSION", True)
+
+# Whether the calendar period views cache the occurrences of their periods in
+# Django's cache framework. Entries are keyed by the calendar version, which is
+# bumped whenever an event, occurrence or rule of the calendar changes.
+USE_PERIOD_CACHE = getattr(settings, "USE_PERIOD_CACHE", False)
+
+# The cache alias and timeout (in seconds) used by the period cache
+PERIOD_CACHE_ALIAS = getattr(settings, "PERIOD_CACHE_ALIAS", "default")
+PERIOD_CACHE_TIMEOUT = getattr(settings, "PERIOD_CACHE_TIMEOUT", 60 * 60)
+
+# Whether the iCalendar and upcoming events feeds of the calendars are cached in
+# Django's cache framework until their ETag changes, i.e. until an event,
+# occurrence or rule of the calendar changes
+USE_FEED_CACHE = getattr(settings, "USE_FEED_CACHE", False)
+
+# The cache alias and timeout (in seconds) used by the feed cache
+FEED_CACHE_ALIAS = getattr(settings, "FEED_CACHE_ALIAS", "default")
+FEED_CACHE_TIMEOUT = getattr(settings, "FEED_CACHE_TIMEOUT", 60 * 60)
+
+# Whether an outdated cached feed is served while it is rendered again in a
+# background thread, instead of making the request wait for the new feed
+FEED_CACHE_BACKGROUND_REFRESH = getattr(
+    settings, "FEED_CACHE_BACKGROUND_REFRESH", False
+)
+
+# How many events the occurrences API expands at a time when the response is
+# streamed (``stream=1``)
+API_STREAM_BATCH_SIZE = getattr(settings, "API_STREAM_BATCH_SIZE", 100)
+
+# The default and maximum number of occurrences in a page of the paginated
+# occurrences API
+API_PAGE_SIZE = getattr(settings, "API_PAGE_SIZE", 100)
+
+# How old (in seconds) a change must be before the changes API reports it. The
+# ids of the changes are allocated when they are recorded but become visible
+# when their transaction commits, so the API waits for the transactions that
+# recorded the changes before a reported one to commit. It must be longer than
+# the transactions that change events, occurrences or rules.
+SYNC_TOKEN_DELAY = getattr(settings, "SYNC_TOKEN_DELAY", 5)
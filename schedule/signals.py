@@ -0,0 +1,222 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from schedule.models import (
+    Calendar,
+    CalendarChange,
+    Event,
+    Occurrence,
+    OccurrenceIndex,
+    Rule,
+)
+from schedule.settings import USE_OCCURRENCE_INDEX
+from schedule.utils import rrule_cache
+
+# The cache invalidation receivers are connected first so that the receivers
+# below never expand an event with a stale rrule.
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_rrule(sender, instance, **kwargs):
+    rrule_cache.invalidate(event_id=instance.pk)
+
+
+@receiver(post_save, sender=Rule)
+@receiver(post_delete, sender=Rule)
+def invalidate_rule_rrules(sender, instance, **kwargs):
+    rrule_cache.invalidate(rule_id=instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, raw=False, **kwargs):
+    if USE_OCCURRENCE_INDEX and not raw:
+        OccurrenceIndex.objects.rebuild(instance)
+
+
+def rule_events_changed(events):
+    for event in events:
+        event.update_effective_span()
+        if USE_OCCURRENCE_INDEX:
+            OccurrenceIndex.objects.rebuild(event)
+
+
+@receiver(post_save, sender=Rule)
+def update_rule_events(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        rule_events_changed(instance.event_set.all())
+
+
+@receiver(pre_delete, sender=Rule)
+def collect_rule_events(sender, instance, **kwargs):
+    # the events lose their rule before post_delete is sent
+    instance._event_ids = list(instance.event_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Rule)
+def update_former_rule_events(sender, instance, **kwargs):
+    rule_events_changed(Event.objects.filter(pk__in=instance._event_ids))
+
+
+@receiver(post_save, sender=Occurrence)
+def index_occurrence(sender, instance, raw=False, **kwargs):
+    if USE_OCCURRENCE_INDEX and not raw:
+        OccurrenceIndex.objects.update_occurrence(instance)
+
+
+@receiver(post_delete, sender=Occurrence)
+def unindex_occurrence(sender, instance, **kwargs):
+    if USE_OCCURRENCE_INDEX:
+        # only the row of the occurrence is refreshed, as the event may be
+        # deleted along with it
+        event = Event.objects.filter(pk=instance.event_id).first()
+        if event is not None:
+            OccurrenceIndex.objects.remove_occurrence(event, instance)
+
+
+@receiver(pre_save, sender=Event)
+def collect_event_calendar(sender, instance, raw=False, update_fields=None, **kwargs):
+    # an event moved to another calendar changes both calendars
+    instance._former_calendar_id = None
+    if update_fields is not None and "calendar" not in update_fields:
+        instance._former_calendar_id = instance.calendar_id
+        return
+    if instance.pk is not None and not raw:
+        instance._former_calendar_id = (
+            Event.objects.filter(pk=instance.pk)
+            .values_list("calendar_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def bump_event_calendar_version(sender, instance, **kwargs):
+    calendar_ids = {instance.calendar_id}
+    former_calendar_id = getattr(instance, "_former_calendar_id", None)
+    if former_calendar_id is not None:
+        calendar_ids.add(former_calendar_id)
+    Calendar.objects.bump_versions(calendar_ids)
+
+
+@receiver(post_save, sender=Occurrence)
+@receiver(post_delete, sender=Occurrence)
+def bump_occurrence_calendar_version(sender, instance, **kwargs):
+    Calendar.objects.bump_versions(
+        Event.objects.filter(pk=instance.event_id).values("calendar_id")
+    )
+
+
+@receiver(post_save, sender=Rule)
+def bump_rule_calendar_versions(sender, instance, created=False, **kwargs):
+    if not created:
+        Calendar.objects.bump_versions(
+            instance.event_set.values("calendar_id").distinct()
+        )
+
+
+@receiver(post_delete, sender=Rule)
+def bump_former_rule_calendar_versions(sender, instance, **kwargs):
+    Calendar.objects.bump_versions(
+        Event.objects.filter(pk__in=instance._event_ids).values("calendar_id")
+    )
+
+
+@receiver(post_save, sender=Event)
+def log_event_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    former_calendar_id = getattr(instance, "_former_calendar_id", None)
+    if created:
+        action = CalendarChange.CREATED
+    elif former_calendar_id != instance.calendar_id:
+        # to the mirrors of the calendars, the event moved out of one and into
+        # the other
+        CalendarChange.objects.record(
+            [former_calendar_id],
+            CalendarChange.EVENT,
+            instance.pk,
+            instance.pk,
+            CalendarChange.DELETED,
+        )
+        action = CalendarChange.CREATED
+    else:
+        action = CalendarChange.UPDATED
+    CalendarChange.objects.record(
+        [instance.calendar_id], CalendarChange.EVENT, instance.pk, instance.pk, action
+    )
+
+
+@receiver(pre_delete, sender=Calendar)
+def collect_deleted_calendar(sender, instance, **kwargs):
+    # the events and occurrences deleted with the calendar are not logged
+    CalendarChange.objects.calendar_deleting(instance.pk)
+
+
+@receiver(post_delete, sender=Calendar)
+def release_deleted_calendar(sender, instance, **kwargs):
+    CalendarChange.objects.calendar_deleted(instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def log_event_delete(sender, instance, **kwargs):
+    CalendarChange.objects.record(
+        [instance.calendar_id],
+        CalendarChange.EVENT,
+        instance.pk,
+        instance.pk,
+        CalendarChange.DELETED,
+    )
+
+
+def log_occurrence_change(occurrence, action):
+    CalendarChange.objects.record(
+        Event.objects.filter(pk=occurrence.event_id).values_list(
+            "calendar_id", flat=True
+        ),
+        CalendarChange.OCCURRENCE,
+        occurrence.pk,
+        occurrence.event_id,
+        action,
+    )
+
+
+@receiver(post_save, sender=Occurrence)
+def log_occurrence_save(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        log_occurrence_change(
+            instance, CalendarChange.CREATED if created else CalendarChange.UPDATED
+        )
+
+
+@receiver(post_delete, sender=Occurrence)
+def log_occurrence_delete(sender, instance, **kwargs):
+    log_occurrence_change(instance, CalendarChange.DELETED)
+
+
+def log_rule_events_change(events):
+    # the occurrences of the events of a rule change with the rule
+    CalendarChange.objects.bulk_create(
+        [
+            CalendarChange(
+                calendar_id=calendar_id,
+                object_type=CalendarChange.EVENT,
+                object_id=event_id,
+                event_id=event_id,
+                action=CalendarChange.UPDATED,
+            )
+            for event_id, calendar_id in events.values_list("pk", "calendar_id")
+            if calendar_id is not None
+        ]
+    )
+
+
+@receiver(post_save, sender=Rule)
+def log_rule_save(sender, instance, created=False, raw=False, **kwargs):
+    if not created and not raw:
+        log_rule_events_change(instance.event_set.all())
+
+
+@receiver(post_delete, sender=Rule)
+def log_rule_delete(sender, instance, **kwargs):
+    log_rule_events_change(Event.objects.filter(pk__in=instance._event_ids))
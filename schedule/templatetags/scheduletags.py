@@ -39,7 +39,15 @@ def month_table(context, calendar, month, size="regular", shift=None):
 
 @register.inclusion_tag("schedule/_day_cell.html", takes_context=True)
 def day_cell(context, calendar, day, month, size="regular"):
-    context.update({"calendar": calendar, "day": day, "month": month, "size": size})
+    context.update(
+        {
+            "calendar": calendar,
+            "day": day,
+            "month": month,
+            "size": size,
+            "partials": month.get_day_partials().get(day.start.date(), []),
+        }
+    )
     return context
 
 
@@ -264,14 +272,7 @@ def _cook_slots(period, increment):
     increment - slot size in minutes
     """
     tdiff = datetime.timedelta(minutes=increment)
-    num = int((period.end - period.start).total_seconds()) // int(tdiff.total_seconds())
-    s = period.start
-    slots = []
-    for i in range(num):
-        sl = period.get_time_slot(s, s + tdiff)
-        slots.append(sl)
-        s = s + tdiff
-    return slots
+    return period.get_time_slots(period.start, period.end, tdiff)
 
 
 @register.simple_tag
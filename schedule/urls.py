@@ -17,9 +17,16 @@ from schedule.views import (
     FullCalendarView,
     OccurrencePreview,
     OccurrenceView,
+    api_bulk_ingest,
+    api_changes,
+    api_move_or_resize_batch,
     api_move_or_resize_by_code,
+    api_move_or_resize_by_code_async,
     api_occurrences,
+    api_occurrences_async,
+    api_occurrences_page,
     api_select_create,
+    api_select_create_async,
 )
 
 urlpatterns = [
@@ -129,10 +136,35 @@ urlpatterns = [
     ),
     re_path(r"^ical/calendar/(.*)/$", CalendarICalendar(), name="calendar_ical"),
     # api urls
+    re_path(
+        r"^api/occurrences/page/$", api_occurrences_page, name="api_occurrences_page"
+    ),
     re_path(r"^api/occurrences", api_occurrences, name="api_occurrences"),
+    re_path(r"^api/changes/$", api_changes, name="api_changes"),
     re_path(
         r"^api/move_or_resize/$", api_move_or_resize_by_code, name="api_move_or_resize"
     ),
+    re_path(
+        r"^api/move_or_resize/batch/$",
+        api_move_or_resize_batch,
+        name="api_move_or_resize_batch",
+    ),
     re_path(r"^api/select_create/$", api_select_create, name="api_select_create"),
+    re_path(r"^api/bulk_ingest/$", api_bulk_ingest, name="api_bulk_ingest"),
+    re_path(
+        r"^api/async/occurrences/$",
+        api_occurrences_async,
+        name="api_occurrences_async",
+    ),
+    re_path(
+        r"^api/async/move_or_resize/$",
+        api_move_or_resize_by_code_async,
+        name="api_move_or_resize_async",
+    ),
+    re_path(
+        r"^api/async/select_create/$",
+        api_select_create_async,
+        name="api_select_create_async",
+    ),
     re_path(r"^$", ListView.as_view(queryset=Calendar.objects.all()), name="schedule"),
 ]
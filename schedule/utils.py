@@ -1,7 +1,15 @@
+import asyncio
+import datetime
+import hashlib
 import heapq
-from functools import wraps
+import threading
+from collections import OrderedDict
+from functools import lru_cache, wraps
 
+import pytz
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db.models import Max
 from django.http import HttpResponseNotFound, HttpResponseRedirect
 from django.utils import timezone
 
@@ -10,8 +18,14 @@ from schedule.settings import (
     CHECK_CALENDAR_PERM_FUNC,
     CHECK_EVENT_PERM_FUNC,
     CHECK_OCCURRENCE_PERM_FUNC,
+    RRULE_CACHE_SIZE,
 )
 
+try:
+    import zoneinfo
+except ImportError:  # pragma: no cover
+    zoneinfo = None
+
 
 class EventListManager:
     """
@@ -23,12 +37,13 @@ class EventListManager:
     def __init__(self, events):
         self.events = events
 
-    def occurrences_after(self, after=None):
+    def occurrences_after(self, after=None, spans=False):
         """
         It is often useful to know what the next occurrence is given a list of
         events.  This function produces a generator that yields the
         the most recent occurrence after the date ``after`` from any of the
-        events in ``self.events``
+        events in ``self.events``. The occurrences that aren't persisted are
+        ``OccurrenceSpan`` values if ``spans`` is true.
         """
         from schedule.models import Occurrence
 
@@ -38,7 +53,7 @@ class EventListManager:
             Occurrence.objects.filter(event__in=self.events)
         )
         generators = [
-            event._occurrences_after_generator(after) for event in self.events
+            event._occurrences_after_generator(after, spans) for event in self.events
         ]
         occurrences = []
 
@@ -106,6 +121,114 @@ class OccurrenceReplacer:
         ]
 
 
+class RRuleCache:
+    """
+    A bounded, per-process LRU cache of the rrule objects compiled for events.
+    Building an rrule parses the rule params and the event start params, and it
+    is needed by every occurrence lookup, so the compiled objects are kept
+    around keyed by the event version (see ``Event.get_rrule_object``).
+
+    Entries are invalidated through the model signals when their event or rule
+    changes. ``hits`` and ``misses`` count the lookups since the last clear.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key, build):
+        """
+        Return the entry for ``key``, calling ``build`` to create it when it is
+        not cached yet.
+        """
+        if self.maxsize <= 0:
+            return build()
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, event_id=None, rule_id=None):
+        """
+        Drop the entries compiled for the event ``event_id`` and the entries of
+        the events using the rule ``rule_id``.
+        """
+        with self._lock:
+            stale = [
+                key
+                for key in self._entries
+                if key[0] == event_id or (rule_id is not None and key[2] == rule_id)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+rrule_cache = RRuleCache(RRULE_CACHE_SIZE)
+
+
+@lru_cache(maxsize=256)
+def get_timezone(tzinfo):
+    """
+    Returns the zone that naive datetimes are localized in for ``tzinfo``,
+    resolved once per tzinfo. ``zoneinfo`` zones are used as they are, any
+    other tzinfo is looked up in pytz by name, and fixed offsets that pytz
+    doesn't know by name (e.g. ``datetime.timezone(timedelta(hours=-5))``) are
+    used as they are.
+    """
+    if zoneinfo is not None and isinstance(tzinfo, zoneinfo.ZoneInfo):
+        return tzinfo
+    try:
+        return pytz.timezone(str(tzinfo))
+    except pytz.UnknownTimeZoneError:
+        if isinstance(tzinfo, datetime.tzinfo) and tzinfo.utcoffset(None) is not None:
+            return tzinfo
+        raise
+
+
+def localize(value, tzinfo):
+    """
+    Makes the naive datetime ``value`` aware in the zone of ``tzinfo``. Like
+    pytz's ``localize``, ambiguous and non-existent wall clock times resolve
+    to standard time.
+    """
+    zone = get_timezone(tzinfo)
+    if hasattr(zone, "localize"):
+        return zone.localize(value)
+    value = value.replace(tzinfo=zone)
+    if value.dst():
+        # the repeated hour after the end of DST, fold=1 is standard time
+        standard = value.replace(fold=1)
+        if not standard.dst():
+            return standard
+    return value
+
+
 def get_kwarg_or_param(request, kwargs, key):
     value = None
     try:
@@ -161,66 +284,93 @@ def get_objects(request, **kwargs):
     return occurrence, event, calendar
 
 
-def check_occurrence_permissions(function):
-    @wraps(function)
-    def decorator(request, *args, **kwargs):
-        user = request.user
-        if not user:
-            return HttpResponseRedirect(settings.LOGIN_URL)
-        occurrence, event, calendar = get_objects(request, **kwargs)
-        if calendar and event:
-            allowed = (
-                CHECK_EVENT_PERM_FUNC(event, user)
-                and CHECK_CALENDAR_PERM_FUNC(calendar, user)
-                and CHECK_OCCURRENCE_PERM_FUNC(occurrence, user)
-            )
-            if not allowed:
-                return HttpResponseRedirect(settings.LOGIN_URL)
-            # all checks passed
+def _check_permissions(function, denied_response):
+    """
+    Decorates the view ``function`` so that it returns the response returned
+    by ``denied_response(request, **kwargs)``, if any, instead of being called.
+    The checks are synchronous and run in a thread for async views.
+    """
+    if asyncio.iscoroutinefunction(function):
+
+        @wraps(function)
+        async def decorator(request, *args, **kwargs):
+            response = await sync_to_async(denied_response)(request, **kwargs)
+            if response is not None:
+                return response
+            return await function(request, *args, **kwargs)
+
+    else:
+
+        @wraps(function)
+        def decorator(request, *args, **kwargs):
+            response = denied_response(request, **kwargs)
+            if response is not None:
+                return response
             return function(request, *args, **kwargs)
-        return HttpResponseNotFound("<h1>Page not found</h1>")
 
     return decorator
 
 
-def check_event_permissions(function):
-    @wraps(function)
-    def decorator(request, *args, **kwargs):
+def _occurrence_denied_response(request, **kwargs):
+    user = request.user
+    if not user:
+        return HttpResponseRedirect(settings.LOGIN_URL)
+    occurrence, event, calendar = get_objects(request, **kwargs)
+    if calendar and event:
+        allowed = (
+            CHECK_EVENT_PERM_FUNC(event, user)
+            and CHECK_CALENDAR_PERM_FUNC(calendar, user)
+            and CHECK_OCCURRENCE_PERM_FUNC(occurrence, user)
+        )
+        if not allowed:
+            return HttpResponseRedirect(settings.LOGIN_URL)
+        # all checks passed
+        return None
+    return HttpResponseNotFound("<h1>Page not found</h1>")
+
+
+def _event_denied_response(request, **kwargs):
+    user = request.user
+    if not user:
+        return HttpResponseRedirect(settings.LOGIN_URL)
+    occurrence, event, calendar = get_objects(request, **kwargs)
+    if calendar:
+        allowed = CHECK_EVENT_PERM_FUNC(event, user) and CHECK_CALENDAR_PERM_FUNC(
+            calendar, user
+        )
+        if not allowed:
+            return HttpResponseRedirect(settings.LOGIN_URL)
+        # all checks passed
+        return None
+    return HttpResponseNotFound("<h1>Page not found</h1>")
+
+
+def _calendar_denied_response(request, **kwargs):
+    if CALENDAR_VIEW_PERM:
         user = request.user
         if not user:
             return HttpResponseRedirect(settings.LOGIN_URL)
         occurrence, event, calendar = get_objects(request, **kwargs)
         if calendar:
-            allowed = CHECK_EVENT_PERM_FUNC(event, user) and CHECK_CALENDAR_PERM_FUNC(
-                calendar, user
-            )
+            allowed = CHECK_CALENDAR_PERM_FUNC(calendar, user)
             if not allowed:
                 return HttpResponseRedirect(settings.LOGIN_URL)
             # all checks passed
-            return function(request, *args, **kwargs)
+            return None
         return HttpResponseNotFound("<h1>Page not found</h1>")
+    return None
 
-    return decorator
 
+def check_occurrence_permissions(function):
+    return _check_permissions(function, _occurrence_denied_response)
 
-def check_calendar_permissions(function):
-    @wraps(function)
-    def decorator(request, *args, **kwargs):
-        if CALENDAR_VIEW_PERM:
-            user = request.user
-            if not user:
-                return HttpResponseRedirect(settings.LOGIN_URL)
-            occurrence, event, calendar = get_objects(request, **kwargs)
-            if calendar:
-                allowed = CHECK_CALENDAR_PERM_FUNC(calendar, user)
-                if not allowed:
-                    return HttpResponseRedirect(settings.LOGIN_URL)
-                # all checks passed
-                return function(request, *args, **kwargs)
-            return HttpResponseNotFound("<h1>Page not found</h1>")
-        return function(request, *args, **kwargs)
 
-    return decorator
+def check_event_permissions(function):
+    return _check_permissions(function, _event_denied_response)
+
+
+def check_calendar_permissions(function):
+    return _check_permissions(function, _calendar_denied_response)
 
 
 def coerce_date_dict(date_dict):
@@ -241,3 +391,21 @@ def coerce_date_dict(date_dict):
         except KeyError:
             break
     return modified and ret_val or {}
+
+
+def calendars_etag(calendars, *parts):
+    """
+    Returns an ETag for a response computed from the events of the calendars
+    in the ``calendars`` QuerySet, and from ``parts`` (e.g. the request
+    parameters). It changes whenever the ``version`` of one of them does.
+    """
+    versions = list(calendars.order_by("pk").values_list("pk", "version", "changed_on"))
+    return hashlib.sha1(repr((versions,) + parts).encode()).hexdigest()
+
+
+def calendars_last_modified(calendars):
+    """
+    Returns when one of the calendars in the ``calendars`` QuerySet or one of
+    their events last changed.
+    """
+    return calendars.aggregate(Max("changed_on"))["changed_on__max"]
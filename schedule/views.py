@@ -1,19 +1,34 @@
 import datetime
+import json
+from functools import wraps
 from urllib.parse import quote
 
 import dateutil.parser
 import pytz
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db.models import F, Q
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Max, Q
 from django.http import (
     Http404,
     HttpResponseBadRequest,
+    HttpResponseNotAllowed,
     HttpResponseRedirect,
     JsonResponse,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import (
+    http_date,
+    quote_etag,
+    urlsafe_base64_decode,
+    urlsafe_base64_encode,
+)
 
 try:
     from django.utils.http import url_has_allowed_host_and_scheme
@@ -21,7 +36,7 @@ except ImportError:
     # Django<=2.2
     from django.utils.http import is_safe_url as url_has_allowed_host_and_scheme
 
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.views.generic.base import TemplateResponseMixin
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import (
@@ -33,17 +48,26 @@ from django.views.generic.edit import (
 )
 
 from schedule.forms import EventForm, OccurrenceForm
-from schedule.models import Calendar, Event, Occurrence
+from schedule.models import Calendar, CalendarChange, Event, Occurrence, OccurrenceIndex
 from schedule.periods import weekday_names
 from schedule.settings import (
+    API_PAGE_SIZE,
+    API_STREAM_BATCH_SIZE,
+    CALENDAR_VIEW_PERM,
+    CHECK_CALENDAR_PERM_FUNC,
     CHECK_EVENT_PERM_FUNC,
     CHECK_OCCURRENCE_PERM_FUNC,
     EVENT_NAME_PLACEHOLDER,
     GET_EVENTS_FUNC,
     OCCURRENCE_CANCEL_REDIRECT,
+    SYNC_TOKEN_DELAY,
     USE_FULLCALENDAR,
+    USE_OCCURRENCE_INDEX,
+    USE_PERIOD_CACHE,
 )
 from schedule.utils import (
+    calendars_etag,
+    calendars_last_modified,
     check_calendar_permissions,
     check_event_permissions,
     check_occurrence_permissions,
@@ -122,6 +146,8 @@ class CalendarByPeriodsView(CalendarMixin, DetailView):
 
         local_timezone = timezone.get_current_timezone()
         period = period_class(event_list, date, tzinfo=local_timezone)
+        if USE_PERIOD_CACHE:
+            period.cache_occurrences(calendar)
 
         context.update(
             {
@@ -331,23 +357,283 @@ def get_next_url(request, default):
     return next_url
 
 
+def _api_occurrences_calendars(request):
+    calendar_slug = request.GET.get("calendar_slug")
+    if calendar_slug:
+        return Calendar.objects.filter(slug=calendar_slug)
+    return Calendar.objects.all()
+
+
+def _api_occurrences_etag(request):
+    # the ids of unpersisted occurrences are offset by the latest occurrence id
+    latest_id = Occurrence.objects.aggregate(Max("id"))["id__max"]
+    return calendars_etag(
+        _api_occurrences_calendars(request),
+        sorted(request.GET.lists()),
+        latest_id,
+    )
+
+
+def _api_occurrences_last_modified(request):
+    return calendars_last_modified(_api_occurrences_calendars(request))
+
+
 @check_calendar_permissions
+@condition(
+    etag_func=_api_occurrences_etag,
+    last_modified_func=_api_occurrences_last_modified,
+)
 def api_occurrences(request):
     start = request.GET.get("start")
     end = request.GET.get("end")
     calendar_slug = request.GET.get("calendar_slug")
     timezone = request.GET.get("timezone")
+    stream = request.GET.get("stream") in ("1", "true")
 
     try:
-        response_data = _api_occurrences(start, end, calendar_slug, timezone)
+        if stream:
+            response_data = _iter_api_occurrences(
+                start, end, calendar_slug, timezone, API_STREAM_BATCH_SIZE
+            )
+        else:
+            response_data = _api_occurrences(start, end, calendar_slug, timezone)
     except (ValueError, Calendar.DoesNotExist) as e:
         return HttpResponseBadRequest(e)
 
+    if stream:
+        return StreamingHttpResponse(
+            _stream_json_array(response_data), content_type="application/json"
+        )
     return JsonResponse(response_data, safe=False)
 
 
+@check_calendar_permissions
+@condition(
+    etag_func=_api_occurrences_etag,
+    last_modified_func=_api_occurrences_last_modified,
+)
+def api_occurrences_page(request):
+    start = request.GET.get("start")
+    end = request.GET.get("end")
+    calendar_slug = request.GET.get("calendar_slug")
+    timezone = request.GET.get("timezone")
+    limit = request.GET.get("limit")
+    cursor = request.GET.get("cursor")
+
+    try:
+        response_data = _api_occurrences_page(
+            start, end, calendar_slug, timezone, limit, cursor
+        )
+    except (ValueError, Calendar.DoesNotExist) as e:
+        return HttpResponseBadRequest(e)
+
+    return JsonResponse(response_data)
+
+
+def _occurrence_key(occurrence):
+    return (occurrence.start, occurrence.event_id, occurrence.original_start)
+
+
+def _encode_cursor(key):
+    start, event_id, original_start = key
+    data = [start.isoformat(), event_id, original_start.isoformat()]
+    return urlsafe_base64_encode(json.dumps(data).encode())
+
+
+def _decode_cursor(cursor):
+    try:
+        start, event_id, original_start = json.loads(urlsafe_base64_decode(cursor))
+        return (
+            datetime.datetime.fromisoformat(start),
+            int(event_id),
+            datetime.datetime.fromisoformat(original_start),
+        )
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def _api_occurrences_page(start, end, calendar_slug, timezone, limit, cursor):
+    """
+    Returns at most ``limit`` occurrences sorted by start, event id and
+    original start, following the occurrence encoded in ``cursor``, and the
+    cursor of the next page, if any.
+
+    The events are expanded in windows that start at the cursor and double in
+    length until the page is full, so the cost of a page does not depend on
+    how far it is from ``start``.
+    """
+    try:
+        limit = min(int(limit or API_PAGE_SIZE), API_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("The limit parameter must be an integer")
+    if limit < 1:
+        raise ValueError("The limit parameter must be positive")
+    start, end, current_tz, events, i = _api_occurrences_query(
+        start, end, calendar_slug, timezone
+    )
+    # the occurrences with a key up to bound were returned in previous pages
+    bound = _decode_cursor(cursor) if cursor else None
+    window_start = max(bound[0], start) if bound else start
+    window = datetime.timedelta(days=1)
+    occurrences = []
+    while window_start < end and len(occurrences) < limit:
+        window_end = min(window_start + window, end)
+        occurrences += sorted(
+            (
+                occurrence
+                for occurrence in Event.objects.expand(
+                    events, window_start, window_end, spans=True
+                )
+                # cancelled occurrences are not returned, so they must not
+                # count toward the limit
+                if not occurrence.cancelled
+                and occurrence.start < window_end
+                and (bound is None or _occurrence_key(occurrence) > bound)
+            ),
+            key=_occurrence_key,
+        )
+        # the occurrences that start before window_end have been collected
+        bound = (window_end,)
+        window_start = window_end
+        window *= 2
+    next_cursor = None
+    if len(occurrences) > limit or (occurrences and window_start < end):
+        occurrences = occurrences[:limit]
+        next_cursor = _encode_cursor(_occurrence_key(occurrences[-1]))
+    return {
+        "occurrences": list(_serialize_occurrences(occurrences, i, current_tz)),
+        "next_cursor": next_cursor,
+    }
+
+
+@check_calendar_permissions
+def api_changes(request):
+    calendar_slug = request.GET.get("calendar_slug")
+    sync_token = request.GET.get("sync_token")
+
+    try:
+        response_data = _api_changes(calendar_slug, sync_token)
+    except (ValueError, Calendar.DoesNotExist) as e:
+        return HttpResponseBadRequest(e)
+
+    return JsonResponse(response_data)
+
+
+def _api_changes(calendar_slug, sync_token):
+    """
+    Returns the events and occurrences of the calendar that changed after
+    ``sync_token``, at most ``API_PAGE_SIZE`` changes at a time, and the token
+    to pass to get the next changes. Several changes of the same object are
+    reported once, with the last action, except that an object created and
+    then updated is reported as created. Changes are only reported once they
+    are ``SYNC_TOKEN_DELAY`` seconds old.
+    """
+    if not calendar_slug:
+        raise ValueError("The calendar_slug parameter is required")
+    try:
+        sync_token = int(sync_token or 0)
+    except ValueError:
+        raise ValueError("Invalid sync token")
+    # will raise DoesNotExist exception if no match
+    calendar = Calendar.objects.get(slug=calendar_slug)
+    # a change is visible once its transaction commits, after changes with
+    # greater ids may have been reported, so the token is capped at the latest
+    # change old enough for the transactions of the previous ones to be
+    # committed
+    latest_token = CalendarChange.objects.latest_token(
+        timezone.now() - datetime.timedelta(seconds=SYNC_TOKEN_DELAY)
+    )
+    changes = list(
+        CalendarChange.objects.since(calendar, sync_token).filter(pk__lte=latest_token)[
+            : API_PAGE_SIZE + 1
+        ]
+    )
+    more = len(changes) > API_PAGE_SIZE
+    if more:
+        changes = changes[:API_PAGE_SIZE]
+        sync_token = changes[-1].pk
+    else:
+        # nothing else changed in the calendar up to the latest change, so
+        # clients can skip the changes of other calendars
+        sync_token = max(sync_token, latest_token)
+    objects = {}
+    for change in changes:
+        key = (change.object_type, change.object_id)
+        action = change.action
+        previous = objects.pop(key, None)
+        if previous is not None and previous["action"] == CalendarChange.CREATED:
+            if action == CalendarChange.UPDATED:
+                action = CalendarChange.CREATED
+        objects[key] = {
+            "type": change.object_type,
+            "id": change.object_id,
+            "event_id": change.event_id,
+            "action": action,
+        }
+    return {"changes": list(objects.values()), "sync_token": sync_token, "more": more}
+
+
+def _stream_json_array(items):
+    """
+    Yields the JSON encoding of a list of the given items one item at a time,
+    encoded like ``JsonResponse`` does.
+    """
+    encoder = DjangoJSONEncoder()
+    separator = "["
+    for item in items:
+        yield separator + encoder.encode(item)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
 def _api_occurrences(start, end, calendar_slug, timezone):
+    return list(_iter_api_occurrences(start, end, calendar_slug, timezone))
+
+
+def _expand_in_batches(events, start, end, batch_size):
+    """
+    Expands the events batch_size events at a time, so that only the
+    occurrences of one batch are held in memory.
+    """
+    event_ids = list(
+        events.overlapping(start, end).order_by("pk").values_list("pk", flat=True)
+    )
+    while event_ids:
+        batch = events.filter(pk__in=event_ids[:batch_size])
+        del event_ids[:batch_size]
+        yield from Event.objects.expand(batch, start, end, spans=True)
+
+
+def _api_occurrences_query(start, end, calendar_slug, timezone):
+    """
+    Validates the parameters of the occurrences API and returns the start and
+    end, the requested timezone, the events and the offset of the ids of
+    unpersisted occurrences.
+    """
+    start, end, current_tz = _api_occurrences_bounds(start, end, timezone)
+    if calendar_slug:
+        # will raise DoesNotExist exception if no match
+        calendars = [Calendar.objects.get(slug=calendar_slug)]
+    # if no calendar slug is given, get all the calendars
+    else:
+        calendars = Calendar.objects.all()
+    # Algorithm to get an id for the occurrences in fullcalendar (NOT THE SAME
+    # AS IN THE DB) which are always unique.
+    # Fullcalendar thinks that all their "events" with the same "event.id" in
+    # their system are the same object, because it's not really built around
+    # the idea of events (generators)
+    # and occurrences (their events).
+    # Check the "persisted" boolean value that tells it whether to change the
+    # event, using the "event_id" or the occurrence with the specified "id".
+    # for more info https://github.com/llazzaro/django-scheduler/pull/169
+    i = (Occurrence.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+    events = Event.objects.filter(calendar__in=calendars).select_related(
+        "calendar", "creator"
+    )
+    return start, end, current_tz, events, i
+
 
+def _api_occurrences_bounds(start, end, timezone):
     if not start or not end:
         raise ValueError("Start and end parameters are required")
     # version 2 of full calendar
@@ -381,80 +667,70 @@ def _api_occurrences(start, end, calendar_slug, timezone):
         utc = pytz.UTC
         start = utc.localize(start)
         end = utc.localize(end)
+    return start, end, current_tz
 
-    if calendar_slug:
-        # will raise DoesNotExist exception if no match
-        calendars = [Calendar.objects.get(slug=calendar_slug)]
-    # if no calendar slug is given, get all the calendars
+
+def _iter_api_occurrences(start, end, calendar_slug, timezone, batch_size=None):
+    """
+    Validates the parameters and returns an iterator over the occurrence
+    dictionaries of the API. The occurrences are sorted by start, unless
+    batch_size is given, in which case the events are expanded in batches of
+    that size and the occurrences are only sorted within a batch.
+    """
+    start, end, current_tz, events, i = _api_occurrences_query(
+        start, end, calendar_slug, timezone
+    )
+    if batch_size:
+        occurrences = _expand_in_batches(events, start, end, batch_size)
     else:
-        calendars = Calendar.objects.all()
-    response_data = []
-    # Algorithm to get an id for the occurrences in fullcalendar (NOT THE SAME
-    # AS IN THE DB) which are always unique.
-    # Fullcalendar thinks that all their "events" with the same "event.id" in
-    # their system are the same object, because it's not really built around
-    # the idea of events (generators)
-    # and occurrences (their events).
-    # Check the "persisted" boolean value that tells it whether to change the
-    # event, using the "event_id" or the occurrence with the specified "id".
-    # for more info https://github.com/llazzaro/django-scheduler/pull/169
-    i = 1
-    if Occurrence.objects.all().exists():
-        i = Occurrence.objects.latest("id").id + 1
-    event_list = []
-    for calendar in calendars:
-        # create flat list of events from each calendar
-        event_list += calendar.events.filter(start__lte=end).filter(
-            Q(end_recurring_period__gte=start) | Q(end_recurring_period__isnull=True)
-        )
-    for event in event_list:
-        occurrences = event.get_occurrences(start, end)
-        for occurrence in occurrences:
-            occurrence_id = i + occurrence.event.id
-            existed = False
-
-            if occurrence.id:
-                occurrence_id = occurrence.id
-                existed = True
-
-            recur_rule = occurrence.event.rule.name if occurrence.event.rule else None
-
-            if occurrence.event.end_recurring_period:
-                recur_period_end = occurrence.event.end_recurring_period
-                if current_tz:
-                    # make recur_period_end aware in given timezone
-                    recur_period_end = recur_period_end.astimezone(current_tz)
-                recur_period_end = recur_period_end
-            else:
-                recur_period_end = None
+        occurrences = Event.objects.expand(events, start, end, spans=True)
+    return _serialize_occurrences(occurrences, i, current_tz)
+
+
+def _serialize_occurrences(occurrences, i, current_tz):
+    for occurrence in occurrences:
+        occurrence_id = i + occurrence.event.id
+        existed = False
+
+        if occurrence.id:
+            occurrence_id = occurrence.id
+            existed = True
 
-            event_start = occurrence.start
-            event_end = occurrence.end
+        recur_rule = occurrence.event.rule.name if occurrence.event.rule else None
+
+        if occurrence.event.end_recurring_period:
+            recur_period_end = occurrence.event.end_recurring_period
             if current_tz:
-                # make event start and end dates aware in given timezone
-                event_start = event_start.astimezone(current_tz)
-                event_end = event_end.astimezone(current_tz)
-            if occurrence.cancelled:
-                # fixes bug 508
-                continue
-            response_data.append(
-                {
-                    "id": occurrence_id,
-                    "title": occurrence.title,
-                    "start": event_start,
-                    "end": event_end,
-                    "existed": existed,
-                    "event_id": occurrence.event.id,
-                    "color": occurrence.event.color_event,
-                    "description": occurrence.description,
-                    "rule": recur_rule,
-                    "end_recurring_period": recur_period_end,
-                    "creator": str(occurrence.event.creator),
-                    "calendar": occurrence.event.calendar.slug,
-                    "cancelled": occurrence.cancelled,
-                }
-            )
-    return response_data
+                # make recur_period_end aware in given timezone
+                recur_period_end = recur_period_end.astimezone(current_tz)
+            recur_period_end = recur_period_end
+        else:
+            recur_period_end = None
+
+        event_start = occurrence.start
+        event_end = occurrence.end
+        if current_tz:
+            # make event start and end dates aware in given timezone
+            event_start = event_start.astimezone(current_tz)
+            event_end = event_end.astimezone(current_tz)
+        if occurrence.cancelled:
+            # fixes bug 508
+            continue
+        yield {
+            "id": occurrence_id,
+            "title": occurrence.title,
+            "start": event_start,
+            "end": event_end,
+            "existed": existed,
+            "event_id": occurrence.event.id,
+            "color": occurrence.event.color_event,
+            "description": occurrence.description,
+            "rule": recur_rule,
+            "end_recurring_period": recur_period_end,
+            "creator": str(occurrence.event.creator),
+            "calendar": occurrence.event.calendar.slug,
+            "cancelled": occurrence.cancelled,
+        }
 
 
 @require_POST
@@ -496,15 +772,221 @@ def _api_move_or_resize_by_code(user, id, existed, delta, resize, event_id):
             dts = delta
         event.end = event.end + delta
         if CHECK_EVENT_PERM_FUNC(event, user):
-            event.save()
-            event.occurrence_set.all().update(
-                original_start=F("original_start") + dts,
-                original_end=F("original_end") + dte,
-            )
+            _save_moved_event(event, dts, dte)
             response_data["status"] = "OK"
     return response_data
 
 
+def _save_moved_event(event, dts, dte):
+    """
+    Saves an event whose start and end were moved by ``dts`` and ``dte`` and
+    shifts the original span of its persisted occurrences with it.
+    """
+    # the persisted occurrences are shifted before the event is saved, so that
+    # the occurrence index rebuilt on save sees them moved
+    with transaction.atomic():
+        event.occurrence_set.all().update(
+            original_start=F("original_start") + dts,
+            original_end=F("original_end") + dte,
+        )
+        event.save()
+
+
+@require_POST
+def api_move_or_resize_batch(request):
+    try:
+        operations = _parse_move_or_resize_operations(request.body)
+    except ValueError as e:
+        return HttpResponseBadRequest(e)
+
+    response_data = _api_move_or_resize_batch(request.user, operations)
+
+    return JsonResponse(response_data)
+
+
+def _parse_move_or_resize_operations(body):
+    """
+    Parses a JSON body like ``{"operations": [{"id": 1, "existed": true,
+    "delta": 30, "resize": false, "event_id": 2}, ...]}`` into a list of
+    (id, existed, delta, resize, event_id) tuples, with the same meaning as
+    the parameters of ``api_move_or_resize_by_code``.
+    """
+    try:
+        operations = json.loads(body)["operations"]
+        return [
+            (
+                int(operation["id"]) if operation.get("existed") else None,
+                bool(operation.get("existed")),
+                datetime.timedelta(minutes=int(operation["delta"])),
+                bool(operation.get("resize", False)),
+                None if operation.get("existed") else int(operation["event_id"]),
+            )
+            for operation in operations
+        ]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ValueError("Invalid operations")
+
+
+def _api_move_or_resize_batch(user, operations):
+    """
+    Applies the move or resize ``operations`` in one transaction and returns
+    the status of each of them. The occurrences and events are fetched with
+    one query each, and the occurrences are saved with one bulk update. With
+    ``CALENDAR_VIEW_PERM``, the calendar of every target is checked too.
+    """
+    occurrence_ids = {id for id, existed, _, _, _ in operations if existed}
+    event_ids = {event_id for _, existed, _, _, event_id in operations if not existed}
+    results = []
+    with transaction.atomic():
+        # the occurrences of moved events are fetched too, to shift their
+        # original start and end
+        occurrences = {
+            occurrence.pk: occurrence
+            for occurrence in Occurrence.objects.select_for_update()
+            .select_related("event")
+            .filter(Q(pk__in=occurrence_ids) | Q(event__in=event_ids))
+        }
+        events = Event.objects.select_for_update().in_bulk(event_ids)
+        for occurrence in occurrences.values():
+            occurrence.event = events.get(occurrence.event_id, occurrence.event)
+        calendars = {}
+        if CALENDAR_VIEW_PERM:
+            calendars = Calendar.objects.in_bulk(
+                {event.calendar_id for event in events.values()}
+                | {occurrence.event.calendar_id for occurrence in occurrences.values()}
+            )
+
+        def calendar_allowed(event):
+            return not CALENDAR_VIEW_PERM or CHECK_CALENDAR_PERM_FUNC(
+                calendars.get(event.calendar_id), user
+            )
+
+        moved_occurrences = {}
+        shifted_occurrences = {}
+        moved_events = {}
+        for id, existed, delta, resize, event_id in operations:
+            status = "PERMISSION DENIED"
+            if existed:
+                occurrence = occurrences.get(id)
+                if occurrence is None:
+                    results.append({"status": "NOT FOUND"})
+                    continue
+                dts = datetime.timedelta(0) if resize else delta
+                occurrence.start += dts
+                occurrence.end += delta
+                if calendar_allowed(occurrence.event) and CHECK_OCCURRENCE_PERM_FUNC(
+                    occurrence, user
+                ):
+                    moved_occurrences[occurrence.pk] = occurrence
+                    status = "OK"
+                else:
+                    occurrence.start -= dts
+                    occurrence.end -= delta
+            else:
+                event = events.get(event_id)
+                if event is None:
+                    results.append({"status": "NOT FOUND"})
+                    continue
+                dts = datetime.timedelta(0) if resize else delta
+                event.start += dts
+                event.end += delta
+                if calendar_allowed(event) and CHECK_EVENT_PERM_FUNC(event, user):
+                    moved_events[event.pk] = event
+                    for occurrence in occurrences.values():
+                        if occurrence.event_id == event.pk:
+                            occurrence.original_start += dts
+                            occurrence.original_end += delta
+                            shifted_occurrences[occurrence.pk] = occurrence
+                    status = "OK"
+                else:
+                    event.start -= dts
+                    event.end -= delta
+            results.append({"status": status})
+
+        Occurrence.objects.bulk_update(
+            list({**shifted_occurrences, **moved_occurrences}.values()),
+            ["start", "end", "original_start", "original_end"],
+        )
+        for event in moved_events.values():
+            event.save()
+        # bulk_update doesn't send post_save, so the calendars of the moved
+        # occurrences are updated here
+        calendar_ids = {
+            occurrence.event.calendar_id for occurrence in moved_occurrences.values()
+        }
+        Calendar.objects.bump_versions(calendar_ids)
+        CalendarChange.objects.bulk_create(
+            [
+                CalendarChange(
+                    calendar_id=occurrence.event.calendar_id,
+                    object_type=CalendarChange.OCCURRENCE,
+                    object_id=occurrence.pk,
+                    event_id=occurrence.event_id,
+                    action=CalendarChange.UPDATED,
+                )
+                for occurrence in moved_occurrences.values()
+                if occurrence.event.calendar_id is not None
+            ]
+        )
+        if USE_OCCURRENCE_INDEX:
+            for occurrence in moved_occurrences.values():
+                OccurrenceIndex.objects.update_occurrence(occurrence)
+    return {"results": results}
+
+
+@require_POST
+def api_bulk_ingest(request):
+    try:
+        response_data = _api_bulk_ingest(request.user, request.body)
+    except (ValueError, ValidationError, Calendar.DoesNotExist) as e:
+        return HttpResponseBadRequest(
+            "; ".join(e.messages) if isinstance(e, ValidationError) else e
+        )
+
+    return JsonResponse(response_data)
+
+
+def _parse_ingested_event(data):
+    event = {
+        field: data[field]
+        for field in ("title", "description", "color_event", "rule")
+        if data.get(field) is not None
+    }
+    for field in ("start", "end", "end_recurring_period"):
+        if data.get(field):
+            event[field] = dateutil.parser.parse(data[field])
+    return event
+
+
+def _api_bulk_ingest(user, body):
+    """
+    Creates the events of a JSON body like ``{"calendar_slug": "example",
+    "events": [{"title": "Lecture", "start": "2008-01-05T08:00:00Z",
+    "end": "2008-01-05T09:00:00Z", "rule": {"frequency": "WEEKLY"}}]}`` with
+    ``Event.objects.bulk_ingest``. With ``CALENDAR_VIEW_PERM``, the user must
+    pass ``CHECK_CALENDAR_PERM_FUNC`` for the calendar.
+    """
+    try:
+        data = json.loads(body)
+        calendar_slug = data["calendar_slug"]
+        events = [_parse_ingested_event(event) for event in data["events"]]
+    except (KeyError, TypeError, AttributeError, OverflowError):
+        raise ValueError("Invalid events")
+    calendar = Calendar.objects.get(slug=calendar_slug)
+    if CALENDAR_VIEW_PERM and not CHECK_CALENDAR_PERM_FUNC(calendar, user):
+        return {"status": "PERMISSION DENIED"}
+    creator = user if user.is_authenticated else None
+    for event in events:
+        event["creator"] = creator
+
+    with transaction.atomic():
+        created = Event.objects.bulk_ingest(events, calendar)
+        if not all(CHECK_EVENT_PERM_FUNC(event, user) for event in created):
+            transaction.set_rollback(True)
+            return {"status": "PERMISSION DENIED"}
+    return {"status": "OK", "ids": [event.pk for event in created]}
+
+
 @require_POST
 @check_calendar_permissions
 def api_select_create(request):
@@ -530,3 +1012,144 @@ def _api_select_create(start, end, calendar_slug):
     response_data = {}
     response_data["status"] = "OK"
     return response_data
+
+
+# Async variants of the API views, for ASGI deployments. They use the async
+# ORM of Django 4.1+. Saving models, which sends synchronous signals, and the
+# permission checks run in a thread.
+
+
+def _async_condition(etag_func, last_modified_func):
+    """
+    Like django.views.decorators.http.condition, for async views. The
+    functions are synchronous and run in a thread.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        async def inner(request, *args, **kwargs):
+            etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = await sync_to_async(last_modified_func)(
+                request, *args, **kwargs
+            )
+            if last_modified:
+                if not timezone.is_aware(last_modified):
+                    last_modified = timezone.make_aware(
+                        last_modified, datetime.timezone.utc
+                    )
+                last_modified = int(last_modified.timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = await function(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return inner
+
+    return decorator
+
+
+def _get_user(request):
+    # evaluates the lazy user, which can query the database
+    request.user.is_authenticated
+    return request.user
+
+
+@check_calendar_permissions
+@_async_condition(
+    etag_func=_api_occurrences_etag,
+    last_modified_func=_api_occurrences_last_modified,
+)
+async def api_occurrences_async(request):
+    start = request.GET.get("start")
+    end = request.GET.get("end")
+    calendar_slug = request.GET.get("calendar_slug")
+    timezone = request.GET.get("timezone")
+
+    try:
+        response_data = await _aapi_occurrences(start, end, calendar_slug, timezone)
+    except (ValueError, Calendar.DoesNotExist) as e:
+        return HttpResponseBadRequest(e)
+
+    return JsonResponse(response_data, safe=False)
+
+
+async def _aapi_occurrences(start, end, calendar_slug, timezone):
+    start, end, current_tz = _api_occurrences_bounds(start, end, timezone)
+    if calendar_slug:
+        # will raise DoesNotExist exception if no match
+        calendars = [await Calendar.objects.aget(slug=calendar_slug)]
+    else:
+        calendars = Calendar.objects.all()
+    # see _api_occurrences_query
+    latest_id = (await Occurrence.objects.aaggregate(Max("id")))["id__max"]
+    i = (latest_id or 0) + 1
+    events = Event.objects.filter(calendar__in=calendars).select_related(
+        "calendar", "creator"
+    )
+    occurrences = await Event.objects.aexpand(events, start, end, spans=True)
+    return list(_serialize_occurrences(occurrences, i, current_tz))
+
+
+@check_calendar_permissions
+async def api_move_or_resize_by_code_async(request):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    user = await sync_to_async(_get_user)(request)
+    id = request.POST.get("id")
+    existed = bool(request.POST.get("existed") == "true")
+    delta = datetime.timedelta(minutes=int(request.POST.get("delta")))
+    resize = bool(request.POST.get("resize", False))
+    event_id = request.POST.get("event_id")
+
+    response_data = await _aapi_move_or_resize_by_code(
+        user, id, existed, delta, resize, event_id
+    )
+
+    return JsonResponse(response_data)
+
+
+async def _aapi_move_or_resize_by_code(user, id, existed, delta, resize, event_id):
+    response_data = {}
+    response_data["status"] = "PERMISSION DENIED"
+
+    if existed:
+        occurrence = await Occurrence.objects.select_related("event").aget(id=id)
+        occurrence.end += delta
+        if not resize:
+            occurrence.start += delta
+        if await sync_to_async(CHECK_OCCURRENCE_PERM_FUNC)(occurrence, user):
+            await sync_to_async(occurrence.save)()
+            response_data["status"] = "OK"
+    else:
+        event = await Event.objects.aget(id=event_id)
+        dts = 0
+        dte = delta
+        if not resize:
+            event.start += delta
+            dts = delta
+        event.end = event.end + delta
+        if await sync_to_async(CHECK_EVENT_PERM_FUNC)(event, user):
+            await sync_to_async(_save_moved_event)(event, dts, dte)
+            response_data["status"] = "OK"
+    return response_data
+
+
+@check_calendar_permissions
+async def api_select_create_async(request):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    start = dateutil.parser.parse(request.POST.get("start"))
+    end = dateutil.parser.parse(request.POST.get("end"))
+    calendar = await Calendar.objects.aget(slug=request.POST.get("calendar_slug"))
+    await Event.objects.acreate(
+        start=start, end=end, title=EVENT_NAME_PLACEHOLDER, calendar=calendar
+    )
+    return JsonResponse({"status": "OK"})
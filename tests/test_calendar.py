@@ -3,7 +3,7 @@ import datetime
 from django.test import TestCase
 from django.utils import timezone
 
-from schedule.models import Calendar, CalendarRelation, Event, Rule
+from schedule.models import Calendar, CalendarChange, CalendarRelation, Event, Rule
 
 
 class TestCalendarInheritance(TestCase):
@@ -123,3 +123,158 @@ class TestCalendar(TestCase):
         )
         calendar.get_absolute_url()
         CalendarRelation.objects.create_relation(calendar, rule)
+
+
+class TestCalendarVersion(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="mycal")
+        self.rule = Rule.objects.create(frequency="WEEKLY")
+        self.event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=datetime.timezone.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=datetime.timezone.utc),
+            rule=self.rule,
+            calendar=self.calendar,
+        )
+
+    def assertVersionBumped(self, calendar=None):
+        calendar = calendar or self.calendar
+        version = calendar.version
+        calendar.refresh_from_db()
+        self.assertGreater(calendar.version, version)
+
+    def test_event_changes_bump_the_version(self):
+        self.assertVersionBumped()
+        self.event.title = "Renamed"
+        self.event.save()
+        self.assertVersionBumped()
+        self.event.delete()
+        self.assertVersionBumped()
+
+    def test_changes_set_changed_on(self):
+        self.calendar.refresh_from_db()
+        changed_on = self.calendar.changed_on
+        self.event.save()
+        self.calendar.refresh_from_db()
+        self.assertGreater(self.calendar.changed_on, changed_on)
+        changed_on = self.calendar.changed_on
+        self.calendar.name = "Renamed"
+        self.calendar.save()
+        self.assertGreater(self.calendar.changed_on, changed_on)
+
+    def test_moving_an_event_bumps_both_calendars(self):
+        other = Calendar.objects.create(name="Other", slug="other")
+        self.calendar.refresh_from_db()
+        self.event.calendar = other
+        self.event.save()
+        self.assertVersionBumped()
+        self.assertVersionBumped(other)
+
+    def test_occurrence_changes_bump_the_version(self):
+        self.calendar.refresh_from_db()
+        occurrence = self.event.get_occurrences(
+            datetime.datetime(2008, 1, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=datetime.timezone.utc),
+        )[0]
+        occurrence.cancel()
+        self.assertVersionBumped()
+        occurrence.delete()
+        self.assertVersionBumped()
+
+    def test_rule_changes_bump_the_version(self):
+        self.calendar.refresh_from_db()
+        self.rule.frequency = "DAILY"
+        self.rule.save()
+        self.assertVersionBumped()
+        self.rule.delete()
+        self.assertVersionBumped()
+
+
+class TestCalendarChange(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="mycal")
+        self.rule = Rule.objects.create(frequency="WEEKLY")
+        self.event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=datetime.timezone.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=datetime.timezone.utc),
+            rule=self.rule,
+            calendar=self.calendar,
+        )
+        self.token = CalendarChange.objects.latest_token()
+
+    def assertChanges(self, calendar, expected):
+        changes = CalendarChange.objects.since(calendar, self.token)
+        self.assertEqual(
+            [(c.object_type, c.object_id, c.action) for c in changes], expected
+        )
+        self.token = CalendarChange.objects.latest_token()
+
+    def test_event_changes(self):
+        self.token = 0
+        self.assertChanges(self.calendar, [("event", self.event.pk, "created")])
+        self.event.title = "Renamed"
+        self.event.save()
+        self.assertChanges(self.calendar, [("event", self.event.pk, "updated")])
+        event_id = self.event.pk
+        self.event.delete()
+        self.assertChanges(self.calendar, [("event", event_id, "deleted")])
+
+    def test_moving_an_event(self):
+        other = Calendar.objects.create(name="Other", slug="other")
+        self.event.calendar = other
+        self.event.save()
+        self.assertChanges(self.calendar, [("event", self.event.pk, "deleted")])
+        self.token = 0
+        self.assertChanges(other, [("event", self.event.pk, "created")])
+        self.event.save(update_fields=["title"])
+        self.assertChanges(other, [("event", self.event.pk, "updated")])
+
+    def test_occurrence_changes(self):
+        occurrence = self.event.get_occurrences(
+            datetime.datetime(2008, 1, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=datetime.timezone.utc),
+        )[0]
+        occurrence.cancel()
+        self.assertChanges(self.calendar, [("occurrence", occurrence.pk, "created")])
+        occurrence.uncancel()
+        self.assertChanges(self.calendar, [("occurrence", occurrence.pk, "updated")])
+        occurrence_id = occurrence.pk
+        occurrence.delete()
+        self.assertChanges(self.calendar, [("occurrence", occurrence_id, "deleted")])
+        self.assertEqual(
+            CalendarChange.objects.filter(object_type="occurrence")
+            .values_list("event_id", flat=True)
+            .distinct()
+            .get(),
+            self.event.pk,
+        )
+
+    def test_rule_changes(self):
+        self.rule.frequency = "DAILY"
+        self.rule.save()
+        self.assertChanges(self.calendar, [("event", self.event.pk, "updated")])
+        self.rule.delete()
+        self.assertChanges(self.calendar, [("event", self.event.pk, "updated")])
+
+    def test_deleting_a_calendar(self):
+        self.event.get_occurrences(
+            datetime.datetime(2008, 1, 1, tzinfo=datetime.timezone.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=datetime.timezone.utc),
+        )[0].cancel()
+        calendar_id = self.calendar.pk
+        self.calendar.delete()
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(
+            CalendarChange.objects.filter(calendar_id=calendar_id).exists()
+        )
+
+        # the changes of the other calendars are still recorded
+        other = Calendar.objects.create(name="Other", slug="other")
+        event = Event.objects.create(
+            title="Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=datetime.timezone.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=datetime.timezone.utc),
+            calendar=other,
+        )
+        self.assertChanges(other, [("event", event.pk, "created")])
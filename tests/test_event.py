@@ -1,13 +1,19 @@
 import datetime
+from io import StringIO
+from unittest import mock
 
 import pytz
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 from django.test.utils import override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from schedule.models import Calendar, Event, EventRelation, Rule
+from schedule.models import Calendar, Event, EventRelation, OccurrenceIndex, Rule
+from schedule.models.events import OccurrenceMixin
 
 
 class TestEvent(TestCase):
@@ -620,6 +626,376 @@ class TestEvent(TestCase):
         )
 
 
+class TestEventEffectiveSpan(TestCase):
+    def setUp(self):
+        self.cal = Calendar.objects.create(name="MyCal")
+        self.start = datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc)
+        self.end = datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc)
+
+    def create_event(self, rule=None, end_recurring_period=None):
+        return Event.objects.create(
+            title="Event",
+            start=self.start,
+            end=self.end,
+            rule=rule,
+            end_recurring_period=end_recurring_period,
+            calendar=self.cal,
+        )
+
+    def test_single_event(self):
+        event = self.create_event()
+        self.assertEqual(event.effective_start, self.start)
+        self.assertEqual(event.effective_end, self.end)
+
+    def test_recurring_event_with_end_recurring_period(self):
+        event = self.create_event(
+            Rule.objects.create(frequency="WEEKLY"),
+            datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+        )
+        event.refresh_from_db()
+        self.assertEqual(event.effective_start, self.start)
+        self.assertEqual(
+            event.effective_end, datetime.datetime(2008, 5, 3, 9, 0, tzinfo=pytz.utc)
+        )
+
+    def test_recurring_event_with_count(self):
+        event = self.create_event(
+            Rule.objects.create(frequency="DAILY", params="count:3")
+        )
+        self.assertEqual(
+            event.effective_end, datetime.datetime(2008, 1, 7, 9, 0, tzinfo=pytz.utc)
+        )
+
+    def test_recurring_event_without_end(self):
+        event = self.create_event(
+            Rule.objects.create(frequency="DAILY", params="byweekday:MO")
+        )
+        self.assertEqual(
+            event.effective_start, datetime.datetime(2008, 1, 7, 8, 0, tzinfo=pytz.utc)
+        )
+        self.assertIsNone(event.effective_end)
+
+    def test_rule_changes_update_span(self):
+        rule = Rule.objects.create(frequency="DAILY", params="count:3")
+        event = self.create_event(rule)
+        rule.params = "count:5"
+        rule.save()
+        event.refresh_from_db()
+        self.assertEqual(
+            event.effective_end, datetime.datetime(2008, 1, 9, 9, 0, tzinfo=pytz.utc)
+        )
+        rule.delete()
+        event.refresh_from_db()
+        self.assertEqual(event.effective_end, self.end)
+
+    def test_update_event_spans_command(self):
+        event = self.create_event(Rule.objects.create(frequency="DAILY"))
+        Event.objects.update(effective_start=None, effective_end=None)
+        call_command("update_event_spans", stdout=StringIO())
+        event.refresh_from_db()
+        self.assertEqual(event.effective_start, self.start)
+
+
+class TestEventOverlapping(TestCase):
+    def setUp(self):
+        self.cal = Calendar.objects.create(name="MyCal")
+        self.past = Event.objects.create(
+            title="Past",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            calendar=self.cal,
+        )
+        self.recurring = Event.objects.create(
+            title="Recurring",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=self.cal,
+        )
+        self.finished = Event.objects.create(
+            title="Finished",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=self.cal,
+        )
+        self.start = datetime.datetime(2009, 1, 1, tzinfo=pytz.utc)
+        self.end = datetime.datetime(2009, 2, 1, tzinfo=pytz.utc)
+
+    def test_events_outside_of_span_are_excluded(self):
+        self.assertQuerysetEqual(
+            self.cal.events.overlapping(self.start, self.end), [self.recurring]
+        )
+        self.assertQuerysetEqual(
+            Event.objects.overlapping(
+                datetime.datetime(2008, 4, 1, tzinfo=pytz.utc),
+                datetime.datetime(2008, 5, 1, tzinfo=pytz.utc),
+            ).order_by("pk"),
+            [self.recurring, self.finished],
+        )
+
+    def test_moved_occurrences_are_included(self):
+        occurrence = self.past.get_occurrences(
+            datetime.datetime(2008, 1, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 2, 1, tzinfo=pytz.utc),
+        )[0]
+        occurrence.move(
+            datetime.datetime(2009, 1, 5, 8, 0, tzinfo=pytz.utc),
+            datetime.datetime(2009, 1, 5, 9, 0, tzinfo=pytz.utc),
+        )
+        self.assertQuerysetEqual(
+            Event.objects.overlapping(self.start, self.end).order_by("pk"),
+            [self.past, self.recurring],
+        )
+
+    def test_events_without_span_are_included(self):
+        Event.objects.filter(pk=self.past.pk).update(
+            effective_start=None, effective_end=None
+        )
+        self.assertQuerysetEqual(
+            Event.objects.overlapping(self.start, self.end).order_by("pk"),
+            [self.past, self.recurring],
+        )
+
+
+class TestEventExpand(TestCase):
+    def setUp(self):
+        self.cal = Calendar.objects.create(name="MyCal")
+        self.weekly = Event.objects.create(
+            title="Weekly",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=self.cal,
+        )
+        self.daily = Event.objects.create(
+            title="Daily",
+            start=datetime.datetime(2008, 1, 5, 10, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 11, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=self.cal,
+        )
+        self.start = datetime.datetime(2008, 2, 1, tzinfo=pytz.utc)
+        self.end = datetime.datetime(2008, 3, 1, tzinfo=pytz.utc)
+
+    def expected_occurrences(self, start, end):
+        occurrences = self.weekly.get_occurrences(start, end)
+        occurrences += self.daily.get_occurrences(start, end)
+        return sorted((o.event_id, o.start, o.end) for o in occurrences)
+
+    def assertExpansion(self, occurrences, expected):
+        self.assertEqual([o.start for o in occurrences], sorted(o[1] for o in expected))
+        self.assertEqual(
+            sorted((o.event_id, o.start, o.end) for o in occurrences), expected
+        )
+
+    def test_expand_matches_get_occurrences(self):
+        occurrences = Event.objects.expand(Event.objects.all(), self.start, self.end)
+        self.assertExpansion(
+            occurrences, self.expected_occurrences(self.start, self.end)
+        )
+
+    def test_expand_replaces_persisted_occurrences(self):
+        occurrences = self.daily.get_occurrences(self.start, self.end)
+        occurrences[0].cancel()
+        # moved out of and into the timespan
+        occurrences[1].move(
+            datetime.datetime(2008, 3, 5, 8, 0, tzinfo=pytz.utc),
+            datetime.datetime(2008, 3, 5, 9, 0, tzinfo=pytz.utc),
+        )
+        self.weekly.get_occurrences(
+            datetime.datetime(2008, 3, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 3, 8, tzinfo=pytz.utc),
+        )[0].move(
+            datetime.datetime(2008, 2, 10, 8, 0, tzinfo=pytz.utc),
+            datetime.datetime(2008, 2, 10, 9, 0, tzinfo=pytz.utc),
+        )
+        expanded = Event.objects.expand(Event.objects.all(), self.start, self.end)
+        self.assertExpansion(expanded, self.expected_occurrences(self.start, self.end))
+        self.assertTrue(
+            [o for o in expanded if o.cancelled and o.event_id == self.daily.pk]
+        )
+
+    def test_expand_runs_a_fixed_number_of_queries(self):
+        for i in range(5):
+            Event.objects.create(
+                title="Event %d" % i,
+                start=datetime.datetime(2008, 2, i + 1, 8, 0, tzinfo=pytz.utc),
+                end=datetime.datetime(2008, 2, i + 1, 9, 0, tzinfo=pytz.utc),
+                rule=Rule.objects.create(frequency="DAILY"),
+                calendar=self.cal,
+            )
+        with self.assertNumQueries(2):
+            occurrences = Event.objects.expand(
+                self.cal.events.all(), self.start, self.end
+            )
+            self.assertTrue(all(o.event.rule for o in occurrences))
+
+    def test_expand_in_timezone(self):
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        start = datetime.datetime(2008, 2, 1)
+        end = datetime.datetime(2008, 3, 1)
+        occurrences = Event.objects.expand(
+            [self.weekly, self.daily], start, end, amsterdam
+        )
+        self.assertExpansion(
+            occurrences,
+            self.expected_occurrences(
+                amsterdam.localize(start), amsterdam.localize(end)
+            ),
+        )
+
+
+class TestEventOccurrenceListScaling(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            title="Minutely",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 8, 1, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="MINUTELY"),
+            calendar=Calendar.objects.create(name="MyCal"),
+        )
+        # starting at the event start keeps the cost of rrule.before() out
+        self.start = self.event.start
+
+    def test_occurrences_are_not_compared_to_each_other(self):
+        with mock.patch.object(
+            OccurrenceMixin, "__eq__", autospec=True, return_value=False
+        ) as eq:
+            self.event._get_occurrence_list(
+                self.start, self.start + datetime.timedelta(days=1)
+            )
+        self.assertEqual(eq.call_count, 0)
+
+    def test_minutely_rule_over_a_week(self):
+        occurrences = self.event._get_occurrence_list(
+            self.start, self.start + datetime.timedelta(days=7)
+        )
+        self.assertEqual(len(occurrences), 7 * 24 * 60)
+        self.assertEqual(
+            len({occurrence.start for occurrence in occurrences}), len(occurrences)
+        )
+
+
+class TestEventBulkIngest(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="mycal")
+        self.weekly = Rule.objects.create(name="Weekly", frequency="WEEKLY")
+        self.start = datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc)
+
+    def get_events(self, count):
+        return [
+            {
+                "title": "Lecture %s" % i,
+                "start": self.start + datetime.timedelta(hours=i),
+                "end": self.start + datetime.timedelta(hours=i + 1),
+                "end_recurring_period": datetime.datetime(2008, 6, 1, tzinfo=pytz.utc),
+                "rule": (
+                    {"frequency": "WEEKLY"}
+                    if i % 3 == 0
+                    else (
+                        {"frequency": "DAILY", "params": "byweekday:MO"}
+                        if i % 3 == 1
+                        else None
+                    )
+                ),
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_ingest(self):
+        self.calendar.refresh_from_db()
+        version = self.calendar.version
+        with self.assertNumQueries(7):
+            # savepoint, rules, new rule, events, version, change log, release
+            events = Event.objects.bulk_ingest(self.get_events(9), self.calendar)
+        self.assertEqual(len(events), 9)
+        self.assertEqual(Rule.objects.count(), 2)
+        daily = Rule.objects.get(frequency="DAILY")
+        self.assertEqual((daily.name, daily.params), ("DAILY", "byweekday:MO"))
+        for event in Event.objects.filter(calendar=self.calendar):
+            if event.rule_id is not None:
+                self.assertIn(event.rule_id, {self.weekly.pk, daily.pk})
+            effective_span = (event.effective_start, event.effective_end)
+            event.save()
+            self.assertEqual(
+                effective_span, (event.effective_start, event.effective_end)
+            )
+        self.calendar.refresh_from_db()
+        self.assertGreater(self.calendar.version, version)
+        self.assertEqual(
+            set(
+                self.calendar.calendarchange_set.filter(action="created").values_list(
+                    "object_id", flat=True
+                )
+            ),
+            {event.pk for event in events},
+        )
+
+    def test_bulk_ingest_validates_all_events(self):
+        events = self.get_events(3)
+        events[2]["end"] = events[2]["start"]
+        with self.assertRaises(ValidationError):
+            Event.objects.bulk_ingest(events, self.calendar)
+        events = self.get_events(3)
+        events[1]["rule"] = {"frequency": "FORTNIGHTLY"}
+        with self.assertRaises(ValidationError):
+            Event.objects.bulk_ingest(events, self.calendar)
+        self.assertFalse(Event.objects.filter(calendar=self.calendar).exists())
+        self.assertEqual(Rule.objects.count(), 1)
+
+    @override_settings(TIME_ZONE="Europe/Amsterdam")
+    def test_bulk_ingest_makes_naive_datetimes_aware(self):
+        events = self.get_events(1)
+        events[0]["end"] = datetime.datetime(2008, 1, 5, 10, 0)
+        (event,) = Event.objects.bulk_ingest(events, self.calendar)
+        event.refresh_from_db()
+        self.assertEqual(
+            event.end, datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc)
+        )
+
+    @mock.patch("schedule.models.events.USE_OCCURRENCE_INDEX", True)
+    def test_bulk_ingest_without_returned_ids(self):
+        events = self.get_events(3)
+        events[0]["uid"] = "lecture-0@example.com"
+        with mock.patch.object(
+            type(connection.features), "can_return_rows_from_bulk_insert", False
+        ):
+            events = Event.objects.bulk_ingest(events, self.calendar)
+        self.assertEqual(
+            [event.pk for event in events],
+            list(
+                Event.objects.filter(calendar=self.calendar)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            ),
+        )
+        self.assertEqual(events[0].uid, "lecture-0@example.com")
+        self.assertEqual(
+            set(
+                self.calendar.calendarchange_set.filter(action="created").values_list(
+                    "object_id", flat=True
+                )
+            ),
+            {event.pk for event in events},
+        )
+        self.assertTrue(OccurrenceIndex.objects.filter(event=events[2]).exists())
+
+    @mock.patch("schedule.models.events.USE_OCCURRENCE_INDEX", True)
+    def test_bulk_ingest_indexes_events(self):
+        events = Event.objects.bulk_ingest(self.get_events(2), self.calendar)
+        self.assertEqual(
+            OccurrenceIndex.objects.filter(event=events[0]).count(),
+            len(
+                events[0].get_occurrences(
+                    events[0].start, datetime.datetime(2008, 6, 1, tzinfo=pytz.utc)
+                )
+            ),
+        )
+
+
 class TestEventRelationManager(TestCase):
     def test_get_events_for_object(self):
         pass
@@ -0,0 +1,151 @@
+import datetime
+import itertools
+from unittest import mock, skipIf
+
+import pytz
+from dateutil import rrule
+from django.test import TestCase
+
+from schedule.expansion import SimpleRecurrence, np
+from schedule.models import Calendar, Event, Rule
+
+
+@skipIf(np is None, "numpy is not installed")
+class TestSimpleRecurrenceParity(TestCase):
+    dtstarts = [
+        datetime.datetime(2008, 1, 5, 8, 0),
+        datetime.datetime(2008, 3, 30, 23, 15, 30, 500),
+        datetime.datetime(2007, 12, 31, 0, 0),
+    ]
+    windows = [
+        (datetime.datetime(2007, 12, 1), datetime.datetime(2008, 1, 10)),
+        (datetime.datetime(2008, 2, 3, 7, 59), datetime.datetime(2008, 4, 2, 8, 0)),
+        (datetime.datetime(2008, 6, 1, 12, 30), datetime.datetime(2008, 6, 20)),
+    ]
+    # intervals that never land on the weekdays make dateutil loop forever,
+    # so the daily and hourly intervals are coprime with a week
+    weekdays = [None, [0], [rrule.SA], [1, 3, 6], [rrule.MO, rrule.FR]]
+
+    def assertParity(self, frequency, dtstart, until, interval, weekdays, windows=None):
+        params = {"interval": interval}
+        if weekdays is not None:
+            params["byweekday"] = weekdays
+        expected = rrule.rrule(
+            getattr(rrule, frequency), dtstart=dtstart, until=until, **params
+        )
+        weekdays = weekdays and sorted(getattr(w, "weekday", w) for w in weekdays)
+        recurrence = SimpleRecurrence(frequency, dtstart, until, interval, weekdays)
+        for start, end in windows or self.windows:
+            for inc in (True, False):
+                self.assertEqual(
+                    recurrence.between(start, end, inc=inc),
+                    expected.between(start, end, inc=inc),
+                )
+                self.assertEqual(
+                    recurrence.before(end, inc=inc), expected.before(end, inc=inc)
+                )
+            bound = expected.after(start)
+            if bound is not None:
+                self.assertEqual(
+                    recurrence.between(bound, end, inc=True),
+                    expected.between(bound, end, inc=True),
+                )
+                self.assertEqual(
+                    recurrence.before(bound, inc=False),
+                    expected.before(bound, inc=False),
+                )
+
+    def test_daily(self):
+        for dtstart, interval, weekdays in itertools.product(
+            self.dtstarts, [1, 2, 5], self.weekdays
+        ):
+            with self.subTest(dtstart=dtstart, interval=interval, weekdays=weekdays):
+                self.assertParity("DAILY", dtstart, None, interval, weekdays)
+
+    def test_weekly(self):
+        for dtstart, interval, weekdays in itertools.product(
+            self.dtstarts, [1, 2, 3], self.weekdays
+        ):
+            with self.subTest(dtstart=dtstart, interval=interval, weekdays=weekdays):
+                self.assertParity("WEEKLY", dtstart, None, interval, weekdays)
+
+    def test_hourly(self):
+        for dtstart, interval, weekdays in itertools.product(
+            self.dtstarts, [1, 5, 25], self.weekdays
+        ):
+            with self.subTest(dtstart=dtstart, interval=interval, weekdays=weekdays):
+                self.assertParity("HOURLY", dtstart, None, interval, weekdays)
+
+    def test_before_epoch(self):
+        dtstart = datetime.datetime(1969, 12, 29, 0, 0)
+        windows = [(datetime.datetime(1969, 12, 1), datetime.datetime(1970, 1, 20))]
+        for frequency, weekdays in itertools.product(
+            ["HOURLY", "DAILY", "WEEKLY"], self.weekdays
+        ):
+            with self.subTest(frequency=frequency, weekdays=weekdays):
+                self.assertParity(frequency, dtstart, None, 1, weekdays, windows)
+
+    def test_until(self):
+        until = datetime.datetime(2008, 3, 1, 8, 0)
+        for frequency, weekdays in itertools.product(
+            ["HOURLY", "DAILY", "WEEKLY"], self.weekdays
+        ):
+            with self.subTest(frequency=frequency, weekdays=weekdays):
+                self.assertParity(frequency, self.dtstarts[0], until, 2, weekdays)
+
+
+@skipIf(np is None, "numpy is not installed")
+class TestEventExpansion(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal")
+
+    def create_event(self, frequency, params=""):
+        return Event.objects.create(
+            title="Recurring",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency=frequency, params=params),
+            calendar=self.calendar,
+        )
+
+    def test_simple_rules_use_vectorized_expansion(self):
+        for frequency, params in [
+            ("DAILY", ""),
+            ("WEEKLY", "interval:2"),
+            ("HOURLY", "interval:3;byweekday:MO,TU"),
+        ]:
+            event = self.create_event(frequency, params)
+            self.assertIsInstance(
+                event._get_recurrence(pytz.utc), SimpleRecurrence, params
+            )
+
+    def test_complex_rules_fall_back_to_dateutil(self):
+        for frequency, params in [
+            ("MONTHLY", ""),
+            ("DAILY", "count:3"),
+            ("WEEKLY", "byweekno:2"),
+            ("DAILY", "byeaster:0"),
+            ("DAILY", "byweekday:MO;bysetpos:1"),
+        ]:
+            event = self.create_event(frequency, params)
+            self.assertIsInstance(event._get_recurrence(pytz.utc), rrule.rrule, params)
+
+    def test_occurrences_match_dateutil(self):
+        tzinfo = pytz.timezone("Europe/Amsterdam")
+        start = tzinfo.localize(datetime.datetime(2008, 3, 20))
+        end = tzinfo.localize(datetime.datetime(2008, 4, 10))
+        for frequency, params in [
+            ("DAILY", "byweekday:SA,SU"),
+            ("WEEKLY", "interval:2;byweekday:MO,FR"),
+            ("HOURLY", "interval:7"),
+        ]:
+            event = self.create_event(frequency, params)
+            occurrences = event.get_occurrences(start, end)
+            with mock.patch("schedule.models.events.USE_NUMPY_EXPANSION", False):
+                expected = event.get_occurrences(start, end)
+            self.assertEqual(
+                [(o.start, o.end) for o in occurrences],
+                [(o.start, o.end) for o in expected],
+            )
+            self.assertTrue(occurrences)
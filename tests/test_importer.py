@@ -0,0 +1,201 @@
+import datetime
+import tempfile
+from io import StringIO
+
+import pytz
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from schedule.importer import import_icalendar
+from schedule.models import Calendar, CalendarChange, Event, Occurrence, Rule
+
+ICALENDAR = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Example//EN
+BEGIN:VEVENT
+UID:moved@example.com
+RECURRENCE-ID:20080121T080000Z
+DTSTART:20080122T100000Z
+DTEND:20080122T110000Z
+SUMMARY:Moved Lecture
+END:VEVENT
+BEGIN:VEVENT
+UID:lecture@example.com
+DTSTART:20080107T080000Z
+DTEND:20080107T090000Z
+SUMMARY:Lecture
+DESCRIPTION:A weekly
+  lecture
+RRULE:FREQ=WEEKLY;BYDAY=MO,FR;UNTIL=20080505T000000Z
+EXDATE:20080114T080000Z,20080118T080000Z
+BEGIN:VALARM
+ACTION:DISPLAY
+TRIGGER:-PT15M
+END:VALARM
+END:VEVENT
+BEGIN:VEVENT
+UID:moved@example.com
+DTSTART:20080107T080000Z
+DTEND:20080107T090000Z
+SUMMARY:Seminar
+RRULE:FREQ=WEEKLY;BYDAY=MO,FR
+END:VEVENT
+BEGIN:VEVENT
+UID:board@example.com
+DTSTART:20080125T150000Z
+DURATION:PT2H
+SUMMARY:Board Meeting
+RRULE:FREQ=MONTHLY;BYDAY=-1FR;COUNT=3
+END:VEVENT
+BEGIN:VEVENT
+UID:holiday@example.com
+DTSTART;VALUE=DATE:20080101
+SUMMARY:Holiday
+END:VEVENT
+BEGIN:VEVENT
+UID:unsupported@example.com
+DTSTART:20080101T080000Z
+DTEND:20080101T090000Z
+SUMMARY:Unsupported
+RRULE:FREQ=WEEKLY;BYDAY=1MO
+END:VEVENT
+END:VCALENDAR
+""".replace("\n", "\r\n")
+
+
+class TestImportICalendar(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+
+    def test_import_icalendar(self):
+        progress = []
+        counts = import_icalendar(
+            ICALENDAR.splitlines(True),
+            self.calendar,
+            batch_size=2,
+            progress=progress.append,
+        )
+        self.assertEqual(counts, {"events": 4, "occurrences": 3, "skipped": 1})
+        self.assertEqual(progress, [3, 5, 6])
+
+        lecture = Event.objects.get(uid="lecture@example.com")
+        self.assertEqual(lecture.calendar, self.calendar)
+        self.assertEqual(lecture.description, "A weekly lecture")
+        self.assertEqual(lecture.rule.frequency, "WEEKLY")
+        self.assertEqual(lecture.rule.params, "byweekday:MO,FR")
+        self.assertEqual(
+            lecture.end_recurring_period,
+            datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+        )
+        # the two weekly events share their rule
+        self.assertEqual(Event.objects.get(uid="moved@example.com").rule, lecture.rule)
+        self.assertEqual(
+            [
+                occurrence.start
+                for occurrence in lecture.get_occurrences(
+                    datetime.datetime(2008, 1, 7, tzinfo=pytz.utc),
+                    datetime.datetime(2008, 1, 22, tzinfo=pytz.utc),
+                )
+                if not occurrence.cancelled
+            ],
+            [
+                datetime.datetime(2008, 1, 7, 8, tzinfo=pytz.utc),
+                datetime.datetime(2008, 1, 11, 8, tzinfo=pytz.utc),
+                datetime.datetime(2008, 1, 21, 8, tzinfo=pytz.utc),
+            ],
+        )
+
+        moved = Occurrence.objects.get(event__uid="moved@example.com")
+        self.assertEqual(moved.title, "Moved Lecture")
+        self.assertEqual(
+            moved.original_start, datetime.datetime(2008, 1, 21, 8, tzinfo=pytz.utc)
+        )
+        self.assertEqual(
+            moved.start, datetime.datetime(2008, 1, 22, 10, tzinfo=pytz.utc)
+        )
+
+        board = Event.objects.get(uid="board@example.com")
+        self.assertEqual(board.rule.params, "count:3;bysetpos:-1;byweekday:FR")
+        self.assertEqual(board.end - board.start, datetime.timedelta(hours=2))
+        self.assertEqual(
+            [
+                occurrence.start.date()
+                for occurrence in board.get_occurrences(
+                    datetime.datetime(2008, 1, 1, tzinfo=pytz.utc),
+                    datetime.datetime(2009, 1, 1, tzinfo=pytz.utc),
+                )
+            ],
+            [
+                datetime.date(2008, 1, 25),
+                datetime.date(2008, 2, 29),
+                datetime.date(2008, 3, 28),
+            ],
+        )
+
+        holiday = Event.objects.get(uid="holiday@example.com")
+        self.assertEqual(holiday.end - holiday.start, datetime.timedelta(days=1))
+        self.assertFalse(Event.objects.filter(uid="unsupported@example.com").exists())
+
+    def test_import_icalendar_again(self):
+        import_icalendar(ICALENDAR.splitlines(True), self.calendar)
+        changes = CalendarChange.objects.count()
+        rules = Rule.objects.count()
+        counts = import_icalendar(ICALENDAR.splitlines(True), self.calendar)
+        self.assertEqual(counts, {"events": 4, "occurrences": 0, "skipped": 1})
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 4)
+        self.assertEqual(Occurrence.objects.count(), 3)
+        self.assertEqual(CalendarChange.objects.count(), changes)
+        self.assertEqual(Rule.objects.count(), rules)
+
+        changed = ICALENDAR.replace("SUMMARY:Lecture", "SUMMARY:Talk").replace(
+            "EXDATE:20080114T080000Z,20080118T080000Z", "EXDATE:20080114T080000Z"
+        )
+        # without its override, the moved occurrence is deleted
+        override = changed.index("BEGIN:VEVENT")
+        lecture = changed.index("BEGIN:VEVENT", override + 1)
+        changed = changed[:override] + changed[lecture:]
+        import_icalendar(changed.splitlines(True), self.calendar)
+        lecture = Event.objects.get(uid="lecture@example.com")
+        self.assertEqual(lecture.title, "Talk")
+        self.assertEqual(
+            list(Occurrence.objects.values_list("original_start", flat=True)),
+            [datetime.datetime(2008, 1, 14, 8, tzinfo=pytz.utc)],
+        )
+        self.assertEqual(
+            CalendarChange.objects.filter(
+                object_type=CalendarChange.EVENT, action=CalendarChange.UPDATED
+            ).count(),
+            1,
+        )
+
+    def test_import_exported_calendar(self):
+        import_icalendar(ICALENDAR.splitlines(True), self.calendar)
+        response = self.client.get(reverse("calendar_ical", args=[self.calendar.pk]))
+        exported = b"".join(response.streaming_content)
+        other = Calendar.objects.create(name="Other", slug="other")
+        import_icalendar(exported.splitlines(True), other)
+
+        start = datetime.datetime(2008, 1, 1, tzinfo=pytz.utc)
+        end = datetime.datetime(2008, 6, 1, tzinfo=pytz.utc)
+
+        def occurrences(calendar):
+            return [
+                (occurrence.event.uid, occurrence.start, occurrence.cancelled)
+                for occurrence in Event.objects.expand(
+                    calendar.events.all(), start, end
+                )
+            ]
+
+        self.assertEqual(occurrences(other), occurrences(self.calendar))
+
+    def test_import_icalendar_command(self):
+        stdout = StringIO()
+        with tempfile.NamedTemporaryFile(suffix=".ics") as ics:
+            ics.write(ICALENDAR.encode())
+            ics.flush()
+            call_command("import_icalendar", ics.name, "MyCalSlug", stdout=stdout)
+        self.assertIn(
+            "Imported 4 events and 3 occurrences, skipped 1.", stdout.getvalue()
+        )
+        self.assertEqual(Event.objects.filter(calendar=self.calendar).count(), 4)
@@ -1,10 +1,11 @@
 import datetime
+import pickle
 
 import pytz
 from django.test import TestCase
 
 from schedule.models import Calendar, Event, Rule
-from schedule.models.events import Occurrence
+from schedule.models.events import Occurrence, OccurrenceSpan
 from schedule.periods import Period
 
 
@@ -145,3 +146,89 @@ class TestOccurrence(TestCase):
         sorted_occurrences = sorted(occurrences, key=lambda occ: occ.start)
 
         self.assertEqual(occurrences, sorted_occurrences)
+
+
+class TestOccurrenceSpan(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            title="Recent Event",
+            description="Weekly meeting",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=Calendar.objects.create(name="MyCal"),
+        )
+        self.start = datetime.datetime(2008, 1, 12, 0, 0, tzinfo=pytz.utc)
+        self.end = datetime.datetime(2008, 1, 27, 0, 0, tzinfo=pytz.utc)
+
+    def get_spans(self):
+        return self.event.get_occurrences(self.start, self.end, spans=True)
+
+    def test_span_reads_like_an_occurrence(self):
+        span = self.get_spans()[0]
+        occurrence = self.event.get_occurrences(self.start, self.end)[0]
+        self.assertIsInstance(span, OccurrenceSpan)
+        self.assertEqual(span, occurrence)
+        self.assertEqual(occurrence, span)
+        for attr in [
+            "id",
+            "pk",
+            "event_id",
+            "title",
+            "description",
+            "start",
+            "end",
+            "original_start",
+            "original_end",
+            "cancelled",
+            "moved",
+            "hours",
+        ]:
+            self.assertEqual(getattr(span, attr), getattr(occurrence, attr), attr)
+        self.assertEqual(str(span), str(occurrence))
+        self.assertEqual(span.get_absolute_url(), occurrence.get_absolute_url())
+        self.assertEqual(span.get_edit_url(), occurrence.get_edit_url())
+        self.assertEqual(span.get_cancel_url(), occurrence.get_cancel_url())
+
+    def test_span_is_immutable(self):
+        span = self.get_spans()[0]
+        with self.assertRaises(AttributeError):
+            span.start = self.start
+        with self.assertRaises(AttributeError):
+            span.title = "Changed"
+        with self.assertRaises(AttributeError):
+            del span.end
+        self.assertFalse(hasattr(span, "__dict__"))
+        self.assertEqual(len({span, self.get_spans()[0]}), 1)
+
+    def test_span_pickles(self):
+        span = self.get_spans()[0]
+        self.assertEqual(pickle.loads(pickle.dumps(span)), span)
+
+    def test_move_and_cancel_persist_the_span(self):
+        spans = self.get_spans()
+        moved = spans[0].move(
+            spans[0].start + datetime.timedelta(hours=1),
+            spans[0].end + datetime.timedelta(hours=1),
+        )
+        cancelled = spans[1].cancel()
+        for occurrence in (moved, cancelled):
+            self.assertIsInstance(occurrence, Occurrence)
+            self.assertIsNotNone(occurrence.pk)
+        spans = self.get_spans()
+        self.assertEqual([o.pk for o in spans], [moved.pk, cancelled.pk, None])
+        self.assertTrue(spans[0].moved)
+        self.assertTrue(spans[1].cancelled)
+
+    def test_period_uses_spans(self):
+        Occurrence.objects.create(
+            event=self.event,
+            start=datetime.datetime(2008, 1, 12, 10, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 12, 11, 0, tzinfo=pytz.utc),
+            original_start=datetime.datetime(2008, 1, 12, 8, 0, tzinfo=pytz.utc),
+            original_end=datetime.datetime(2008, 1, 12, 9, 0, tzinfo=pytz.utc),
+        )
+        occurrences = Period([self.event], self.start, self.end).get_occurrences()
+        self.assertEqual(
+            [type(o) for o in occurrences], [Occurrence, OccurrenceSpan, OccurrenceSpan]
+        )
@@ -0,0 +1,179 @@
+import datetime
+from unittest import mock
+
+import pytz
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from schedule.models import Calendar, Event, Occurrence, OccurrenceIndex, Rule
+from schedule.periods import Period
+
+
+@mock.patch("schedule.signals.USE_OCCURRENCE_INDEX", True)
+class TestOccurrenceIndex(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        self.rule = Rule.objects.create(frequency="WEEKLY")
+        self.horizon = datetime.datetime(2009, 1, 1, tzinfo=pytz.utc)
+        self.horizon_patch = mock.patch.object(
+            OccurrenceIndex.objects, "horizon", return_value=self.horizon
+        )
+        self.horizon_patch.start()
+        self.addCleanup(self.horizon_patch.stop)
+
+    def create_event(self, **kwargs):
+        data = {
+            "title": "Recurring",
+            "start": datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            "end": datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            "end_recurring_period": datetime.datetime(2008, 5, 5, tzinfo=pytz.utc),
+            "rule": self.rule,
+            "calendar": self.calendar,
+        }
+        data.update(kwargs)
+        return Event.objects.create(**data)
+
+    def test_event_save_populates_index(self):
+        event = self.create_event()
+        self.assertEqual(event.indexed_until, self.horizon)
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), 18)
+        event.end_recurring_period = datetime.datetime(2008, 2, 1, tzinfo=pytz.utc)
+        event.save()
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), 4)
+
+    def test_index_stops_at_horizon(self):
+        event = self.create_event(end_recurring_period=None)
+        last = OccurrenceIndex.objects.filter(event=event).latest("start")
+        self.assertEqual(
+            last.start, datetime.datetime(2008, 12, 27, 8, 0, tzinfo=pytz.utc)
+        )
+
+    def test_moved_and_cancelled_occurrences_update_index(self):
+        event = self.create_event()
+        occurrences = event.get_occurrences(
+            datetime.datetime(2008, 1, 12, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 20, tzinfo=pytz.utc),
+        )
+        occurrence = occurrences[0]
+        occurrence.move(
+            occurrence.start + datetime.timedelta(hours=2),
+            occurrence.end + datetime.timedelta(hours=2),
+        )
+        row = OccurrenceIndex.objects.get(
+            event=event, original_start=occurrence.original_start
+        )
+        self.assertEqual(row.occurrence, occurrence)
+        self.assertEqual(row.start, occurrence.start)
+        self.assertFalse(row.cancelled)
+        occurrence.cancel()
+        row.refresh_from_db()
+        self.assertTrue(row.cancelled)
+        occurrence.delete()
+        row = OccurrenceIndex.objects.get(
+            event=event, original_start=occurrence.original_start
+        )
+        self.assertIsNone(row.occurrence)
+        self.assertEqual(row.start, occurrence.original_start)
+
+    def test_deleting_an_event_with_persisted_occurrences(self):
+        event = self.create_event()
+        event.get_occurrences(
+            datetime.datetime(2008, 1, 12, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 20, tzinfo=pytz.utc),
+        )[0].cancel()
+        event.delete()
+        self.assertFalse(OccurrenceIndex.objects.exists())
+        self.assertFalse(Occurrence.objects.exists())
+
+    def test_deleting_an_additional_occurrence_drops_its_row(self):
+        event = self.create_event()
+        start = datetime.datetime(2008, 1, 7, 8, 0, tzinfo=pytz.utc)
+        occurrence = Occurrence.objects.create(
+            event=event,
+            title="Extra",
+            start=start,
+            end=start + datetime.timedelta(hours=1),
+            original_start=start,
+            original_end=start + datetime.timedelta(hours=1),
+        )
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), 19)
+        occurrence.delete()
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), 18)
+        self.assertFalse(
+            OccurrenceIndex.objects.filter(event=event, original_start=start).exists()
+        )
+
+    def test_period_reads_from_index(self):
+        event = self.create_event()
+        occurrence = event.get_occurrences(
+            datetime.datetime(2008, 1, 12, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 20, tzinfo=pytz.utc),
+        )[0]
+        occurrence.move(
+            occurrence.start + datetime.timedelta(days=1),
+            occurrence.end + datetime.timedelta(days=1),
+        )
+        start = datetime.datetime(2008, 1, 4, 7, 0, tzinfo=pytz.utc)
+        end = datetime.datetime(2008, 1, 21, 7, 0, tzinfo=pytz.utc)
+        expected = Period(Event.objects.all(), start, end).occurrences
+        with mock.patch("schedule.periods.USE_OCCURRENCE_INDEX", True):
+            period = Period(Event.objects.all(), start, end)
+            with self.assertNumQueries(2):
+                occurrences = period.occurrences
+        self.assertEqual(
+            [(o.start, o.end, o.id) for o in occurrences],
+            [(o.start, o.end, o.id) for o in expected],
+        )
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_index_expands_in_default_time_zone(self):
+        berlin = pytz.timezone("Europe/Berlin")
+        event = self.create_event(
+            start=berlin.localize(datetime.datetime(2008, 3, 22, 9, 0)),
+            end=berlin.localize(datetime.datetime(2008, 3, 22, 10, 0)),
+        )
+        # rebuilt from an event loaded from the database, with an UTC start,
+        # like the refresh_occurrence_index command does
+        OccurrenceIndex.objects.rebuild(Event.objects.get(pk=event.pk))
+        # across the start of DST, on 2008-03-30
+        start = berlin.localize(datetime.datetime(2008, 3, 28))
+        end = berlin.localize(datetime.datetime(2008, 4, 7))
+        expected = Period(Event.objects.all(), start, end, tzinfo=berlin).occurrences
+        self.assertEqual([o.start.astimezone(berlin).hour for o in expected], [9, 9])
+        with mock.patch("schedule.periods.USE_OCCURRENCE_INDEX", True):
+            period = Period(Event.objects.all(), start, end, tzinfo=berlin)
+            with mock.patch.object(Event, "get_occurrences") as get_occurrences:
+                occurrences = period.occurrences
+            get_occurrences.assert_not_called()
+            self.assertEqual(
+                [o.start for o in occurrences], [o.start for o in expected]
+            )
+            # the index doesn't hold the occurrences of other zones
+            with mock.patch.object(OccurrenceIndex.objects, "get_occurrences") as get:
+                Period(Event.objects.all(), start, end, tzinfo=pytz.utc).occurrences
+            get.assert_not_called()
+
+    def test_period_beyond_horizon_expands_events(self):
+        self.create_event(end_recurring_period=None)
+        start = datetime.datetime(2009, 6, 1, tzinfo=pytz.utc)
+        end = datetime.datetime(2009, 6, 15, tzinfo=pytz.utc)
+        with mock.patch("schedule.periods.USE_OCCURRENCE_INDEX", True):
+            occurrences = Period(Event.objects.all(), start, end).occurrences
+        self.assertEqual(len(occurrences), 2)
+
+    def test_refresh_occurrence_index_command(self):
+        event = self.create_event(end_recurring_period=None)
+        self.horizon_patch.stop()
+        with mock.patch.object(
+            OccurrenceIndex.objects,
+            "horizon",
+            return_value=datetime.datetime(2009, 2, 1, tzinfo=pytz.utc),
+        ):
+            call_command("refresh_occurrence_index", stdout=mock.Mock())
+        self.horizon_patch.start()
+        event.refresh_from_db()
+        self.assertEqual(
+            event.indexed_until, datetime.datetime(2009, 2, 1, tzinfo=pytz.utc)
+        )
+        self.assertEqual(OccurrenceIndex.objects.filter(event=event).count(), 57)
+        self.assertFalse(Occurrence.objects.exists())
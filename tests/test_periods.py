@@ -1,14 +1,19 @@
 import datetime
+import json
+import pickle
+from unittest import mock, skipIf
 
 import pytz
 from django.conf import settings
+from django.core.cache import cache
 from django.db import connection
 from django.test import TestCase
 from django.test.utils import CaptureQueriesContext, override_settings
 
 from schedule.models import Calendar, Event, Rule
 from schedule.models.events import Occurrence
-from schedule.periods import Day, Month, Period, Week, Year
+from schedule.periods import Day, Month, OccurrencePool, Period, Week, Year
+from schedule.utils import zoneinfo
 
 
 class TestPeriod(TestCase):
@@ -76,6 +81,22 @@ class TestPeriod(TestCase):
         executed_queries = len(ctx.captured_queries)
         assert executed_queries == 1, len(ctx.captured_queries)
 
+    def test_only_overlapping_events_are_expanded(self):
+        Event.objects.create(
+            title="Old Event",
+            start=datetime.datetime(2007, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2007, 1, 5, 9, 0, tzinfo=pytz.utc),
+            calendar=Calendar.objects.get(name="MyCal"),
+        )
+        with mock.patch.object(
+            Event, "get_occurrences", autospec=True, return_value=[]
+        ) as get_occurrences:
+            self.period.get_occurrences()
+        self.assertEqual(
+            [call.args[0].title for call in get_occurrences.call_args_list],
+            ["Recent Event"],
+        )
+
     def test_get_occurrences_with_sorting_options(self):
         period = Period(
             events=Event.objects.all(),
@@ -324,6 +345,52 @@ class TestMonth(TestCase):
             datetime.datetime(2009, 1, 1, 0, 0, tzinfo=pytz.utc),
         )
 
+    def test_get_day_partials(self):
+        cal = Calendar.objects.first()
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        for start, end in [
+            # spans several days, and crosses midnight in Amsterdam
+            (
+                datetime.datetime(2008, 2, 9, 20, 0),
+                datetime.datetime(2008, 2, 12, 2, 0),
+            ),
+            (
+                datetime.datetime(2008, 2, 14, 23, 0),
+                datetime.datetime(2008, 2, 15, 0, 30),
+            ),
+            # ends exactly at a midnight, starts exactly at one
+            (
+                datetime.datetime(2008, 2, 18, 22, 0),
+                datetime.datetime(2008, 2, 19, 0, 0),
+            ),
+            (
+                datetime.datetime(2008, 2, 21, 0, 0),
+                datetime.datetime(2008, 2, 21, 1, 0),
+            ),
+            (datetime.datetime(2008, 1, 30, 0, 0), datetime.datetime(2008, 3, 2, 0, 0)),
+        ]:
+            Event.objects.create(
+                title="Event",
+                start=amsterdam.localize(start),
+                end=amsterdam.localize(end),
+                calendar=cal,
+            )
+        for tzinfo in [pytz.utc, amsterdam]:
+            month = Month(
+                Event.objects.all(), datetime.datetime(2008, 2, 7), tzinfo=tzinfo
+            )
+            day_partials = month.get_day_partials()
+            self.assertEqual(len(day_partials), 29)
+            for week in month.get_weeks():
+                for day in week.get_days():
+                    if day.start.month != 2:
+                        continue
+                    self.assertEqual(
+                        day_partials[day.start.date()],
+                        day.get_occurrence_partials(),
+                        (tzinfo, day.start),
+                    )
+
 
 class TestDay(TestCase):
     def setUp(self):
@@ -357,6 +424,48 @@ class TestDay(TestCase):
         self.assertEqual(period.start, slot_start)
         self.assertEqual(period.end, slot_end)
 
+    def test_time_slots(self):
+        cal = Calendar.objects.create(name="MyCal")
+        Event.objects.create(
+            title="Daily",
+            start=datetime.datetime(2008, 2, 1, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 2, 1, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=cal,
+        )
+        Event.objects.create(
+            title="Meeting",
+            start=datetime.datetime(2008, 2, 7, 10, 15, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 2, 7, 11, 45, tzinfo=pytz.utc),
+            calendar=cal,
+        )
+        day = Day(Event.objects.all(), datetime.datetime(2008, 2, 7, tzinfo=pytz.utc))
+        start = day.start + datetime.timedelta(hours=7)
+        end = day.start + datetime.timedelta(hours=25)
+        with mock.patch.object(
+            Period, "_expand_events", autospec=True, side_effect=Period._expand_events
+        ) as expand_events:
+            slots = day.get_time_slots(start, end, datetime.timedelta(minutes=30))
+            occurrences = [slot.occurrences for slot in slots]
+        # the day is expanded once, the slots past its end have no events
+        self.assertEqual(
+            [len(call.args[1]) for call in expand_events.call_args_list], [2, 0, 0]
+        )
+        self.assertEqual(len(slots), 36)
+        self.assertEqual(slots[0].start, start)
+        self.assertEqual(slots[-1].end, end)
+        for slot, slot_occurrences in zip(slots, occurrences):
+            self.assertEqual(
+                slot_occurrences, day.get_time_slot(slot.start, slot.end).occurrences
+            )
+        # slots past the end of the day are empty
+        self.assertEqual(occurrences[-1], [])
+        # slots hold the occurrences that overlap them, not the ones that end
+        # at their start or start at their end
+        self.assertEqual(
+            [len(o) for o in occurrences[:11]], [0, 0, 1, 1, 0, 0, 1, 1, 1, 1, 0]
+        )
+
     def test_time_slot_with_dst(self):
         tzinfo = pytz.timezone("America/Vancouver")
         slot_start = datetime.datetime(2016, 3, 13, 0, 0, tzinfo=tzinfo)
@@ -418,6 +527,52 @@ class TestOccurrencePool(TestCase):
         )
         self.assertEqual(parent_period.occurrences, period.occurrences)
 
+    def test_pool_between(self):
+        Event.objects.create(
+            title="Long Event",
+            start=datetime.datetime(2008, 1, 1, 0, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 3, 1, 0, 0, tzinfo=pytz.utc),
+            calendar=self.recurring_event.calendar,
+        )
+        occurrences = Period(
+            Event.objects.all(),
+            datetime.datetime(2008, 1, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 6, 1, tzinfo=pytz.utc),
+        ).occurrences
+        pool = OccurrencePool(occurrences)
+        self.assertEqual(len(pool), len(occurrences))
+        for start, end in [
+            (datetime.datetime(2008, 1, 5, 9, 0), datetime.datetime(2008, 1, 6)),
+            (datetime.datetime(2008, 2, 1), datetime.datetime(2008, 2, 20)),
+            (datetime.datetime(2008, 3, 1), datetime.datetime(2008, 3, 1, 8, 0)),
+            (datetime.datetime(2008, 6, 1), datetime.datetime(2008, 7, 1)),
+        ]:
+            start = start.replace(tzinfo=pytz.utc)
+            end = end.replace(tzinfo=pytz.utc)
+            self.assertEqual(
+                pool.between(start, end),
+                sorted(
+                    (o for o in occurrences if o.start <= end and o.end >= start),
+                    key=lambda o: o.start,
+                ),
+            )
+
+    def test_sub_periods_share_the_pool(self):
+        year = Year(Event.objects.all(), datetime.datetime(2008, 1, 1, tzinfo=pytz.utc))
+        months = list(year.get_months())
+        self.assertIsInstance(months[0].occurrence_pool, OccurrencePool)
+        self.assertIs(months[0].occurrence_pool, months[1].occurrence_pool)
+        for month in months:
+            expected = Month(
+                Event.objects.all(), month.start, tzinfo=pytz.utc
+            ).occurrences
+            self.assertEqual(month.occurrences, expected)
+            for day in month.get_days():
+                self.assertEqual(
+                    day.occurrences,
+                    Day(Event.objects.all(), day.start, tzinfo=pytz.utc).occurrences,
+                )
+
 
 class TestOccurrencesInTimezone(TestCase):
     def setUp(self):
@@ -669,3 +824,194 @@ class TestStrftimeRefactor(TestCase):
             m.name()
         except ValueError as value_error:
             self.fail(value_error)
+
+
+class TestPeriodCache(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal")
+        self.event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=self.calendar,
+        )
+        self.event.get_occurrences(
+            datetime.datetime(2008, 2, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 2, 8, tzinfo=pytz.utc),
+        )[0].cancel()
+        self.date = datetime.datetime(2008, 2, 7, tzinfo=pytz.utc)
+        cache.clear()
+
+    def get_month(self):
+        self.calendar.refresh_from_db()
+        month = Month(self.calendar.events.all(), self.date)
+        month.cache_occurrences(self.calendar)
+        return month
+
+    def test_cached_occurrences_are_not_expanded(self):
+        expected = self.get_month().occurrences
+        with mock.patch.object(Period, "_expand_events") as expand_events:
+            month = self.get_month()
+            occurrences = month.occurrences
+        expand_events.assert_not_called()
+        self.assertEqual(occurrences, expected)
+        self.assertEqual(
+            [(o.pk, o.start, o.end, o.cancelled) for o in occurrences],
+            [(o.pk, o.start, o.end, o.cancelled) for o in expected],
+        )
+        self.assertEqual(
+            [o.cancelled for o in occurrences], [True, False, False, False]
+        )
+        self.assertEqual(
+            list(month.get_day_partials().items()),
+            list(
+                Month(self.calendar.events.all(), self.date).get_day_partials().items()
+            ),
+        )
+
+    def test_changes_invalidate_the_cache(self):
+        self.get_month()
+        self.event.end += datetime.timedelta(hours=1)
+        self.event.save()
+        occurrences = self.get_month().occurrences
+        self.assertEqual([o.end.hour for o in occurrences], [10, 10, 10, 10])
+
+    def test_cache_key(self):
+        month = Month(self.calendar.events.all(), self.date)
+        key = month.get_cache_key(self.calendar)
+        self.assertEqual(key, month.get_cache_key(self.calendar))
+        self.assertNotEqual(
+            key, Month(Event.objects.all(), self.date).get_cache_key(self.calendar)
+        )
+        self.assertNotEqual(
+            key,
+            Month(
+                self.calendar.events.all(),
+                self.date,
+                tzinfo=pytz.timezone("Europe/Amsterdam"),
+            ).get_cache_key(self.calendar),
+        )
+        self.assertNotEqual(
+            key,
+            Week(self.calendar.events.all(), self.date).get_cache_key(self.calendar),
+        )
+
+
+class TestPeriodSnapshot(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal")
+        self.event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=self.calendar,
+        )
+        self.event.get_occurrences(
+            datetime.datetime(2008, 2, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 2, 8, tzinfo=pytz.utc),
+        )[0].cancel()
+        self.date = datetime.datetime(2008, 2, 7, tzinfo=pytz.utc)
+
+    def assertRestored(self, period, restored):
+        self.assertIs(type(restored), type(period))
+        self.assertEqual(restored.start, period.start)
+        self.assertEqual(restored.end, period.end)
+        self.assertEqual(restored.tzinfo, period.tzinfo)
+        self.assertIs(type(restored.tzinfo), type(period.tzinfo))
+        self.assertEqual(
+            [
+                (o.event_id, o.pk, o.start, o.end, o.cancelled)
+                for o in restored.occurrences
+            ],
+            [
+                (o.event_id, o.pk, o.start, o.end, o.cancelled)
+                for o in period.occurrences
+            ],
+        )
+
+    def test_round_trip(self):
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        for period in [
+            Month(Event.objects.all(), self.date),
+            Week(Event.objects.all(), self.date, tzinfo=amsterdam),
+            Day(Event.objects.all(), self.date, tzinfo=amsterdam),
+            Period(
+                Event.objects.all(),
+                self.date,
+                self.date + datetime.timedelta(days=10),
+                tzinfo=amsterdam,
+            ),
+            Day(
+                Event.objects.all(),
+                self.date,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=-5)),
+            ),
+            Day(Event.objects.all(), self.date, tzinfo=datetime.timezone.utc),
+        ]:
+            snapshot = period.snapshot()
+            for encoded in [
+                pickle.loads(pickle.dumps(snapshot)),
+                json.loads(json.dumps(snapshot)),
+            ]:
+                with mock.patch.object(Period, "_expand_events") as expand_events:
+                    restored = Period.from_snapshot(encoded)
+                    self.assertRestored(period, restored)
+                expand_events.assert_not_called()
+
+    @skipIf(zoneinfo is None, "zoneinfo is not available")
+    def test_round_trip_zoneinfo(self):
+        period = Week(
+            Event.objects.all(), self.date, tzinfo=zoneinfo.ZoneInfo("Europe/Amsterdam")
+        )
+        restored = Period.from_snapshot(json.loads(json.dumps(period.snapshot())))
+        self.assertRestored(period, restored)
+
+    def test_snapshot_is_compact(self):
+        snapshot = Month(Event.objects.all(), self.date).snapshot()
+        self.assertEqual(
+            snapshot["occurrences"][0],
+            (self.event.pk, 1201939200000000, 1201942800000000, 1),
+        )
+        self.assertLess(len(json.dumps(snapshot)), 400)
+
+    def test_restore_with_events(self):
+        month = Month(Event.objects.all(), self.date)
+        events = [self.event]
+        restored = Month.from_snapshot(month.snapshot(), events)
+        self.assertIs(restored.events, events)
+        self.assertIs(restored.occurrences[1].event, self.event)
+
+    def test_restore_fetches_the_events_of_the_snapshot(self):
+        for day in range(1, 21):
+            Event.objects.create(
+                title="Later Event",
+                start=datetime.datetime(2009, 1, day, 8, 0, tzinfo=pytz.utc),
+                end=datetime.datetime(2009, 1, day, 9, 0, tzinfo=pytz.utc),
+                calendar=self.calendar,
+            )
+        month = Month(self.calendar.events.all(), self.date)
+        snapshot = month.snapshot()
+        with mock.patch.object(
+            Event, "from_db", wraps=Event.from_db
+        ) as from_db, mock.patch.object(Period, "_expand_events") as expand_events:
+            restored = Month.from_snapshot(snapshot, self.calendar.events.all())
+            self.assertRestored(month, restored)
+        expand_events.assert_not_called()
+        self.assertEqual(from_db.call_count, 1)
+
+    def test_stale_snapshot_is_expanded_again(self):
+        month = Month(Event.objects.all(), self.date)
+        snapshot = month.snapshot()
+        Occurrence.objects.all().delete()
+        restored = Period.from_snapshot(snapshot)
+        self.assertEqual(
+            [o.cancelled for o in restored.occurrences], [False, False, False, False]
+        )
+
+    def test_unknown_version(self):
+        snapshot = Month(Event.objects.all(), self.date).snapshot()
+        snapshot["version"] += 1
+        with self.assertRaises(ValueError):
+            Period.from_snapshot(snapshot)
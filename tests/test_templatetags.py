@@ -5,10 +5,11 @@ from django.test import TestCase
 from django.utils.html import escape
 
 from schedule.models import Calendar, Event, Rule
-from schedule.periods import Day, Period
+from schedule.periods import Day, Month, Period
 from schedule.templatetags.scheduletags import (
     _cook_slots,
     create_event_url,
+    day_cell,
     next_url,
     prev_url,
     querystring_for_date,
@@ -137,3 +138,31 @@ class TestTemplateTags(TestCase):
 
         slots = _cook_slots(period, 60)
         self.assertEqual(len(slots), 24)
+
+    def test_cook_slots_hold_the_overlapping_occurrences(self):
+        start = datetime.datetime(2008, 2, 7, 9, 0, tzinfo=pytz.utc)
+        event = Event.objects.create(
+            title="Meeting",
+            start=start,
+            end=start + datetime.timedelta(hours=1),
+            calendar=self.cal,
+        )
+        slots = _cook_slots(Day([event], start), 30)
+        self.assertEqual(
+            [slot.start.strftime("%H:%M") for slot in slots if slot.occurrences],
+            ["09:00", "09:30"],
+        )
+
+    def test_day_cell_reads_the_month_day_partials(self):
+        month = Month(Event.objects.all(), self.day.start)
+        weekday = Event.objects.get().start.weekday()
+        for week in month.get_weeks():
+            for day in week.get_days():
+                context = day_cell({}, self.cal, day, month)
+                if day.start.month == month.start.month:
+                    self.assertEqual(context["partials"], day.get_occurrence_partials())
+                self.assertEqual(
+                    bool(context["partials"]),
+                    day.start.month == month.start.month
+                    and day.start.weekday() == weekday,
+                )
@@ -1,10 +1,21 @@
 import datetime
+from unittest import skipIf
 
+import pytz
 from django.test import TestCase
 from django.utils import timezone
 
 from schedule.models import Calendar, Event, Occurrence, Rule
-from schedule.utils import EventListManager, OccurrenceReplacer
+from schedule.periods import Day
+from schedule.utils import (
+    EventListManager,
+    OccurrenceReplacer,
+    RRuleCache,
+    get_timezone,
+    localize,
+    rrule_cache,
+    zoneinfo,
+)
 
 
 class TestEventListManager(TestCase):
@@ -147,3 +158,140 @@ class TestOccurrenceReplacer(TestCase):
         occ_replacer = OccurrenceReplacer([self.occ])
         with self.assertRaises(AttributeError):
             occ_replacer.get_occurrence(int)
+
+
+class TestRRuleCache(TestCase):
+    def setUp(self):
+        self.rule = Rule.objects.create(frequency="WEEKLY")
+        self.event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2009, 4, 1, 8, 0, tzinfo=datetime.timezone.utc),
+            end=datetime.datetime(2009, 4, 1, 9, 0, tzinfo=datetime.timezone.utc),
+            rule=self.rule,
+            calendar=Calendar.objects.create(name="MyCal"),
+        )
+        rrule_cache.clear()
+
+    def test_compiled_rrules_are_reused(self):
+        rule = self.event.get_rrule_object(datetime.timezone.utc)
+        self.assertIs(self.event.get_rrule_object(datetime.timezone.utc), rule)
+        self.assertEqual(rrule_cache.info()["misses"], 1)
+        self.assertEqual(rrule_cache.info()["hits"], 1)
+
+    def test_event_changes_invalidate(self):
+        rule = self.event.get_rrule_object(datetime.timezone.utc)
+        self.event.start += datetime.timedelta(days=1)
+        self.assertIsNot(self.event.get_rrule_object(datetime.timezone.utc), rule)
+        self.event.save()
+        self.assertEqual(rrule_cache.info()["size"], 0)
+
+    def test_rule_changes_invalidate(self):
+        rule = self.event.get_rrule_object(datetime.timezone.utc)
+        self.rule.frequency = "DAILY"
+        self.rule.save()
+        self.event.refresh_from_db()
+        new_rule = self.event.get_rrule_object(datetime.timezone.utc)
+        self.assertIsNot(new_rule, rule)
+        self.assertEqual(
+            new_rule.after(datetime.datetime(2009, 4, 1, 8, 0)),
+            datetime.datetime(2009, 4, 2, 8, 0),
+        )
+
+    def test_rule_changes_in_other_processes_invalidate(self):
+        self.event.get_rrule_object(datetime.timezone.utc)
+        # an update sends no signal, like an edit made in another process
+        Rule.objects.filter(pk=self.rule.pk).update(frequency="DAILY")
+        event = Event.objects.select_related("rule").get(pk=self.event.pk)
+        self.assertEqual(
+            event.get_rrule_object(datetime.timezone.utc).after(
+                datetime.datetime(2009, 4, 1, 8, 0)
+            ),
+            datetime.datetime(2009, 4, 2, 8, 0),
+        )
+
+    def test_least_recently_used_are_evicted(self):
+        cache = RRuleCache(maxsize=2)
+        cache.get((1,), lambda: "a")
+        cache.get((2,), lambda: "b")
+        cache.get((1,), lambda: "stale")
+        cache.get((3,), lambda: "c")
+        self.assertEqual(cache.get((1,), lambda: "stale"), "a")
+        self.assertEqual(cache.get((2,), lambda: "b2"), "b2")
+        self.assertEqual(cache.info()["size"], 2)
+
+
+class TestTimezoneResolution(TestCase):
+    def test_pytz_zones_are_resolved_once(self):
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        aware = amsterdam.localize(datetime.datetime(2008, 7, 1))
+        self.assertIs(get_timezone(aware.tzinfo), amsterdam)
+        self.assertIs(get_timezone(datetime.timezone.utc), pytz.utc)
+        hits = get_timezone.cache_info().hits
+        get_timezone(aware.tzinfo)
+        self.assertEqual(get_timezone.cache_info().hits, hits + 1)
+
+    def test_fixed_offsets_are_used_as_they_are(self):
+        offset = datetime.timezone(datetime.timedelta(hours=-5))
+        self.assertEqual(get_timezone(offset), offset)
+        self.assertEqual(
+            localize(datetime.datetime(2008, 1, 1, 8, 0), offset),
+            datetime.datetime(2008, 1, 1, 13, 0, tzinfo=pytz.utc),
+        )
+
+    def test_localize_matches_pytz(self):
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        for value in [
+            datetime.datetime(2008, 1, 1, 8, 0),
+            datetime.datetime(2008, 7, 1, 8, 0),
+            # the hour repeated at the end of DST and the hour skipped at its start
+            datetime.datetime(2008, 10, 26, 2, 30),
+            datetime.datetime(2008, 3, 30, 2, 30),
+        ]:
+            self.assertEqual(localize(value, amsterdam), amsterdam.localize(value))
+            self.assertEqual(
+                localize(value, amsterdam).utcoffset(),
+                amsterdam.localize(value).utcoffset(),
+            )
+
+    @skipIf(zoneinfo is None, "zoneinfo is not available")
+    def test_localize_in_zoneinfo_matches_pytz(self):
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        zone = zoneinfo.ZoneInfo("Europe/Amsterdam")
+        self.assertIs(get_timezone(zone), zone)
+        for value in [
+            datetime.datetime(2008, 1, 1, 8, 0),
+            datetime.datetime(2008, 7, 1, 8, 0),
+            datetime.datetime(2008, 10, 26, 2, 30),
+            datetime.datetime(2008, 3, 30, 2, 30),
+        ]:
+            localized = localize(value, zone)
+            self.assertIs(localized.tzinfo, zone)
+            self.assertEqual(
+                localized.utcoffset(), amsterdam.localize(value).utcoffset()
+            )
+
+    @skipIf(zoneinfo is None, "zoneinfo is not available")
+    def test_periods_and_occurrences_in_zoneinfo(self):
+        event = Event.objects.create(
+            title="Daily",
+            start=datetime.datetime(2008, 3, 28, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 3, 28, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=Calendar.objects.create(name="MyCal"),
+        )
+        zone = zoneinfo.ZoneInfo("Europe/Amsterdam")
+        amsterdam = pytz.timezone("Europe/Amsterdam")
+        date = datetime.datetime(2008, 3, 30)
+        self.assertEqual(
+            Day([event], date, tzinfo=zone).start, amsterdam.localize(date)
+        )
+        occurrences = event.get_occurrences(
+            datetime.datetime(2008, 3, 29, tzinfo=zone),
+            datetime.datetime(2008, 4, 1, tzinfo=zone),
+        )
+        expected = event.get_occurrences(
+            amsterdam.localize(datetime.datetime(2008, 3, 29)),
+            amsterdam.localize(datetime.datetime(2008, 4, 1)),
+        )
+        self.assertEqual([o.start for o in occurrences], [o.start for o in expected])
+        self.assertEqual(len(occurrences), 3)
@@ -1,15 +1,25 @@
 import datetime
 import json
+from unittest import mock, skipIf
+from urllib.parse import urlencode
 
+import django
+import icalendar
 import pytz
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.http import Http404
 from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from schedule.models.calendars import Calendar
-from schedule.models.events import Event, Occurrence
+from schedule.models.calendars import Calendar, CalendarChange
+from schedule.models.events import Event, Occurrence, OccurrenceIndex
 from schedule.models.rules import Rule
+from schedule.periods import Period
 from schedule.settings import USE_FULLCALENDAR
 from schedule.views import (
     check_next_url,
@@ -40,6 +50,18 @@ class TestViews(TestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
 
+    def test_period_cache(self):
+        cache.clear()
+        url = reverse("month_calendar", kwargs={"calendar_slug": self.calendar.slug})
+        url += "?year=2008&month=2"
+        with mock.patch("schedule.views.USE_PERIOD_CACHE", True):
+            response = self.client.get(url)
+            with mock.patch("schedule.periods.Period._expand_events") as expand:
+                cached_response = self.client.get(url)
+        expand.assert_not_called()
+        self.assertEqual(response.content, cached_response.content)
+        self.assertContains(response, "Recent Event")
+
 
 class TestViewUtils(TestCase):
     def setUp(self):
@@ -501,6 +523,701 @@ class TestUrls(TestCase):
         resp_list = json.loads(response.content.decode())
         self.assertIn(event.title, [d["title"] for d in resp_list])
 
+    def test_occurrences_api_stream(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        rule = Rule.objects.create(frequency="DAILY")
+        for hour in range(3):
+            Event.objects.create(
+                title="Event %s" % hour,
+                start=datetime.datetime(2008, 1, 5, hour, 0, tzinfo=pytz.utc),
+                end=datetime.datetime(2008, 1, 5, hour, 30, tzinfo=pytz.utc),
+                rule=rule,
+                calendar=calendar,
+            )
+        params = {"start": "2008-01-05", "end": "2008-01-08"}
+        expected = json.loads(
+            self.client.get(reverse("api_occurrences"), params).content.decode()
+        )
+        self.assertEqual(len(expected), 9)
+        with mock.patch("schedule.views.API_STREAM_BATCH_SIZE", 2):
+            response = self.client.get(
+                reverse("api_occurrences"), dict(params, stream="1")
+            )
+            self.assertTrue(response.streaming)
+            self.assertEqual(response["Content-Type"], "application/json")
+            content = b"".join(response.streaming_content).decode()
+        key = lambda d: (d["event_id"], d["start"])  # noqa: E731
+        self.assertEqual(
+            sorted(json.loads(content), key=key), sorted(expected, key=key)
+        )
+
+        response = self.client.get(
+            reverse("api_occurrences"),
+            {"start": "2007-01-05", "end": "2007-01-06", "stream": "1"},
+        )
+        self.assertEqual(b"".join(response.streaming_content), b"[]")
+
+    def test_occurrences_api_stream_validates_parameters(self):
+        response = self.client.get(reverse("api_occurrences"), {"stream": "1"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("api_occurrences"),
+            {
+                "start": "2008-01-05",
+                "end": "2008-02-05",
+                "calendar_slug": "NoCal",
+                "stream": "1",
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_occurrences_api_conditional_get(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        url = reverse("api_occurrences")
+        params = {
+            "start": "2008-01-05",
+            "end": "2008-01-08",
+            "calendar_slug": "MyCalSlug",
+        }
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+
+        with mock.patch.object(Event.objects, "expand") as expand:
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(
+                url, params, HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+            self.assertEqual(response.status_code, 304)
+        expand.assert_not_called()
+
+        response = self.client.get(
+            url, dict(params, end="2008-01-09"), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        event.title = "Renamed"
+        event.save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_occurrences_api_number_of_queries(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        creator = User.objects.create_user("creator")
+        url = reverse("api_occurrences")
+        params = {
+            "start": "2008-01-05",
+            "end": "2008-01-12",
+            "calendar_slug": "MyCalSlug",
+        }
+        for count in [1, 10]:
+            for _ in range(count):
+                event = Event.objects.create(
+                    title="Daily Event",
+                    start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+                    end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+                    end_recurring_period=datetime.datetime(2008, 2, 5, tzinfo=pytz.utc),
+                    rule=Rule.objects.create(frequency="DAILY"),
+                    calendar=calendar,
+                    creator=creator,
+                )
+                event.get_occurrences(
+                    datetime.datetime(2008, 1, 6, tzinfo=pytz.utc),
+                    datetime.datetime(2008, 1, 7, tzinfo=pytz.utc),
+                )[0].move(
+                    datetime.datetime(2008, 1, 6, 10, 0, tzinfo=pytz.utc),
+                    datetime.datetime(2008, 1, 6, 11, 0, tzinfo=pytz.utc),
+                )
+            for stream in ["0", "1"]:
+                # the calendar versions, the latest occurrence id and the last
+                # change for the conditional response, then the calendar, the
+                # latest occurrence id, the events and their persisted
+                # occurrences (and the event ids when streaming)
+                with self.assertNumQueries(7 + int(stream)):
+                    response = self.client.get(url, dict(params, stream=stream))
+                    content = b"".join(
+                        response.streaming_content
+                        if response.streaming
+                        else [response.content]
+                    )
+                occurrences = json.loads(content.decode())
+                self.assertEqual(len(occurrences), calendar.events.count() * 7)
+                self.assertEqual({o["creator"] for o in occurrences}, {str(creator)})
+
+    def test_occurrences_api_page(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        daily = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 10, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=calendar,
+        )
+        Event.objects.create(
+            title="Long Event",
+            start=datetime.datetime(2007, 12, 1, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 10, tzinfo=pytz.utc),
+            calendar=calendar,
+        )
+        daily.get_occurrences(
+            datetime.datetime(2008, 1, 10, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 11, tzinfo=pytz.utc),
+        )[0].move(
+            datetime.datetime(2008, 1, 20, 7, 0, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 20, 8, 0, tzinfo=pytz.utc),
+        )
+        params = {
+            "start": "2008-01-06",
+            "end": "2008-02-06",
+            "calendar_slug": "MyCalSlug",
+        }
+        expected = json.loads(
+            self.client.get(reverse("api_occurrences"), params).content.decode()
+        )
+        self.assertEqual(len(expected), 36)
+
+        pages = []
+        cursor = None
+        while True:
+            query = dict(params, limit=4)
+            if cursor:
+                query["cursor"] = cursor
+            response = self.client.get(reverse("api_occurrences_page"), query)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.content.decode())
+            self.assertLessEqual(len(page["occurrences"]), 4)
+            pages.append(page["occurrences"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(len(pages), 9)
+        occurrences = [o for page in pages for o in page]
+        self.assertEqual(occurrences[0]["title"], "Long Event")
+        self.assertEqual(
+            [o["start"] for o in occurrences], sorted(o["start"] for o in occurrences)
+        )
+        key = lambda o: (o["event_id"], o["start"])  # noqa: E731
+        self.assertEqual(sorted(occurrences, key=key), sorted(expected, key=key))
+
+    def test_occurrences_api_page_resumes_at_cursor(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        params = {
+            "start": "2008-01-05",
+            "end": "2018-01-05",
+            "calendar_slug": "MyCalSlug",
+            "limit": 2,
+        }
+        page = json.loads(
+            self.client.get(reverse("api_occurrences_page"), params).content.decode()
+        )
+        for _ in range(3):
+            params["cursor"] = page["next_cursor"]
+            page = json.loads(
+                self.client.get(
+                    reverse("api_occurrences_page"), params
+                ).content.decode()
+            )
+        self.assertEqual(
+            [o["start"] for o in page["occurrences"]],
+            ["2008-01-11T08:00:00Z", "2008-01-12T08:00:00Z"],
+        )
+        with mock.patch.object(
+            Event.objects, "expand", wraps=Event.objects.expand
+        ) as expand:
+            self.client.get(reverse("api_occurrences_page"), params)
+        self.assertEqual(
+            expand.call_args_list[0][0][1],
+            datetime.datetime(2008, 1, 10, 8, 0, tzinfo=pytz.utc),
+        )
+        self.assertEqual(expand.call_count, 2)
+
+    def test_occurrences_api_page_skips_cancelled_occurrences(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 1, 12, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        for occurrence in event.get_occurrences(
+            datetime.datetime(2008, 1, 5, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 10, tzinfo=pytz.utc),
+        ):
+            occurrence.cancel()
+        params = {
+            "start": "2008-01-05",
+            "end": "2008-01-20",
+            "calendar_slug": "MyCalSlug",
+            "limit": 3,
+        }
+        page = json.loads(
+            self.client.get(reverse("api_occurrences_page"), params).content.decode()
+        )
+        self.assertEqual(
+            [o["start"] for o in page["occurrences"]],
+            [
+                "2008-01-10T08:00:00Z",
+                "2008-01-11T08:00:00Z",
+            ],
+        )
+        self.assertIsNone(page["next_cursor"])
+
+    def test_occurrences_api_page_validates_parameters(self):
+        url = reverse("api_occurrences_page")
+        params = {"start": "2008-01-05", "end": "2008-02-05"}
+        for extra in [{"limit": "many"}, {"limit": "0"}, {"cursor": "bogus"}]:
+            response = self.client.get(url, dict(params, **extra))
+            self.assertEqual(response.status_code, 400)
+
+    @mock.patch("schedule.views.SYNC_TOKEN_DELAY", 0)
+    def test_api_changes(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        url = reverse("api_changes")
+        response = self.client.get(url, {"calendar_slug": "MyCalSlug"})
+        data = json.loads(response.content.decode())
+        self.assertEqual(data["changes"], [])
+        self.assertFalse(data["more"])
+        sync_token = data["sync_token"]
+
+        event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY"),
+            calendar=calendar,
+        )
+        event.title = "Renamed"
+        event.save()
+        occurrence = event.get_occurrences(
+            datetime.datetime(2008, 1, 1, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=pytz.utc),
+        )[0]
+        occurrence.cancel()
+        other = Event.objects.create(
+            title="Other Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            calendar=Calendar.objects.create(name="Other", slug="other"),
+        )
+
+        response = self.client.get(
+            url, {"calendar_slug": "MyCalSlug", "sync_token": sync_token}
+        )
+        data = json.loads(response.content.decode())
+        self.assertEqual(
+            data["changes"],
+            [
+                {
+                    "type": "event",
+                    "id": event.pk,
+                    "event_id": event.pk,
+                    "action": "created",
+                },
+                {
+                    "type": "occurrence",
+                    "id": occurrence.pk,
+                    "event_id": event.pk,
+                    "action": "created",
+                },
+            ],
+        )
+        self.assertFalse(data["more"])
+        self.assertEqual(
+            data["sync_token"], CalendarChange.objects.get(object_id=other.pk).pk
+        )
+
+        occurrence.delete()
+        event.delete()
+        with mock.patch("schedule.views.API_PAGE_SIZE", 1):
+            response = self.client.get(
+                url, {"calendar_slug": "MyCalSlug", "sync_token": data["sync_token"]}
+            )
+        data = json.loads(response.content.decode())
+        self.assertEqual(
+            [(c["type"], c["action"]) for c in data["changes"]],
+            [("occurrence", "deleted")],
+        )
+        self.assertTrue(data["more"])
+        response = self.client.get(
+            url, {"calendar_slug": "MyCalSlug", "sync_token": data["sync_token"]}
+        )
+        data = json.loads(response.content.decode())
+        self.assertEqual(
+            [(c["type"], c["action"]) for c in data["changes"]],
+            [("event", "deleted")],
+        )
+
+    def test_api_changes_waits_for_earlier_transactions(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            calendar=calendar,
+        )
+        url = reverse("api_changes")
+        response = self.client.get(url, {"calendar_slug": "MyCalSlug"})
+        data = json.loads(response.content.decode())
+        # a change of another transaction with a smaller id may still be
+        # uncommitted, so neither the change nor the token are reported yet
+        self.assertEqual(data["changes"], [])
+        self.assertEqual(data["sync_token"], 0)
+
+        CalendarChange.objects.update(
+            created_on=timezone.now() - datetime.timedelta(seconds=10)
+        )
+        response = self.client.get(url, {"calendar_slug": "MyCalSlug"})
+        data = json.loads(response.content.decode())
+        self.assertEqual([c["id"] for c in data["changes"]], [event.pk])
+        self.assertEqual(data["sync_token"], CalendarChange.objects.get().pk)
+
+    def test_api_changes_validates_parameters(self):
+        url = reverse("api_changes")
+        self.assertEqual(self.client.get(url).status_code, 400)
+        response = self.client.get(url, {"calendar_slug": "NoCal"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            url, {"calendar_slug": "example", "sync_token": "bogus"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_move_or_resize_batch(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        other = Event.objects.create(
+            title="Other Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        first, second = event.get_occurrences(
+            datetime.datetime(2008, 1, 6, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=pytz.utc),
+        )
+        first.save()
+        second.save()
+        other_occurrence = other.get_occurrences(
+            datetime.datetime(2008, 1, 6, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 7, tzinfo=pytz.utc),
+        )[0]
+        other_occurrence.save()
+        calendar.refresh_from_db()
+        url = reverse("api_move_or_resize_batch")
+        operations = {
+            "operations": [
+                {"id": first.pk, "existed": True, "delta": 30},
+                {"id": first.pk, "existed": True, "delta": 15, "resize": True},
+                {"id": 0, "existed": True, "delta": 30},
+                {"event_id": other.pk, "existed": False, "delta": 60},
+                {"id": second.pk, "existed": True, "delta": -30, "resize": True},
+            ]
+        }
+
+        response = self.client.post(
+            url, json.dumps(operations), content_type="application/json"
+        )
+        self.assertEqual(
+            [r["status"] for r in json.loads(response.content.decode())["results"]],
+            [
+                "PERMISSION DENIED",
+                "PERMISSION DENIED",
+                "NOT FOUND",
+                "PERMISSION DENIED",
+                "PERMISSION DENIED",
+            ],
+        )
+        first.refresh_from_db()
+        self.assertEqual(
+            first.start, datetime.datetime(2008, 1, 6, 8, 0, tzinfo=pytz.utc)
+        )
+
+        self.client.force_login(User.objects.create_user("editor"))
+        response = self.client.post(
+            url, json.dumps(operations), content_type="application/json"
+        )
+        self.assertEqual(
+            [r["status"] for r in json.loads(response.content.decode())["results"]],
+            ["OK", "OK", "NOT FOUND", "OK", "OK"],
+        )
+        first.refresh_from_db()
+        self.assertEqual(
+            (first.start, first.end),
+            (
+                datetime.datetime(2008, 1, 6, 8, 30, tzinfo=pytz.utc),
+                datetime.datetime(2008, 1, 6, 9, 45, tzinfo=pytz.utc),
+            ),
+        )
+        second.refresh_from_db()
+        self.assertEqual(
+            second.end, datetime.datetime(2008, 1, 7, 8, 30, tzinfo=pytz.utc)
+        )
+        other.refresh_from_db()
+        self.assertEqual(
+            other.start, datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc)
+        )
+        other_occurrence.refresh_from_db()
+        self.assertEqual(
+            (other_occurrence.start, other_occurrence.original_start),
+            (
+                datetime.datetime(2008, 1, 6, 8, 0, tzinfo=pytz.utc),
+                datetime.datetime(2008, 1, 6, 9, 0, tzinfo=pytz.utc),
+            ),
+        )
+        version = calendar.version
+        calendar.refresh_from_db()
+        self.assertGreater(calendar.version, version)
+        self.assertEqual(
+            set(
+                CalendarChange.objects.filter(
+                    object_type="occurrence", action="updated"
+                ).values_list("object_id", flat=True)
+            ),
+            {first.pk, second.pk},
+        )
+
+    def test_api_move_or_resize_batch_number_of_queries(self):
+        event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=Calendar.objects.create(name="MyCal", slug="MyCalSlug"),
+        )
+        occurrences = event.get_occurrences(
+            datetime.datetime(2008, 1, 5, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 10, tzinfo=pytz.utc),
+        )
+        for occurrence in occurrences:
+            occurrence.save()
+        self.client.force_login(User.objects.create_user("editor"))
+        url = reverse("api_move_or_resize_batch")
+        queries = []
+        for count in [1, 5]:
+            operations = [
+                {"id": occurrence.pk, "existed": True, "delta": 30}
+                for occurrence in occurrences[:count]
+            ]
+            with CaptureQueriesContext(connection) as context:
+                self.client.post(
+                    url,
+                    json.dumps({"operations": operations}),
+                    content_type="application/json",
+                )
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+    @mock.patch("schedule.signals.USE_OCCURRENCE_INDEX", True)
+    def test_api_move_or_resize_keeps_occurrence_index(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 1, 15, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=calendar,
+        )
+        occurrence = event.get_occurrences(
+            datetime.datetime(2008, 1, 7, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 8, tzinfo=pytz.utc),
+        )[0]
+        occurrence.move(
+            occurrence.start + datetime.timedelta(hours=2),
+            occurrence.end + datetime.timedelta(hours=2),
+        )
+        user = User.objects.create_user("john", "lennon@thebeatles.com", "pass")
+        self.client.force_login(user)
+
+        response = self.client.post(
+            reverse("api_move_or_resize"),
+            {"event_id": event.pk, "existed": "false", "delta": 30},
+        )
+        self.assertEqual(response.json(), {"status": "OK"})
+
+        start = datetime.datetime(2008, 1, 1, tzinfo=pytz.utc)
+        end = datetime.datetime(2008, 1, 20, tzinfo=pytz.utc)
+        events = Event.objects.filter(calendar=calendar)
+        expected = Period(events, start, end).occurrences
+        self.assertEqual(len(expected), 10)
+        with mock.patch("schedule.periods.USE_OCCURRENCE_INDEX", True):
+            occurrences = Period(events, start, end).occurrences
+        self.assertEqual(
+            [(o.start, o.id) for o in occurrences],
+            [(o.start, o.id) for o in expected],
+        )
+
+    @mock.patch("schedule.views.CALENDAR_VIEW_PERM", True)
+    @mock.patch(
+        "schedule.views.CHECK_CALENDAR_PERM_FUNC",
+        lambda calendar, user: calendar.slug == "allowed",
+    )
+    def test_api_move_or_resize_batch_checks_calendars(self):
+        events = [
+            Event.objects.create(
+                title="Event",
+                start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+                end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+                calendar=Calendar.objects.create(name=slug, slug=slug),
+            )
+            for slug in ["allowed", "denied"]
+        ]
+        occurrences = [
+            event.get_occurrences(
+                datetime.datetime(2008, 1, 5, tzinfo=pytz.utc),
+                datetime.datetime(2008, 1, 6, tzinfo=pytz.utc),
+            )[0]
+            for event in events
+        ]
+        for occurrence in occurrences:
+            occurrence.save()
+        self.client.force_login(User.objects.create_user("editor"))
+        operations = [
+            {"id": occurrences[0].pk, "existed": True, "delta": 30},
+            {"id": occurrences[1].pk, "existed": True, "delta": 30},
+            {"event_id": events[0].pk, "existed": False, "delta": 30},
+            {"event_id": events[1].pk, "existed": False, "delta": 30},
+        ]
+        response = self.client.post(
+            reverse("api_move_or_resize_batch"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        self.assertEqual(
+            [r["status"] for r in response.json()["results"]],
+            ["OK", "PERMISSION DENIED", "OK", "PERMISSION DENIED"],
+        )
+        events[1].refresh_from_db()
+        self.assertEqual(
+            events[1].start, datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc)
+        )
+
+    def test_api_move_or_resize_batch_validates_operations(self):
+        url = reverse("api_move_or_resize_batch")
+        self.assertEqual(self.client.get(url).status_code, 405)
+        for body in ["", "[]", '{"operations": [{"existed": true}]}']:
+            response = self.client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+    def test_api_bulk_ingest(self):
+        Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        body = json.dumps(
+            {
+                "calendar_slug": "MyCalSlug",
+                "events": [
+                    {
+                        "title": "Lecture",
+                        "start": "2008-01-05T08:00:00Z",
+                        "end": "2008-01-05T09:00:00Z",
+                        "rule": {"frequency": "WEEKLY"},
+                    },
+                    {
+                        "title": "Meeting",
+                        "start": "2008-01-06T08:00:00Z",
+                        "end": "2008-01-06T09:00:00Z",
+                    },
+                ],
+            }
+        )
+        url = reverse("api_bulk_ingest")
+
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.json(), {"status": "PERMISSION DENIED"})
+        self.assertFalse(Event.objects.filter(calendar__slug="MyCalSlug").exists())
+
+        user = User.objects.create_user("john", "lennon@thebeatles.com", "pass")
+        self.client.force_login(user)
+        response = self.client.post(url, body, content_type="application/json")
+        data = response.json()
+        self.assertEqual(data["status"], "OK")
+        lecture, meeting = Event.objects.filter(pk__in=data["ids"]).order_by("start")
+        self.assertEqual(lecture.title, "Lecture")
+        self.assertEqual(lecture.rule.frequency, "WEEKLY")
+        self.assertEqual(lecture.creator, user)
+        self.assertIsNone(meeting.rule)
+
+    @mock.patch("schedule.views.CALENDAR_VIEW_PERM", True)
+    def test_api_bulk_ingest_checks_the_calendar(self):
+        Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        body = json.dumps(
+            {
+                "calendar_slug": "MyCalSlug",
+                "events": [
+                    {
+                        "title": "Meeting",
+                        "start": "2008-01-06T08:00:00Z",
+                        "end": "2008-01-06T09:00:00Z",
+                    }
+                ],
+            }
+        )
+        url = reverse("api_bulk_ingest")
+        self.client.force_login(User.objects.create_user("editor"))
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.json()["status"], "OK")
+        with mock.patch(
+            "schedule.views.CHECK_CALENDAR_PERM_FUNC", lambda calendar, user: False
+        ):
+            response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.json(), {"status": "PERMISSION DENIED"})
+        self.assertEqual(Event.objects.filter(calendar__slug="MyCalSlug").count(), 1)
+
+    def test_api_bulk_ingest_validates_events(self):
+        Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        url = reverse("api_bulk_ingest")
+        self.assertEqual(self.client.get(url).status_code, 405)
+        event = {
+            "title": "Lecture",
+            "start": "2008-01-05T09:00:00Z",
+            "end": "2008-01-05T08:00:00Z",
+        }
+        for body in [
+            "",
+            "[]",
+            '{"events": []}',
+            json.dumps({"calendar_slug": "Missing", "events": []}),
+            json.dumps({"calendar_slug": "MyCalSlug", "events": [event]}),
+            json.dumps(
+                {
+                    "calendar_slug": "MyCalSlug",
+                    "events": [dict(event, end="2008-01-05T07:00:00")],
+                }
+            ),
+        ]:
+            response = self.client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
     def test_cal_slug_filters_returned_events(self):
         calendar1 = Calendar.objects.create(name="MyCal1", slug="MyCalSlug1")
         calendar2 = Calendar.objects.create(name="MyCal2", slug="MyCalSlug2")
@@ -654,6 +1371,124 @@ class TestUrls(TestCase):
         expected_feed = "http://example.com/feed/calendar/upcoming/1/"
         self.assertTrue(expected_feed in response.content.decode())
 
+    @override_settings(SITE_ID=1)
+    @mock.patch(
+        "schedule.feeds.UpcomingEventsFeed.get_now",
+        return_value=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+    )
+    def test_feeds_conditional_get(self, get_now):
+        for url in [
+            reverse("upcoming_events_feed", kwargs={"calendar_id": 1}),
+            reverse("calendar_ical", args=[1]),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            with mock.patch.object(Calendar, "occurrences_after") as occurrences:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+            occurrences.assert_not_called()
+
+    @override_settings(SITE_ID=1)
+    @mock.patch("schedule.feeds.USE_FEED_CACHE", True)
+    @mock.patch(
+        "schedule.feeds.UpcomingEventsFeed.get_now",
+        return_value=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+    )
+    def test_feeds_cache(self, get_now):
+        cache.clear()
+        for url, feed in [
+            (
+                reverse("upcoming_events_feed", kwargs={"calendar_id": 1}),
+                "schedule.feeds.UpcomingEventsFeed.items",
+            ),
+            (
+                reverse("calendar_ical", args=[1]),
+                "schedule.feeds.CalendarICalendar.items",
+            ),
+        ]:
+            response = self.client.get(url)
+            with mock.patch(feed) as items:
+                cached_response = self.client.get(url)
+            items.assert_not_called()
+            self.assertEqual(cached_response.content, b"".join(response))
+            self.assertEqual(cached_response["ETag"], response["ETag"])
+
+            event = Event.objects.filter(calendar_id=1).first()
+            event.title = "Renamed Event"
+            event.save()
+            with mock.patch(feed, return_value=[]) as items:
+                response = self.client.get(url)
+            items.assert_called_once()
+            self.assertNotEqual(response["ETag"], cached_response["ETag"])
+
+    @mock.patch("schedule.feeds.USE_FEED_CACHE", True)
+    @mock.patch("schedule.feeds.FEED_CACHE_BACKGROUND_REFRESH", True)
+    def test_feeds_cache_background_refresh(self):
+        cache.clear()
+        url = reverse("calendar_ical", args=[1])
+        response = self.client.get(url)
+        event = Event.objects.filter(calendar_id=1).first()
+        event.title = "Renamed Event"
+        event.save()
+
+        with mock.patch("schedule.feeds.Thread") as thread:
+            stale_response = self.client.get(url)
+            self.client.get(url)
+        # the outdated feed is served with its ETag while it's rendered again
+        self.assertEqual(stale_response.content, b"".join(response))
+        self.assertEqual(stale_response["ETag"], response["ETag"])
+        thread.assert_called_once()
+        with mock.patch("schedule.feeds.connections"):
+            thread.call_args.kwargs["target"](*thread.call_args.kwargs["args"])
+
+        response = self.client.get(url)
+        self.assertIn(b"Renamed Event", response.content)
+        self.assertNotEqual(response["ETag"], stale_response["ETag"])
+
+    def test_calendar_ical(self):
+        calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        event = Event.objects.create(
+            title="Weekly Event",
+            start=datetime.datetime(2008, 1, 7, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 7, 9, 0, tzinfo=pytz.utc),
+            end_recurring_period=datetime.datetime(2008, 5, 5, 0, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="WEEKLY", params="byweekday:MO,FR"),
+            calendar=calendar,
+        )
+        single = Event.objects.create(
+            title="Single Event",
+            start=datetime.datetime(2008, 1, 8, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 8, 9, 0, tzinfo=pytz.utc),
+            calendar=calendar,
+        )
+        cancelled, moved = event.get_occurrences(
+            datetime.datetime(2008, 1, 14, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 19, tzinfo=pytz.utc),
+        )
+        cancelled.cancel()
+        moved.move(
+            datetime.datetime(2008, 1, 22, 10, 0, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 22, 11, 0, tzinfo=pytz.utc),
+        )
+
+        # the ETag, Last-Modified, calendar, events and occurrences queries
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("calendar_ical", args=[calendar.pk]))
+            content = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Type"], "text/calendar")
+        master, override, other = icalendar.Calendar.from_ical(content).walk("VEVENT")
+        self.assertEqual(master["UID"], str(event.pk))
+        self.assertEqual(
+            master["RRULE"].to_ical(),
+            b"FREQ=WEEKLY;UNTIL=20080505T000000Z;BYDAY=MO,FR",
+        )
+        self.assertEqual(master["EXDATE"].dts[0].dt, cancelled.original_start)
+        self.assertEqual(override["UID"], str(event.pk))
+        self.assertEqual(override["RECURRENCE-ID"].dt, moved.original_start)
+        self.assertEqual(override["DTSTART"].dt, moved.start)
+        self.assertEqual(other["UID"], str(single.pk))
+        self.assertNotIn("RRULE", other)
+
     def test_calendar_view_home(self):
         calendar_view_url = reverse(
             "calendar_home", kwargs={"calendar_slug": "example"}
@@ -663,3 +1498,155 @@ class TestUrls(TestCase):
         self.assertTrue(
             '<a href="/feed/calendar/upcoming/1/">Feed</a>' in response.content.decode()
         )
+
+
+@skipIf(django.VERSION < (4, 1), "The async views need the async ORM of Django 4.1")
+class TestAsyncApi(TestCase):
+    def setUp(self):
+        self.calendar = Calendar.objects.create(name="MyCal", slug="MyCalSlug")
+        self.event = Event.objects.create(
+            title="Daily Event",
+            start=datetime.datetime(2008, 1, 5, 8, 0, tzinfo=pytz.utc),
+            end=datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc),
+            rule=Rule.objects.create(frequency="DAILY"),
+            calendar=self.calendar,
+        )
+        self.occurrence = self.event.get_occurrences(
+            datetime.datetime(2008, 1, 6, tzinfo=pytz.utc),
+            datetime.datetime(2008, 1, 7, tzinfo=pytz.utc),
+        )[0]
+        self.occurrence.cancel()
+        self.params = {
+            "start": "2008-01-05",
+            "end": "2008-01-08",
+            "calendar_slug": "MyCalSlug",
+            "timezone": "Europe/Amsterdam",
+        }
+
+    def post(self, url, data):
+        return self.async_client.post(
+            url, urlencode(data), content_type="application/x-www-form-urlencoded"
+        )
+
+    async def test_occurrences(self):
+        expected = await sync_to_async(self.client.get)(
+            reverse("api_occurrences"), self.params
+        )
+        response = await self.async_client.get(
+            reverse("api_occurrences_async"), self.params
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content.decode())), 2)
+        self.assertEqual(response.content, expected.content)
+
+        response = await self.async_client.get(
+            reverse("api_occurrences_async"),
+            self.params,
+            **{"If-None-Match": response["ETag"]},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get(
+            reverse("api_occurrences_async"), dict(self.params, calendar_slug="NoCal")
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_move_or_resize(self):
+        url = reverse("api_move_or_resize_async")
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 405)
+        response = await self.post(
+            url, {"event_id": self.event.pk, "existed": "false", "delta": 60}
+        )
+        self.assertEqual(
+            json.loads(response.content.decode()), {"status": "PERMISSION DENIED"}
+        )
+
+        user = await User.objects.acreate(username="editor")
+        await sync_to_async(self.async_client.force_login)(user)
+
+        response = await self.post(
+            url,
+            {
+                "id": self.occurrence.pk,
+                "existed": "true",
+                "delta": 30,
+                "resize": "true",
+            },
+        )
+        self.assertEqual(json.loads(response.content.decode()), {"status": "OK"})
+        occurrence = await Occurrence.objects.aget(pk=self.occurrence.pk)
+        self.assertEqual(
+            occurrence.end, datetime.datetime(2008, 1, 6, 9, 30, tzinfo=pytz.utc)
+        )
+
+        response = await self.post(
+            url, {"event_id": self.event.pk, "existed": "false", "delta": 60}
+        )
+        self.assertEqual(json.loads(response.content.decode()), {"status": "OK"})
+        event = await Event.objects.aget(pk=self.event.pk)
+        self.assertEqual(
+            event.start, datetime.datetime(2008, 1, 5, 9, 0, tzinfo=pytz.utc)
+        )
+        occurrence = await Occurrence.objects.aget(pk=self.occurrence.pk)
+        self.assertEqual(
+            occurrence.original_start,
+            datetime.datetime(2008, 1, 6, 9, 0, tzinfo=pytz.utc),
+        )
+
+    @mock.patch("schedule.signals.USE_OCCURRENCE_INDEX", True)
+    async def test_move_or_resize_keeps_occurrence_index(self):
+        await sync_to_async(OccurrenceIndex.objects.rebuild)(self.event)
+        user = await User.objects.acreate(username="editor")
+        await sync_to_async(self.async_client.force_login)(user)
+        response = await self.post(
+            reverse("api_move_or_resize_async"),
+            {"event_id": self.event.pk, "existed": "false", "delta": 60},
+        )
+        self.assertEqual(json.loads(response.content.decode()), {"status": "OK"})
+
+        def get_occurrences():
+            start = datetime.datetime(2008, 1, 1, tzinfo=pytz.utc)
+            end = datetime.datetime(2008, 1, 10, tzinfo=pytz.utc)
+            events = Event.objects.filter(calendar=self.calendar)
+            expected = Period(events, start, end).occurrences
+            with mock.patch("schedule.periods.USE_OCCURRENCE_INDEX", True):
+                occurrences = Period(events, start, end).occurrences
+            return expected, occurrences
+
+        expected, occurrences = await sync_to_async(get_occurrences)()
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(
+            [(o.start, o.id) for o in occurrences],
+            [(o.start, o.id) for o in expected],
+        )
+
+    async def test_select_create(self):
+        response = await self.post(
+            reverse("api_select_create_async"),
+            {
+                "start": "2008-01-05T10:00:00+00:00",
+                "end": "2008-01-05T11:00:00+00:00",
+                "calendar_slug": "MyCalSlug",
+            },
+        )
+        self.assertEqual(json.loads(response.content.decode()), {"status": "OK"})
+        self.assertEqual(await self.calendar.event_set.acount(), 2)
+
+    @mock.patch("schedule.utils.CALENDAR_VIEW_PERM", True)
+    @mock.patch("schedule.utils.CHECK_CALENDAR_PERM_FUNC", lambda calendar, user: False)
+    async def test_permissions(self):
+        response = await self.async_client.get(
+            reverse("api_occurrences_async"), self.params
+        )
+        self.assertEqual(response.status_code, 302)
+        response = await self.post(
+            reverse("api_select_create_async"),
+            {
+                "start": "2008-01-05T10:00:00+00:00",
+                "end": "2008-01-05T11:00:00+00:00",
+                "calendar_slug": "MyCalSlug",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(await self.calendar.event_set.acount(), 1)